@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+"""
+Benchmarks of modelling and serialization paths of the SDK.
+
+Every case is timed as the best of several repetitions and, in a separate run, its peak
+memory allocation is measured with tracemalloc. LocalSearch runs for a fixed budget, so its
+best rate of evaluated moves per second is reported as well. Results are written as JSON
+and can be compared with results of a previous run:
+
+    python benchmarks/run.py --sizes 1000 10000 --output current.json --compare baseline.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import timeit
+
+# Run as a script, only benchmarks/ itself is on the path.
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scenarios import scenario
+
+from routevo.solver.search import LocalSearch
+from routevo.state import State
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def cases(size, vehicles, constraints, repeat, budget):
+    """
+    Benchmark cases for one scenario size.
+
+    Every case is a pair of name and function preparing its input once and returning the timed callable,
+    which is called repeat times plus once for memory measurement. Callable with 'rates' attribute
+    collects moves per second of every call there.
+
+    :rtype: list[(basestring, () -> () -> T)]
+    """
+    def construction():
+        return lambda: scenario(size, vehicles, constraints)
+
+    def to_dict():
+        state = scenario(size, vehicles, constraints)
+        return state.to_dict
+
+    def dumps():
+        data = scenario(size, vehicles, constraints).to_dict()
+        return lambda: json.dumps(data)
+
+    def loads():
+        payload = json.dumps(scenario(size, vehicles, constraints).to_dict())
+        return lambda: json.loads(payload)
+
+    def from_dict():
+        payload = json.dumps(scenario(size, vehicles, constraints).to_dict())
+        # from_dict modifies restriction dictionaries, so every run gets its own parsed copy.
+        copies = [json.loads(payload) for _ in range(repeat + 1)]
+        return lambda: State.from_dict(copies.pop())
+
+    def requests():
+        routes = list(scenario(size, vehicles, constraints).routes.values())
+        return lambda: [r.requests for r in routes]
+
+    def to_str():
+        routes = list(scenario(size, vehicles, constraints).routes.values())
+        return lambda: [str(r) for r in routes]
+
+    def search():
+        state = scenario(size, vehicles, constraints)
+        engine = LocalSearch(budget)
+
+        def improve():
+            engine.improve(state)
+            improve.rates.append(engine.statistics.rate)
+
+        improve.rates = []
+        return improve
+
+    return [
+        ('State()', construction), ('State.to_dict', to_dict), ('json.dumps', dumps), ('json.loads', loads),
+        ('State.from_dict', from_dict), ('Route.requests', requests), ('Route.__str__', to_str),
+        ('LocalSearch.improve', search),
+    ]
+
+
+def peak(function):
+    """
+    Peak memory allocated by single call, in bytes.
+
+    :rtype: int | None
+    """
+    if tracemalloc is None:
+        return None
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(sizes, vehicles, repeat, constraints, budget):
+    results = []
+    for size in sizes:
+        for name, prepare in cases(size, vehicles, constraints, repeat, budget):
+            function = prepare()
+            seconds = min(timeit.repeat(function, number=1, repeat=repeat))
+            rates = getattr(function, 'rates', None)
+            result = {'name': name, 'size': size, 'vehicles': vehicles, 'seconds': seconds,
+                      'rate': max(rates) if rates else None, 'peak': peak(function)}
+            results.append(result)
+
+            print('{0:<30}{1:>10}{2:>12.4f} s{3:>12} KiB{4}'.format(
+                name, size, seconds, '-' if result['peak'] is None else result['peak'] // 1024,
+                '' if result['rate'] is None else '{0:>12.0f} moves/s'.format(result['rate'])))
+            sys.stdout.flush()
+
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Finds cases slower, more memory hungry or evaluating fewer moves per second than in baseline
+    by more than tolerance.
+
+    :return: Descriptions of regressions.
+    :rtype: list[basestring]
+    """
+    previous = {(r['name'], r['size'], r.get('vehicles')): r for r in baseline['results']}
+
+    regressions = []
+    for r in results:
+        old = previous.get((r['name'], r['size'], r['vehicles']))
+        if old is None:
+            continue
+
+        # Time budgeted cases take the same time, their rate is compared instead.
+        for key in ('seconds', 'peak') if r.get('rate') is None else ('peak',):
+            if r[key] is not None and old[key] and r[key] > old[key] * (1.0 + tolerance):
+                regressions.append('{0} [{1}] {2}: {3:.4g} -> {4:.4g} (+{5:.0%})'.format(
+                    r['name'], r['size'], key, old[key], r[key], r[key] / float(old[key]) - 1.0))
+
+        if r.get('rate') is not None and old.get('rate') and r['rate'] < old['rate'] * (1.0 - tolerance):
+            regressions.append('{0} [{1}] rate: {2:.4g} -> {3:.4g} ({4:.0%})'.format(
+                r['name'], r['size'], old['rate'], r['rate'], r['rate'] / float(old['rate']) - 1.0))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='Numbers of requests.')
+    parser.add_argument('--vehicles', type=int, help='Number of vehicles, one per 20 requests by default.')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions of every case, the best one is reported.')
+    parser.add_argument('--budget', type=float, default=1.0, help='Seconds of every LocalSearch run.')
+    parser.add_argument('--plain', action='store_true', help='Scenarios without restrictions and time windows.')
+    parser.add_argument('--output', help='Path of JSON file with results.')
+    parser.add_argument('--compare', help='Path of JSON file with baseline results.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative regression.')
+    args = parser.parse_args()
+
+    results = measure(args.sizes, args.vehicles, args.repeat, not args.plain, args.budget)
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'constraints': not args.plain,
+        'vehicles': args.vehicles,
+        'repeat': args.repeat,
+        'budget': args.budget,
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+
+        for line in regressions:
+            print('REGRESSION ' + line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
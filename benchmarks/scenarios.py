@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+from random import Random
+
+from routevo import Job, Request, Route, State, Vehicle
+from routevo.constraints import Restrictions
+from routevo.constraints.hard.comeback import BanPickupComebackConstraint
+from routevo.constraints.hard.cumulate import ForceCommonDirectionConstraint
+from routevo.constraints.hard.limit import CapacityConstraint
+from routevo.constraints.soft import TimeWindow
+from routevo.constraints.soft.angle import InternalCumulationAngleSC, ExternalCumulationAngleSC, InterruptionAngleSC
+from routevo.constraints.soft.limit import WaitingConstraint
+from routevo.utils import Point, Penalty, CF
+
+
+def restrictions(constraints):
+    """
+    Vehicle restrictions of scenario.
+
+    :param constraints: Whether to use the constraint set of example.py, no restrictions otherwise.
+    :type constraints: bool
+    :rtype: routevo.constraints.Restrictions
+    """
+    if not constraints:
+        return Restrictions()
+
+    return Restrictions(
+        soft=[InternalCumulationAngleSC(), ExternalCumulationAngleSC(),
+              InterruptionAngleSC(), WaitingConstraint(Penalty(CF.QUADRATIC, cost=100), 60 * 10)],
+        hard=[CapacityConstraint(8.0), BanPickupComebackConstraint(), ForceCommonDirectionConstraint()]
+    )
+
+
+def scenario(requests, vehicles=None, constraints=True, assigned=0.5, seed=0):
+    """
+    Reproducible state with random locations, the same for the same arguments.
+
+    :param requests: Number of requests.
+    :type requests: int
+    :param vehicles: Number of vehicles, one per 20 requests by default.
+    :type vehicles: int | None
+    :param constraints: Whether vehicles, jobs and requests have restrictions and time windows.
+    :type constraints: bool
+    :param assigned: Fraction of requests already in routes, distributed evenly among vehicles.
+    :type assigned: float
+    :param seed: Seed of random generator.
+    :type seed: int
+    :rtype: routevo.state.State
+    """
+    rng = Random(seed)
+    vehicles = max(1, requests // 20) if vehicles is None else vehicles
+    shared = restrictions(constraints)
+
+    sl = TimeWindow(0, 60 * 60, 90 * 60, Penalty(CF.QUADRATIC, cost=100)) if constraints else None
+    carry = TimeWindow(0, 50 * 60, 60 * 60, Penalty(CF.QUADRATIC, cost=10.0 ** 5)) if constraints else None
+
+    fleet = [Vehicle(idx, Point.random(rng=rng), 15.0, 1.0, 10.0, restrictions=shared) for idx in range(vehicles)]
+
+    pool = []
+    for idx in range(requests):
+        p = Job(idx * 10 + 1, Job.PICKUP, Point.random(rng=rng), None, 60 * 5, None)
+        d = Job(idx * 10 + 2, Job.DELIVERY, Point.random(rng=rng), sl, 60 * 5, None)
+        pool.append(Request(idx, 0, rng.randint(1, 4), p, d, carry=carry))
+
+    count = int(requests * assigned)
+    jobs = [[] for _ in fleet]
+    for idx, r in enumerate(pool[:count]):
+        jobs[idx % vehicles].extend([r.pickup, r.delivery])
+
+    return State([Route(v, seq) for v, seq in zip(fleet, jobs)], pool[count:])
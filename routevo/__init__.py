@@ -4,5 +4,5 @@
 from .job import Job
 from .request import Request
 from .route import Route
-from .state import State
+from .state import LazyState, State
 from .vehicle import Vehicle
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import six
+
+from routevo.state import State
+from routevo.utils.checker import check
+
+MODULUS = 2 ** 128
+
+
+def _digest(kind, data):
+    payload = json.dumps([kind, data], sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return int(hashlib.sha1(payload).hexdigest()[:32], 16)
+
+
+class StateFingerprint(object):
+    """
+    Canonical fingerprint of state, maintained incrementally.
+
+    Every route (vehicle with its job order) and every request is hashed separately and item hashes
+    are summed, so the fingerprint does not depend on order of routes, of requests or of keys
+    in dictionaries, while job order within route matters. Updating one item costs a single hash,
+    independently of state size.
+    """
+
+    def __init__(self, state=None):
+        """
+        Initialization method.
+
+        :param state: Initial state.
+        :type state: routevo.state.State | None
+        """
+        self._items = {}
+        self._total = 0
+
+        if state is not None:
+            for route in state.routes.values():
+                self.update_route(route)
+                for request in route.requests:
+                    self.update_request(request)
+            for request in state.unassigned:
+                self.update_request(request)
+
+    def _set(self, key, value):
+        old = self._items.get(key)
+        if old is not None:
+            self._total -= old
+        if value is None:
+            self._items.pop(key, None)
+        else:
+            self._items[key] = value
+            self._total += value
+        self._total %= MODULUS
+
+    def update_route(self, route):
+        """
+        Adds route or updates its vehicle and job order.
+
+        :param route: Route.
+        :type route: routevo.route.Route
+        """
+        value = _digest('route', [route.vehicle.to_dict(), [j.id for j in route.jobs]])
+        self._set(('route', route.vehicle.id), value)
+
+    def remove_route(self, vid):
+        """
+        Removes route.
+
+        :param vid: Vehicle ID.
+        :type vid: int
+        """
+        self._set(('route', vid), None)
+
+    def update_request(self, request):
+        """
+        Adds request or updates its properties.
+
+        :param request: Request.
+        :type request: routevo.request.Request
+        """
+        self._set(('request', request.id), _digest('request', request.to_dict()))
+
+    def remove_request(self, rid):
+        """
+        Removes request.
+
+        :param rid: Request ID.
+        :type rid: int
+        """
+        self._set(('request', rid), None)
+
+    def __len__(self):
+        return len(self._items)
+
+    def hexdigest(self, algorithm=None, distances=None):
+        """
+        Fingerprint of state combined with optimization configuration.
+
+        :param algorithm: Optimization algorithm configuration.
+        :type algorithm: routevo.service.Algorithm | None
+        :param distances: Distance matrix configuration.
+        :type distances: routevo.service.Distances | None
+        :rtype: basestring
+        """
+        config = [
+            None if algorithm is None else algorithm.to_dict(),
+            None if distances is None else distances.to_dict(),
+        ]
+        payload = json.dumps(['{0:032x}'.format(self._total), config], sort_keys=True)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def fingerprint(state, algorithm=None, distances=None):
+    """
+    Canonical fingerprint of state and optimization configuration.
+
+    :param state: State.
+    :type state: routevo.state.State
+    :param algorithm: Optimization algorithm configuration.
+    :type algorithm: routevo.service.Algorithm | None
+    :param distances: Distance matrix configuration.
+    :type distances: routevo.service.Distances | None
+    :rtype: basestring
+    """
+    return StateFingerprint(state).hexdigest(algorithm, distances)
+
+
+class ResultCache(object):
+    """
+    Results of optimization by fingerprint of input, with time to live and bounded size.
+
+    Results are kept serialized, so every hit returns new objects, which can be modified freely.
+    Least recently used entries are evicted first.
+    """
+
+    def __init__(self, ttl=600.0, size=64):
+        """
+        Initialization method.
+
+        :param ttl: Time to live of entry in seconds.
+        :type ttl: float
+        :param size: Maximum number of entries.
+        :type size: int
+        """
+        assert check(ttl, (float, six.integer_types)) and ttl > 0
+        assert check(size, six.integer_types) and size > 0
+
+        self.ttl = float(ttl)
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self._lookup(key) is not None
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            if entry[0] < time.time():
+                del self._entries[key]
+                return None
+
+            self._entries.pop(key)
+            self._entries[key] = entry
+            return entry
+
+    def get(self, key):
+        """
+        Cached result.
+
+        :param key: Input fingerprint.
+        :type key: basestring
+        :return: Status and state, or None if there is no valid entry.
+        :rtype: (basestring, routevo.state.State) | None
+        """
+        entry = self.serialized(key)
+        return None if entry is None else (entry[0], State.from_dict(json.loads(entry[1])))
+
+    def serialized(self, key):
+        """
+        Cached result, not decoded.
+
+        :param key: Input fingerprint.
+        :type key: basestring
+        :return: Status and JSON of state, or None if there is no valid entry.
+        :rtype: (basestring, basestring) | None
+        """
+        entry = self._lookup(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def put(self, key, status, data):
+        """
+        Stores result.
+
+        :param key: Input fingerprint.
+        :type key: basestring
+        :param status: Result status returned by service.
+        :type status: basestring
+        :param data: Result state dictionary, as returned by service or State.to_dict.
+        :type data: dict
+        """
+        entry = time.time() + self.ttl, status, json.dumps(data)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Removes all entries.
+        """
+        with self._lock:
+            self._entries.clear()
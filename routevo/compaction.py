@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+import copy
+
+from routevo.job import Job
+from routevo.route import Route
+from routevo.state import State
+
+NAN = float('nan')
+
+
+def finished(request):
+    """
+    Whether both jobs of request are finished, ie. have end time.
+
+    :param request: Request.
+    :type request: routevo.request.Request
+    :rtype: bool
+    """
+    return request.pickup.end is not None and request.delivery.end is not None
+
+
+def completed(route):
+    """
+    Number of leading jobs of route which are finished.
+
+    :param route: Route.
+    :type route: routevo.route.Route
+    :rtype: int
+    """
+    count = 0
+    for job in route.jobs:
+        if job.end is None:
+            break
+        count += 1
+
+    return count
+
+
+class Folded(object):
+    """
+    Finished part of state removed by compact, used to restore result.
+    """
+
+    def __init__(self):
+        self.prefixes = {}
+        self.vehicles = {}
+        self.unassigned = []
+        self.requests = 0
+
+    def __len__(self):
+        return self.requests
+
+    def restore(self, state):
+        """
+        Puts finished jobs back at beginning of routes and finished unassigned requests back to unassigned.
+
+        Jobs kept in compacted state are taken from result, so that they share request objects with the rest
+        of the route. Routes of compacted vehicles get their original vehicles back. Times and distances
+        of removed jobs are rebuilt at their positions: arrival and end from job realization times,
+        distance unknown (NaN).
+
+        :param state: Result of compacted state.
+        :type state: routevo.state.State
+        :return: Complete state.
+        :rtype: routevo.state.State
+        """
+        routes = []
+        for vid, route in state.routes.items():
+            prefix = self.prefixes.get(vid)
+            if not prefix:
+                routes.append(route)
+                continue
+
+            positions = {j.id: idx for idx, j in enumerate(route.jobs)}
+            jobs, distances, times = [], [], []
+            for j, kept in prefix:
+                idx = positions.pop(j.id, None) if kept else None
+                if idx is None:
+                    jobs.append(j)
+                    distances.append(NAN)
+                    times.append({'at': j.end if j.at is None else j.at, 'end': j.end})
+                else:
+                    jobs.append(route.jobs[idx])
+                    distances.append(route.distances[idx] if route.distances else NAN)
+                    times.append(route.times[idx] if route.times else None)
+
+            for idx in sorted(positions.values()):
+                jobs.append(route.jobs[idx])
+                distances.append(route.distances[idx] if route.distances else NAN)
+                times.append(route.times[idx] if route.times else None)
+
+            distances = distances if route.distances else route.distances
+            times = times if route.times else route.times
+            routes.append(Route(self.vehicles.get(vid, route.vehicle), jobs, distances, times))
+
+        return State(routes, list(state.unassigned) + self.unassigned)
+
+
+def compact(state):
+    """
+    Removes finished requests from state.
+
+    Unassigned request is removed when both of its jobs are finished, assigned one when its delivery belongs
+    to finished prefix of route, where its pickup is as well unless it was made before the route. Finished jobs of requests in progress stay in route. Vehicle of shortened route is replaced
+    by a copy starting at the last finished job, when that is more recent than the vehicle location.
+    Job times are seconds from now while Vehicle.time is age of location, so the job ended more recently
+    when its end is later than minus the age, and the copy then gets age minus end. Locked count of the copy
+    covers the finished jobs kept in route and the started ones locked before. Input state is not modified.
+
+    :param state: State to compact.
+    :type state: routevo.state.State
+    :return: Compacted state and removed part needed to restore result.
+    :rtype: (routevo.state.State, Folded)
+    """
+    folded = Folded()
+
+    routes = []
+    for vid, route in state.routes.items():
+        count = completed(route)
+        # Delivery finishes request, its pickup is in the prefix as well unless made before the route.
+        done = set(j.request.id for j in route.jobs[:count] if j.type == Job.DELIVERY)
+        if not done:
+            routes.append(route)
+            continue
+
+        prefix = [(j, j.request.id not in done) for j in route.jobs[:count]]
+        jobs = [j for j, kept in prefix if kept] + route.jobs[count:]
+
+        vehicle = copy.copy(route.vehicle)
+        vehicle.locked = sum(kept for _, kept in prefix) + max(0, vehicle.locked - count)
+        last = route.jobs[count - 1]
+        if last.end > -vehicle.time:
+            vehicle.location, vehicle.time = last.location, max(0.0, -last.end)
+
+        folded.prefixes[vid] = prefix
+        folded.vehicles[vid] = route.vehicle
+        folded.requests += len(done)
+        routes.append(Route(vehicle, jobs))
+
+    unassigned = []
+    for request in state.unassigned:
+        (folded.unassigned if finished(request) else unassigned).append(request)
+    folded.requests += len(folded.unassigned)
+
+    return State(routes, unassigned), folded
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+import six
+
+from routevo.utils.checker import check
+
+
+def _assignment(state):
+    vehicles, orders = {}, {}
+    for vid, route in state.routes.items():
+        order = [j.id for j in route.jobs]
+        orders[vid] = order
+        vehicles.update((j.request.id, vid) for j in route.jobs)
+
+    return vehicles, orders
+
+
+def _arrivals(route, distances):
+    if route.times and len(route.times) == len(route.jobs):
+        return {j.id: t['at'] for j, t in zip(route.jobs, route.times)}
+    if distances is not None:
+        return {j.id: arrival for j, (arrival, _) in zip(route.jobs, route.timeline(distances))}
+    return {}
+
+
+def _reordered(old, new):
+    common = set(old) & set(new)
+    return [jid for jid in old if jid in common] != [jid for jid in new if jid in common]
+
+
+class StateDiff(object):
+    """
+    Differences between two states, eg. submitted state and optimization result.
+
+    Requests are matched by ID and jobs by job ID, so the states do not need to share objects.
+    Computed in time linear in the number of jobs.
+    """
+
+    def __init__(self, before, after, threshold=60.0, distances=None):
+        """
+        Initialization method.
+
+        :param before: Earlier state.
+        :type before: routevo.state.State
+        :param after: Later state.
+        :type after: routevo.state.State
+        :param threshold: Minimal change of arrival time in seconds reported in eta.
+        :type threshold: float
+        :param distances: Local distance source estimating arrivals of routes without times.
+            Arrivals are compared only when known for both states.
+        :type distances: routevo.utils.distance.StraightDistance | None
+        """
+        assert check(threshold, (float, six.integer_types))
+
+        old, old_orders = _assignment(before)
+        new, new_orders = _assignment(after)
+
+        self.assigned = {}
+        self.reassigned = {}
+        for rid, vid in new.items():
+            previous = old.get(rid)
+            if previous is None:
+                self.assigned[rid] = vid
+            elif previous != vid:
+                self.reassigned[rid] = previous, vid
+
+        self.unassigned = {rid: vid for rid, vid in old.items() if rid not in new}
+
+        self.changed = set()
+        self.reordered = set()
+        for vid, order in new_orders.items():
+            previous = old_orders.get(vid, [])
+            if previous != order:
+                self.changed.add(vid)
+                if _reordered(previous, order):
+                    self.reordered.add(vid)
+        self.changed.update(vid for vid, order in old_orders.items() if order and vid not in new_orders)
+
+        self.eta = {}
+        self._delayed = set()
+        for vid, route in after.routes.items():
+            previous = before.routes.get(vid)
+            arrivals = {} if previous is None else _arrivals(previous, distances)
+            if not arrivals:
+                continue
+
+            for jid, at in _arrivals(route, distances).items():
+                was = arrivals.get(jid)
+                if was is not None and abs(at - was) > threshold:
+                    self.eta[jid] = was, at
+                    self._delayed.add(vid)
+
+    def __bool__(self):
+        return bool(self.changed or self.eta)
+
+    __nonzero__ = __bool__
+
+    def __str__(self):
+        return 'Assigned: {0}, unassigned: {1}, reassigned: {2}, changed routes: {3}, ETA changes: {4}'.format(
+            len(self.assigned), len(self.unassigned), len(self.reassigned), len(self.changed), len(self.eta))
+
+    @property
+    def vehicles(self):
+        """
+        Vehicles whose drivers need notification: route changed or arrival moved beyond threshold.
+
+        :rtype: set[int]
+        """
+        return self.changed | self._delayed
+
+    def to_dict(self):
+        """
+        Convert StateDiff to dictionary.
+
+        :return: Dictionary with StateDiff properties.
+        :rtype: dict[basestring, T]
+        """
+        return {
+            'assigned': self.assigned,
+            'unassigned': self.unassigned,
+            'reassigned': {rid: list(vids) for rid, vids in self.reassigned.items()},
+            'changed': sorted(self.changed),
+            'reordered': sorted(self.reordered),
+            'eta': {jid: list(times) for jid, times in self.eta.items()},
+        }
+
+
+def diff(before, after, threshold=60.0, distances=None):
+    """
+    Compares two states.
+
+    :param before: Earlier state.
+    :type before: routevo.state.State
+    :param after: Later state.
+    :type after: routevo.state.State
+    :param threshold: Minimal change of arrival time in seconds reported.
+    :type threshold: float
+    :param distances: Local distance source estimating arrivals of routes without times.
+    :type distances: routevo.utils.distance.StraightDistance | None
+    :rtype: StateDiff
+    """
+    return StateDiff(before, after, threshold, distances)
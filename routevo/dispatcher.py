@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+import copy
+import threading
+import time
+from collections import deque
+
+import six
+
+from routevo.route import Route
+from routevo.service import ServiceError
+from routevo.state import State
+from routevo.utils.checker import check
+
+
+def started(route):
+    """
+    Number of leading jobs of route which are already started, ie. have begin, at or end time.
+
+    :param route: Route.
+    :type route: routevo.route.Route
+    :rtype: int
+    """
+    count = 0
+    for job in route.jobs:
+        if job.begin is None and job.at is None and job.end is None:
+            break
+        count += 1
+
+    return count
+
+
+class Dispatcher(object):
+    """
+    Continuous optimization of a stream of requests and vehicle updates.
+
+    New requests are collected into micro-batches. Batch is submitted when it reaches the size limit,
+    or when its oldest request waits longer than the latency limit, whichever comes first. Only one job
+    is in flight, inputs arriving meanwhile wait for the next batch. Before submission started jobs
+    are locked with Vehicle.locked of submitted vehicle copies, so the service never reorders them.
+    Result is applied to current state with vehicle updates, requests received after submission and
+    realization times of jobs recorded meanwhile preserved. Requests left unassigned by result are submitted again after the latency limit.
+
+    Dispatcher is driven by step, either from caller's loop or by a background thread started with start.
+    Background thread keeps running after errors, eg. raised by callback, which are kept in errors.
+    """
+
+    def __init__(self, service, state, algorithm, distances, batch=50, latency=5.0, interval=1.0, callback=None):
+        """
+        Initialization method.
+
+        :param service: Service client.
+        :type service: routevo.service.Routevo
+        :param state: Initial state.
+        :type state: routevo.state.State
+        :param algorithm: Optimization algorithm configuration.
+        :type algorithm: routevo.service.Algorithm
+        :param distances: Distance matrix configuration.
+        :type distances: routevo.service.Distances
+        :param batch: Number of new requests which triggers submission.
+        :type batch: int
+        :param latency: Seconds the oldest new request may wait before submission.
+        :type latency: float
+        :param interval: Seconds between steps of background thread.
+        :type interval: float
+        :param callback: Function called with the new state after every applied result.
+        :type callback: (routevo.state.State) -> None | None
+        """
+        assert check(batch, six.integer_types) and batch > 0
+        assert check(latency, (float, six.integer_types))
+        assert check(interval, (float, six.integer_types))
+
+        self.service = service
+        self.state = state
+        self.algorithm = algorithm
+        self.distances = distances
+        self.batch = batch
+        self.latency = float(latency)
+        self.interval = float(interval)
+        self.callback = callback
+
+        self.errors = []
+        self.latencies = deque(maxlen=10000)
+
+        self._lock = threading.Lock()
+        self._pending = []
+        self._retry = []
+        self._retried = 0.0
+        self._arrivals = {}
+        self._vehicles = {}
+        # Job resumed by service from its journal.
+        self._job = service.job
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def busy(self):
+        """
+        Whether a job is in flight.
+
+        :rtype: bool
+        """
+        return self._job is not None
+
+    def submit(self, request):
+        """
+        Adds new request.
+
+        :param request: Request.
+        :type request: routevo.request.Request
+        """
+        with self._lock:
+            self.state.unassigned.append(request)
+            self._pending.append(request)
+            self._arrivals[request.id] = time.time()
+
+    def update_vehicle(self, vehicle):
+        """
+        Replaces vehicle of route, eg. with new location and time. Unknown vehicle gets an empty route.
+
+        :param vehicle: Vehicle.
+        :type vehicle: routevo.vehicle.Vehicle
+        """
+        with self._lock:
+            route = self.state.routes.get(vehicle.id)
+            jobs = [] if route is None else route.jobs
+            self.state.routes[vehicle.id] = Route(vehicle, jobs)
+            if self._job is not None:
+                self._vehicles[vehicle.id] = vehicle
+
+    def ready(self, now=None):
+        """
+        Whether pending requests form a batch to submit, or requests left unassigned by the last result
+        waited long enough to try again.
+
+        :param now: Current time.
+        :type now: float | None
+        :rtype: bool
+        """
+        if len(self._pending) >= self.batch:
+            return True
+
+        now = time.time() if now is None else now
+        if self._pending and now - self._arrivals[self._pending[0].id] >= self.latency:
+            return True
+        return bool(self._retry) and now - self._retried >= self.latency
+
+    def step(self):
+        """
+        Polls job in flight and applies its result, then submits next batch if ready.
+
+        :return: Whether result was applied.
+        :rtype: bool
+        """
+        applied = False
+        if self._job is not None:
+            applied = self._poll()
+
+        if self._job is None and self.ready():
+            self._submit()
+
+        return applied
+
+    def _submit(self):
+        with self._lock:
+            routes = []
+            for route in self.state.routes.values():
+                vehicle = route.vehicle
+                if started(route) > vehicle.locked:
+                    vehicle = copy.copy(vehicle)
+                    vehicle.locked = started(route)
+                routes.append(Route(vehicle, list(route.jobs)))
+
+            submitted = State(routes, list(self.state.unassigned))
+            pending, self._pending = self._pending, []
+            retry, self._retry = self._retry, []
+            self._vehicles = {}
+
+        try:
+            self._job = self.service.optimize(submitted, self.algorithm, self.distances)
+        except ServiceError as ex:
+            self.errors.append(ex)
+            with self._lock:
+                self._pending = pending + self._pending
+                self._retry = retry + self._retry
+
+    def _poll(self):
+        try:
+            status, result = self.service.result(self._job)
+        except ServiceError as ex:
+            self.errors.append(ex)
+            # Job lost by service, its requests are submitted again.
+            if ex.code == 5:
+                self.service.abandon(self._job)
+                with self._lock:
+                    self._job = None
+                    self._vehicles = {}
+                    self._retry = list(self.state.unassigned)
+                    self._retried = 0.0
+            return False
+
+        if result is None:
+            return False
+
+        with self._lock:
+            self._apply(result)
+            self._job = None
+
+        if self.callback is not None:
+            self.callback(self.state)
+        return True
+
+    def _realized(self):
+        """
+        Jobs of current state by request ID and job type, carrying realization times recorded during the job.
+        """
+        jobs = {}
+        for route in self.state.routes.values():
+            for job in route.jobs:
+                jobs[job.request.id, job.type] = job
+        for request in self.state.unassigned:
+            for job in (request.pickup, request.delivery):
+                jobs[request.id, job.type] = job
+        return jobs
+
+    def _apply(self, result):
+        now = time.time()
+
+        # Jobs started while the job was in flight stay started, so that next submission locks them.
+        realized = self._realized()
+        jobs = [j for r in result.routes.values() for j in r.jobs]
+        jobs.extend(j for r in result.unassigned for j in (r.pickup, r.delivery))
+        for job in jobs:
+            current = realized.get((job.request.id, job.type))
+            if current is not None:
+                job.begin, job.at, job.end = current.begin, current.at, current.end
+
+        routes = []
+        for vid, route in result.routes.items():
+            vehicle = self._vehicles.get(vid, route.vehicle)
+            routes.append(Route(vehicle, route.jobs, route.distances, route.times))
+        routes.extend(r for vid, r in self.state.routes.items() if vid not in result.routes)
+
+        assigned = set()
+        for route in routes:
+            assigned.update(j.request.id for j in route.jobs)
+
+        # Requests received after submission are not in result.
+        known = set(r.id for r in result.unassigned) | assigned
+        unassigned = list(result.unassigned) + [r for r in self.state.unassigned if r.id not in known]
+
+        for rid in [rid for rid in self._arrivals if rid in assigned]:
+            self.latencies.append(now - self._arrivals.pop(rid))
+
+        # Arrivals are kept only for requests still waiting, left unassigned ones are tried again later.
+        waiting = set(r.id for r in unassigned)
+        self._arrivals = {rid: t for rid, t in self._arrivals.items() if rid in waiting}
+        self._retry = list(result.unassigned)
+        self._retried = now
+
+        self.state = State(routes, unassigned)
+        self._vehicles = {}
+
+    def start(self):
+        """
+        Starts background thread calling step every interval.
+        """
+        assert self._thread is None, 'Dispatcher already started'
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stops background thread. Job in flight is left unfinished.
+
+        :param timeout: Seconds to wait for thread.
+        :type timeout: float | None
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.step()
+            except Exception as ex:
+                self.errors.append(ex)
+            self._stop.wait(self.interval)
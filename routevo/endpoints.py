@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+import threading
+import time
+
+import requests
+import six
+from requests import ConnectionError
+from requests import Timeout
+
+from routevo.service import ServiceError
+from routevo.utils.checker import check
+
+
+class Endpoint(object):
+    """
+    Service endpoint with its load and health.
+    """
+
+    def __init__(self, url):
+        """
+        Initialization method.
+
+        :param url: Base URL of service.
+        :type url: basestring
+        """
+        assert isinstance(url, six.string_types)
+
+        self.url = url.rstrip('/')
+        self.outstanding = 0
+        self.latency = None
+        self.healthy = True
+        self.failures = 0
+        self.checked = 0.0
+
+    def __str__(self):
+        return '{0} ({1}, outstanding: {2}, latency: {3})'.format(
+            self.url, 'healthy' if self.healthy else 'unhealthy', self.outstanding, self.latency)
+
+    def to_dict(self):
+        """
+        Convert Endpoint to dictionary.
+
+        :return: Dictionary with Endpoint properties.
+        :rtype: dict[basestring, T]
+        """
+        return {
+            'url': self.url,
+            'outstanding': self.outstanding,
+            'latency': self.latency,
+            'healthy': self.healthy,
+            'failures': self.failures,
+        }
+
+
+class EndpointPool(object):
+    """
+    Several service endpoints shared by Routevo instances, eg.::
+
+        pool = EndpointPool(['http://10.0.0.1:7777', 'http://10.0.0.2:7777'])
+        service = Routevo(API_KEY, endpoints=pool)
+
+    Every submission goes to a healthy endpoint with the fewest outstanding jobs, or with the lowest
+    latency weighted by outstanding jobs. Endpoint which ran the previous job of the client is preferred
+    while it is not more loaded than others, so the service can start from its previous task. Results
+    are always fetched from the endpoint owning the job.
+
+    Endpoint is marked unhealthy after consecutive connection failures and receives no submissions until
+    its health check, repeated every check interval, succeeds.
+    """
+
+    OUTSTANDING = 'outstanding'
+    LATENCY = 'latency'
+
+    STRATEGIES = (OUTSTANDING, LATENCY)
+
+    def __init__(self, urls, strategy=OUTSTANDING, interval=30.0, failures=1, timeout=2.0, smoothing=0.3):
+        """
+        Initialization method.
+
+        :param urls: Base URLs of service endpoints.
+        :type urls: list[basestring]
+        :param strategy: Routing strategy, OUTSTANDING or LATENCY.
+        :type strategy: basestring
+        :param interval: Seconds between health checks of unhealthy endpoint.
+        :type interval: float
+        :param failures: Number of consecutive failures marking endpoint unhealthy.
+        :type failures: int
+        :param timeout: Timeout of health check request in seconds.
+        :type timeout: float
+        :param smoothing: Weight of the newest sample in exponential average of latency.
+        :type smoothing: float
+        """
+        assert urls, 'At least one endpoint is required'
+        assert strategy in self.STRATEGIES
+        assert check(interval, (float, six.integer_types))
+        assert check(failures, six.integer_types) and failures > 0
+        assert check(timeout, (float, six.integer_types))
+        assert 0 < smoothing <= 1
+
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.strategy = strategy
+        self.interval = float(interval)
+        self.failures = failures
+        self.timeout = float(timeout)
+        self.smoothing = float(smoothing)
+
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def _load(self, endpoint):
+        if self.strategy == self.LATENCY:
+            return (endpoint.latency or 0.0) * (endpoint.outstanding + 1), endpoint.outstanding
+        return endpoint.outstanding, endpoint.latency or 0.0
+
+    def check(self, endpoint):
+        """
+        Checks whether endpoint responds and updates its health.
+
+        :param endpoint: Endpoint.
+        :type endpoint: Endpoint
+        :rtype: bool
+        """
+        try:
+            healthy = requests.get(endpoint.url, timeout=self.timeout).status_code < 500
+        except (Timeout, ConnectionError):
+            healthy = False
+
+        with self._lock:
+            endpoint.checked = time.time()
+            endpoint.healthy = healthy
+            if healthy:
+                endpoint.failures = 0
+        return healthy
+
+    def choose(self, prefer=None, exclude=()):
+        """
+        Endpoint for the next submission. Unhealthy endpoints due for health check are checked first.
+
+        :param prefer: Endpoint preferred when it is healthy and not more loaded than the best one.
+        :type prefer: Endpoint | None
+        :param exclude: Endpoints not to choose, eg. already failed for this submission.
+        :type exclude: collections.Iterable[Endpoint]
+        :rtype: Endpoint
+        """
+        now = time.time()
+        for endpoint in self.endpoints:
+            if not endpoint.healthy and endpoint not in exclude and now - endpoint.checked >= self.interval:
+                self.check(endpoint)
+
+        with self._lock:
+            candidates = [e for e in self.endpoints if e.healthy and e not in exclude]
+            if not candidates:
+                raise ServiceError('Service unavailable: no healthy endpoint.', 4)
+
+            best = min(candidates, key=self._load)
+            if prefer in candidates and prefer.outstanding <= best.outstanding:
+                return prefer
+            return best
+
+    def started(self, endpoint, latency=None):
+        """
+        Records job submitted to endpoint.
+
+        :param endpoint: Endpoint.
+        :type endpoint: Endpoint
+        :param latency: Duration of submission in seconds.
+        :type latency: float | None
+        """
+        with self._lock:
+            endpoint.outstanding += 1
+            endpoint.failures = 0
+            if latency is not None:
+                self._observe(endpoint, latency)
+
+    def finished(self, endpoint):
+        """
+        Records job of endpoint finished.
+
+        :param endpoint: Endpoint.
+        :type endpoint: Endpoint
+        """
+        with self._lock:
+            endpoint.outstanding = max(0, endpoint.outstanding - 1)
+
+    def observe(self, endpoint, latency):
+        """
+        Records duration of request to endpoint.
+
+        :param endpoint: Endpoint.
+        :type endpoint: Endpoint
+        :param latency: Duration in seconds.
+        :type latency: float
+        """
+        with self._lock:
+            self._observe(endpoint, latency)
+
+    def _observe(self, endpoint, latency):
+        if endpoint.latency is None:
+            endpoint.latency = latency
+        else:
+            endpoint.latency += self.smoothing * (latency - endpoint.latency)
+
+    def failed(self, endpoint):
+        """
+        Records connection failure of endpoint.
+
+        :param endpoint: Endpoint.
+        :type endpoint: Endpoint
+        """
+        with self._lock:
+            endpoint.failures += 1
+            if endpoint.failures >= self.failures:
+                endpoint.healthy = False
+                endpoint.checked = time.time()
+
+    def to_dict(self):
+        """
+        Convert EndpointPool to dictionary.
+
+        :return: Dictionary with state of endpoints.
+        :rtype: dict[basestring, T]
+        """
+        with self._lock:
+            return {'strategy': self.strategy, 'endpoints': [e.to_dict() for e in self.endpoints]}
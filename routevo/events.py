@@ -0,0 +1,378 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+import json
+import threading
+import time
+
+import requests
+import six
+from requests import RequestException
+from six.moves import queue
+
+from routevo.service import ServiceError
+from routevo.utils.checker import check
+
+DONE = 'done'
+
+
+class JobEvent(object):
+    """
+    Status change of optimization job.
+    """
+
+    def __init__(self, jid, status, revision, cost=None, unassigned=None):
+        """
+        Initialization method.
+
+        :param jid: Job ID.
+        :type jid: basestring
+        :param status: Job status.
+        :type status: basestring
+        :param revision: Number of changes of job.
+        :type revision: int
+        :param cost: Cost of the best solution so far.
+        :type cost: float | None
+        :param unassigned: Number of unassigned requests of the best solution so far.
+        :type unassigned: int | None
+        """
+        self.jid = jid
+        self.status = status
+        self.revision = revision
+        self.cost = cost
+        self.unassigned = unassigned
+
+    def __str__(self):
+        return 'Job: {0}, status: {1}, revision: {2}, cost: {3}'.format(
+            self.jid, self.status, self.revision, self.cost)
+
+    @property
+    def done(self):
+        """
+        Whether job is finished and its result can be fetched.
+
+        :rtype: bool
+        """
+        return self.status == DONE
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Construct JobEvent from dictionary.
+
+        :param data: Properties of event.
+        :type data: dict
+        :rtype: JobEvent
+        """
+        return cls(data['jid'], data['status'], data.get('revision', 0), data.get('cost'), data.get('unassigned'))
+
+
+def parse(lines):
+    """
+    Parses stream of server-sent events.
+
+    :param lines: Decoded lines of stream.
+    :type lines: collections.Iterable[basestring]
+    :return: Generator of (event, data) pairs. Comments, eg. keep-alive pings, yield None.
+    :rtype: collections.Iterable[(basestring, basestring) | None]
+    """
+    event, data = None, []
+    for line in lines:
+        if not line:
+            if data:
+                yield event or 'message', '\n'.join(data)
+            event, data = None, []
+        elif line.startswith(':'):
+            yield None
+        else:
+            field, _, value = line.partition(':')
+            value = value[1:] if value.startswith(' ') else value
+            if field == 'event':
+                event = value
+            elif field == 'data':
+                data.append(value)
+
+
+class Subscription(object):
+    """
+    Notifications about status changes of many optimization jobs.
+
+    All jobs share one server-sent events connection, which is reopened when jobs are added. Stream is read
+    chunk by chunk, as sent with chunked transfer encoding. When the event stream is not available or breaks,
+    jobs are polled with Routevo.best every interval instead and the stream is tried again after retry seconds,
+    doubled with every failure. Events are passed to callback in the background thread and queued for iteration.
+    Errors raised by callback or while receiving events are kept in errors, eg.::
+
+        with Subscription(service) as subscription:
+            subscription.add(job)
+            for event in subscription:
+                if event.done:
+                    status, result = service.result(event.jid)
+
+    Iteration ends when no subscribed job is left. Finished jobs are unsubscribed automatically, unknown
+    and failed jobs as well, with their errors kept in errors.
+    """
+
+    PATH = '/api/v1/events'
+
+    STREAM = 'stream'
+    POLLING = 'polling'
+
+    def __init__(self, service, jobs=(), callback=None, interval=1.0, stream=True, retry=30.0):
+        """
+        Initialization method.
+
+        :param service: Service client.
+        :type service: routevo.service.Routevo
+        :param jobs: Job IDs subscribed initially.
+        :type jobs: collections.Iterable[basestring]
+        :param callback: Function called with every event.
+        :type callback: (JobEvent) -> None | None
+        :param interval: Seconds between polls, and between keep-alive pings of the event stream.
+        :type interval: float
+        :param stream: Whether to try event stream before polling.
+        :type stream: bool
+        :param retry: Seconds of polling before event stream is tried again after the first failure.
+        :type retry: float
+        """
+        assert check(interval, (float, six.integer_types)) and interval > 0
+        assert check(retry, (float, six.integer_types)) and retry > 0
+
+        self.service = service
+        self.callback = callback
+        self.interval = float(interval)
+        self.mode = self.STREAM if stream else self.POLLING
+        self.retry = float(retry)
+        self.errors = []
+
+        self._streaming = stream
+        self._failures = 0
+        self._retried = 0.0
+
+        self._jobs = {}
+        self._changed = False
+        self._lock = threading.Condition()
+        self._events = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+
+        for job in jobs:
+            self.add(job)
+
+    @property
+    def jobs(self):
+        """
+        Subscribed job IDs.
+
+        :rtype: list[basestring]
+        """
+        with self._lock:
+            return list(self._jobs)
+
+    def add(self, job):
+        """
+        Subscribes to job.
+
+        :param job: Job ID.
+        :type job: basestring
+        """
+        assert isinstance(job, six.string_types)
+        with self._lock:
+            if job not in self._jobs:
+                self._jobs[job] = None
+                self._changed = True
+                self._lock.notify_all()
+
+    def remove(self, job):
+        """
+        Unsubscribes from job.
+
+        :param job: Job ID.
+        :type job: basestring
+        """
+        with self._lock:
+            if self._jobs.pop(job, False) is not False:
+                self._changed = True
+                self._lock.notify_all()
+
+    def _deliver(self, event):
+        with self._lock:
+            if event.jid not in self._jobs:
+                return
+            known = self._jobs[event.jid]
+            if known is not None and event.revision <= known:
+                return
+
+            self._jobs[event.jid] = event.revision
+            if event.done:
+                del self._jobs[event.jid]
+                self._changed = True
+
+        if self.callback is not None:
+            try:
+                self.callback(event)
+            except Exception as ex:
+                self.errors.append(ex)
+        self._events.put(event)
+
+    def _wait(self):
+        """
+        Waits for subscribed jobs, returns their IDs or None when stopped. Iteration is woken up once
+        when no job is left.
+        """
+        with self._lock:
+            if not self._jobs:
+                self._events.put(None)
+            while not self._jobs and not self._stop.is_set():
+                self._lock.wait(self.interval)
+            self._changed = False
+            return None if self._stop.is_set() else list(self._jobs)
+
+    def _stream(self, jobs):
+        """
+        Reads event stream of jobs until it ends or jobs change. Returns False when stream is not available
+        or breaks.
+        """
+        params = {'jobs': ','.join(jobs), 'ping': self.interval, 'key': self.service.key}
+        try:
+            response = requests.get('{}{}'.format(self.service.address(jobs[0]), self.PATH), params=params, stream=True,
+                                    timeout=(10, self.interval * 3))
+        except RequestException as ex:
+            self.errors.append(ServiceError('Event stream unavailable: {}.'.format(ex), 4))
+            return False
+
+        if not response.ok or not response.headers.get('Content-Type', '').startswith('text/event-stream'):
+            response.close()
+            self.errors.append(ServiceError('Event stream not supported.', response.status_code))
+            return False
+
+        try:
+            for item in parse(response.iter_lines(chunk_size=None, decode_unicode=True)):
+                if item is not None:
+                    event, data = item
+                    data = json.loads(data)
+                    if event == 'error':
+                        self.errors.append(ServiceError(data.get('explanation'), data.get('code')))
+                        self.remove(data.get('jid'))
+                    else:
+                        self._deliver(JobEvent.from_dict(data))
+
+                if self._changed or self._stop.is_set():
+                    break
+        except (RequestException, ValueError) as ex:
+            self.errors.append(ServiceError('Event stream interrupted: {}.'.format(ex), 4))
+            return False
+        finally:
+            response.close()
+
+        return True
+
+    def _poll(self, jobs):
+        for job in jobs:
+            with self._lock:
+                since = self._jobs.get(job)
+            try:
+                incumbent = self.service.best(job, since=since)
+            except ServiceError as ex:
+                self.errors.append(ex)
+                # Unknown and failed jobs never finish, as in the event stream they are unsubscribed.
+                if ex.code in (5, 8):
+                    self.remove(job)
+                continue
+            self._deliver(JobEvent(job, incumbent.status, incumbent.revision, incumbent.cost, incumbent.unassigned))
+
+        self._stop.wait(self.interval)
+
+    def _step(self, jobs):
+        # Jobs of different endpoints cannot share one stream.
+        shared = len(set(self.service.address(job) for job in jobs)) == 1
+        if self.mode == self.POLLING and self._streaming and time.time() >= self._retried:
+            self.mode = self.STREAM
+        if self.mode == self.STREAM and shared:
+            if self._stream(jobs):
+                self._failures = 0
+            else:
+                self.mode = self.POLLING
+                self._retried = time.time() + self.retry * 2 ** min(self._failures, 5)
+                self._failures += 1
+        if self.mode == self.POLLING or not shared:
+            self._poll(jobs)
+
+    def _run(self):
+        try:
+            while True:
+                jobs = self._wait()
+                if jobs is None:
+                    break
+
+                try:
+                    self._step(jobs)
+                except Exception as ex:
+                    self.errors.append(ex)
+                    self._stop.wait(self.interval)
+        finally:
+            self._events.put(None)
+
+    def start(self):
+        """
+        Starts background thread receiving events.
+
+        :return: self
+        :rtype: Subscription
+        """
+        assert self._thread is None, 'Subscription already started'
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Stops background thread. Open event stream is closed after the next event or ping.
+
+        :param timeout: Seconds to wait for thread.
+        :type timeout: float | None
+        """
+        self._stop.set()
+        with self._lock:
+            self._lock.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def events(self, timeout=None):
+        """
+        Iterates over events until no subscribed job is left or subscription is stopped.
+
+        :param timeout: Maximum seconds to wait for a single event.
+        :type timeout: float | None
+        :rtype: collections.Iterable[JobEvent]
+        """
+        while True:
+            try:
+                event = self._events.get(timeout=timeout)
+            except queue.Empty:
+                return
+
+            if event is not None:
+                yield event
+            elif self._stop.is_set() or not self.jobs:
+                return
+
+    def __iter__(self):
+        return self.events()
@@ -143,4 +143,5 @@ class Job(object):
                 data[key] = func(data[key])
 
         data['t'] = t
+        data.pop('lid', None)
         return cls(**data)
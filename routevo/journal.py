@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import six
+
+from routevo.utils.checker import check
+
+SUBMITTED = 'submitted'
+FINISHED = 'finished'
+ABANDONED = 'abandoned'
+
+
+class JobJournal(object):
+    """
+    Append-only journal of optimization jobs of one stream of submissions, eg. one dispatcher.
+
+    Every submission is written with its state fingerprint, previous task and endpoint, and every received
+    result with its status. Entries are flushed and synced to disk before the call returns, so after
+    a crash the journal tells which jobs are still running and which one continues the warm-start chain.
+    Partially written last entry is ignored on reading. Routevo given a journal reattaches to the pending
+    job instead of submitting the same state again, eg.::
+
+        service = Routevo(API_KEY, journal=JobJournal('/var/lib/dispatch/fleet-1.journal'))
+        job = service.job or service.optimize(state, algorithm, distances)
+
+    Journal is rewritten to pending jobs and the last finished one when it grows over the limit of entries.
+    The last finished job and its endpoint are available as previous and endpoint.
+    """
+
+    def __init__(self, path, limit=1000):
+        """
+        Initialization method.
+
+        :param path: Journal file, created when missing.
+        :type path: basestring
+        :param limit: Number of entries which triggers rewrite.
+        :type limit: int
+        """
+        assert isinstance(path, six.string_types)
+        assert check(limit, six.integer_types) and limit > 0
+
+        self.path = path
+        self.limit = limit
+        self.previous = None
+        self.endpoint = None
+        self.entries = 0
+
+        self._pending = OrderedDict()
+        self._last = None
+        self._lock = threading.Lock()
+        self._file = None
+
+        torn = self._replay()
+        if self.entries > self.limit:
+            self.rewrite()
+            torn = False
+        self._file = open(self.path, 'a')
+        if torn:
+            self._file.write('\n')
+
+    def _replay(self):
+        """
+        Reads entries of journal file. Returns whether the last line is unterminated.
+        """
+        if not os.path.exists(self.path):
+            return False
+
+        line = ''
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self._apply(entry)
+
+        return bool(line) and not line.endswith('\n')
+
+    def _apply(self, entry):
+        self.entries += 1
+        if entry['event'] == SUBMITTED:
+            self._pending[entry['job']] = entry
+        elif entry['event'] == FINISHED:
+            submission = self._pending.pop(entry['job'], None)
+            # Endpoint of submission is kept with the last finished job, it survives rewrite.
+            if 'endpoint' not in entry and submission is not None:
+                entry = dict(entry, endpoint=submission.get('endpoint'))
+            self._last = entry
+            self.previous = entry['job']
+            self.endpoint = entry.get('endpoint')
+        elif entry['event'] == ABANDONED:
+            self._pending.pop(entry['job'], None)
+
+    def _append(self, entry):
+        with self._lock:
+            self._file.write(json.dumps(entry, sort_keys=True) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._apply(entry)
+
+            if self.entries > self.limit:
+                self._rewrite()
+
+    @property
+    def pending(self):
+        """
+        Submitted jobs without result, the oldest first.
+
+        :return: Submission entries with 'job', 'fingerprint', 'previous', 'endpoint' and 'time'.
+        :rtype: list[dict[basestring, T]]
+        """
+        with self._lock:
+            return list(self._pending.values())
+
+    def fingerprint(self, job):
+        """
+        Fingerprint of state submitted as pending job.
+
+        :param job: Job ID.
+        :type job: basestring
+        :rtype: basestring | None
+        """
+        entry = self._pending.get(job)
+        return None if entry is None else entry.get('fingerprint')
+
+    def submitted(self, job, fingerprint=None, previous=None, endpoint=None):
+        """
+        Records submitted job.
+
+        :param job: Job ID.
+        :type job: basestring
+        :param fingerprint: Fingerprint of submitted state and configuration.
+        :type fingerprint: basestring | None
+        :param previous: Previous task sent with submission.
+        :type previous: basestring | None
+        :param endpoint: Base URL of endpoint running job.
+        :type endpoint: basestring | None
+        """
+        self._append({
+            'event': SUBMITTED,
+            'job': job,
+            'fingerprint': fingerprint,
+            'previous': previous,
+            'endpoint': endpoint,
+            'time': time.time(),
+        })
+
+    def finished(self, job, status=None):
+        """
+        Records received result of job.
+
+        :param job: Job ID.
+        :type job: basestring
+        :param status: Result status.
+        :type status: basestring | None
+        """
+        self._append({'event': FINISHED, 'job': job, 'status': status, 'time': time.time()})
+
+    def abandon(self, job):
+        """
+        Records pending job whose result will not be fetched, eg. after service lost it.
+        It does not become previous task.
+
+        :param job: Job ID.
+        :type job: basestring
+        """
+        self._append({'event': ABANDONED, 'job': job, 'time': time.time()})
+
+    def rewrite(self):
+        """
+        Replaces journal with pending jobs and the last finished one.
+        """
+        with self._lock:
+            self._rewrite()
+
+    def _rewrite(self):
+        entries = ([] if self._last is None else [self._last]) + list(self._pending.values())
+
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, sort_keys=True) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        if self._file is not None:
+            self._file.close()
+        if os.name == 'nt' and os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(temporary, self.path)
+
+        self.entries = len(entries)
+        if self._file is not None:
+            self._file = open(self.path, 'a')
+
+    def close(self):
+        """
+        Closes journal file.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+import six
+
+from routevo.utils.checker import check
+
+
+class LocationTable(object):
+    """
+    Table of distinct locations of jobs and vehicles.
+
+    Jobs with the same aid share one location. Other jobs and vehicles share location when their
+    coordinates are equal after rounding to the given number of decimal places, 5 places are about
+    a meter. Location keeps point of the first object assigned to it.
+
+    Distance matrix over locations is smaller than matrix over jobs by square of deduplication ratio.
+    """
+
+    def __init__(self, precision=5):
+        """
+        Initialization method.
+
+        :param precision: Number of decimal places of coordinates compared.
+        :type precision: int
+        """
+        assert check(precision, six.integer_types) and precision >= 0
+
+        self.precision = precision
+        self.points = []
+        self._keys = {}
+        self._jobs = {}
+        self._vehicles = {}
+
+    @classmethod
+    def from_state(cls, state, precision=5):
+        """
+        Creates table with locations of all vehicles and jobs of state.
+
+        :param state: State.
+        :type state: routevo.state.State
+        :param precision: Number of decimal places of coordinates compared.
+        :type precision: int
+        :rtype: LocationTable
+        """
+        table = cls(precision)
+        for route in state.routes.values():
+            table.add_vehicle(route.vehicle)
+            for job in route.jobs:
+                table.add_job(job)
+
+        for request in state.unassigned:
+            table.add_job(request.pickup)
+            table.add_job(request.delivery)
+
+        return table
+
+    def __len__(self):
+        return len(self.points)
+
+    def _index(self, key, point):
+        idx = self._keys.get(key)
+        if idx is None:
+            idx = self._keys[key] = len(self.points)
+            self.points.append(point)
+        return idx
+
+    def _quantize(self, point):
+        return round(point.longitude, self.precision), round(point.latitude, self.precision)
+
+    def add_job(self, job):
+        """
+        Assigns location to job.
+
+        :param job: Job.
+        :type job: routevo.job.Job
+        :return: Location index.
+        :rtype: int
+        """
+        key = ('aid', job.aid) if job.aid is not None else self._quantize(job.location)
+        idx = self._jobs[job.id] = self._index(key, job.location)
+        return idx
+
+    def add_vehicle(self, vehicle):
+        """
+        Assigns location to vehicle.
+
+        :param vehicle: Vehicle.
+        :type vehicle: routevo.vehicle.Vehicle
+        :return: Location index.
+        :rtype: int
+        """
+        idx = self._vehicles[vehicle.id] = self._index(self._quantize(vehicle.location), vehicle.location)
+        return idx
+
+    def job(self, jid):
+        """
+        Location index of job.
+
+        :param jid: Job ID.
+        :type jid: int
+        :rtype: int
+        """
+        return self._jobs[jid]
+
+    def vehicle(self, vid):
+        """
+        Location index of vehicle.
+
+        :param vid: Vehicle ID.
+        :type vid: int
+        :rtype: int
+        """
+        return self._vehicles[vid]
+
+    @property
+    def ratio(self):
+        """
+        Number of objects per location.
+
+        :rtype: float
+        """
+        return (len(self._jobs) + len(self._vehicles)) / float(len(self.points)) if self.points else 1.0
+
+    def matrix(self, distances):
+        """
+        Distance matrix between locations.
+
+        :param distances: Distance source, eg. routevo.utils.distance.StraightDistance.
+        :type distances: T
+        :return: Distances in meters, indexed by location indexes.
+        :rtype: list[list[float]]
+        """
+        points = self.points
+        return [[distances.distance(a, b) for b in points] for a in points]
+
+    def annotate(self, data):
+        """
+        Adds location table to state dictionary created by State.to_dict.
+
+        Dictionary gets 'locations' list of points and every vehicle and job gets 'lid' with its location index.
+
+        :param data: State dictionary.
+        :type data: dict
+        :return: The same dictionary.
+        :rtype: dict
+        """
+        data['locations'] = [p.to_dict() for p in self.points]
+
+        for v in data['vehicles']:
+            v['lid'] = self._vehicles[v['vid']]
+        for r in data['requests']:
+            for kind in ('pickup', 'delivery'):
+                r[kind]['lid'] = self._jobs[r[kind]['jid']]
+
+        return data
@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+import bisect
+import threading
+import time
+from timeit import default_timer
+
+import six
+
+
+class Span(object):
+    """
+    Timed phase of client work.
+
+    Span is used as context manager around the phase. Numeric attributes, like payload bytes,
+    are set during the phase. ServiceError leaving the span sets its error code.
+    """
+
+    def __init__(self, tracer, name, job=None):
+        """
+        Initialization method.
+
+        :param tracer: Tracer receiving finished span.
+        :type tracer: Tracer
+        :param name: Phase name.
+        :type name: basestring
+        :param job: Optimization job ID, if known.
+        :type job: basestring | None
+        """
+        self.tracer = tracer
+        self.name = name
+        self.job = job
+        self.attributes = {}
+        self.error = None
+
+        self.timestamp = time.time()
+        self.start = default_timer()
+        self.duration = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, value, traceback):
+        if value is not None:
+            self.error = getattr(value, 'code', kind.__name__)
+        self.finish()
+
+    def set(self, key, value):
+        """
+        Sets attribute of span.
+
+        :param key: Attribute name.
+        :type key: basestring
+        :param value: Attribute value.
+        :type value: T
+        """
+        self.attributes[key] = value
+
+    def finish(self):
+        """
+        Ends span and passes it to recorders. Spans are finished once.
+        """
+        if self.duration is None:
+            self.duration = default_timer() - self.start
+            self.tracer.record(self)
+
+    def to_dict(self):
+        """
+        Convert Span to dictionary.
+
+        :return: Dictionary with Span properties.
+        :rtype: dict[basestring, T]
+        """
+        return {
+            'name': self.name,
+            'job': self.job,
+            'timestamp': self.timestamp,
+            'duration': self.duration,
+            'attributes': dict(self.attributes),
+            'error': self.error,
+        }
+
+
+class _NoopSpan(object):
+    """
+    Span of disabled tracer, shared by all phases and doing nothing.
+    """
+
+    name = job = error = duration = None
+    attributes = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, value, traceback):
+        pass
+
+    def set(self, key, value):
+        pass
+
+    def finish(self):
+        pass
+
+
+NOOP = _NoopSpan()
+
+
+class Tracer(object):
+    """
+    Creates spans and passes finished ones to recorders.
+
+    Recorder is any callable taking finished span, eg. HistogramRecorder or a function
+    exporting spans to external monitoring. Tracer without recorders returns shared no-op span,
+    so instrumentation costs a single method call per phase.
+    """
+
+    def __init__(self, recorders=None):
+        """
+        Initialization method.
+
+        :param recorders: Callables receiving finished spans.
+        :type recorders: list[(Span) -> None] | None
+        """
+        self.recorders = list(recorders or [])
+
+    @property
+    def enabled(self):
+        """
+        Whether any recorder is attached.
+
+        :rtype: bool
+        """
+        return bool(self.recorders)
+
+    def add(self, recorder):
+        """
+        Attaches recorder.
+
+        :param recorder: Callable receiving finished spans.
+        :type recorder: (Span) -> None
+        """
+        self.recorders.append(recorder)
+
+    def span(self, name, job=None):
+        """
+        Starts span of phase.
+
+        :param name: Phase name.
+        :type name: basestring
+        :param job: Optimization job ID, if known.
+        :type job: basestring | None
+        :rtype: Span
+        """
+        if not self.recorders:
+            return NOOP
+        return Span(self, name, job)
+
+    def record(self, span):
+        """
+        Passes finished span to recorders.
+
+        :param span: Finished span.
+        :type span: Span
+        """
+        for recorder in self.recorders:
+            recorder(span)
+
+
+class Histogram(object):
+    """
+    Histogram of values with logarithmic buckets, each bucket 25% wider than the previous one.
+    """
+
+    BOUNDS = tuple(1e-6 * 1.25 ** k for k in range(160))
+
+    def __init__(self):
+        self.buckets = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, value):
+        """
+        Adds value.
+
+        :param value: Value.
+        :type value: float
+        """
+        self.buckets[bisect.bisect_left(self.BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+    @property
+    def mean(self):
+        """
+        Mean of values.
+
+        :rtype: float | None
+        """
+        return self.total / self.count if self.count else None
+
+    def percentile(self, q):
+        """
+        Estimates percentile as upper bound of bucket, accurate to 25%.
+
+        :param q: Percentile from 0 to 100.
+        :type q: float
+        :rtype: float | None
+        """
+        if not self.count:
+            return None
+
+        rank = q / 100.0 * self.count
+        seen = 0
+        for idx, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                bound = self.BOUNDS[idx] if idx < len(self.BOUNDS) else self.maximum
+                return min(bound, self.maximum)
+
+        return self.maximum
+
+    def to_dict(self):
+        """
+        Convert Histogram to dictionary.
+
+        :return: Dictionary with Histogram summary.
+        :rtype: dict[basestring, T]
+        """
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.mean,
+            'min': self.minimum,
+            'max': self.maximum,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+        }
+
+
+class HistogramRecorder(object):
+    """
+    In-process recorder aggregating spans into histograms.
+
+    Durations are kept per phase name, numeric attributes as '<phase>.<attribute>'
+    and errors are counted per phase and error code.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, span):
+        with self._lock:
+            self._add(span.name, span.duration)
+            for key, value in span.attributes.items():
+                if isinstance(value, (float, six.integer_types)) and not isinstance(value, bool):
+                    self._add(span.name + '.' + key, value)
+
+            if span.error is not None:
+                key = span.name, span.error
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+    def _add(self, name, value):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.add(value)
+
+    def __getitem__(self, name):
+        return self.histograms[name]
+
+    def __str__(self):
+        result = '{:<30}{:>8}{:>12}{:>12}{:>12}\n'.format('Phase', 'Count', 'Mean', 'P90', 'Max')
+        for name in sorted(self.histograms):
+            h = self.histograms[name]
+            result += '{:<30}{:>8}{:>12.4g}{:>12.4g}{:>12.4g}\n'.format(name, h.count, h.mean, h.percentile(90),
+                                                                    h.maximum)
+        for (name, code), count in sorted(self.errors.items(), key=lambda item: str(item[0])):
+            result += 'Error {0} in {1}: {2}\n'.format(code, name, count)
+
+        return result
+
+    def to_dict(self):
+        """
+        Convert HistogramRecorder to dictionary.
+
+        :return: Dictionary with summaries of histograms and error counts.
+        :rtype: dict[basestring, T]
+        """
+        with self._lock:
+            return {
+                'histograms': {name: h.to_dict() for name, h in self.histograms.items()},
+                'errors': [{'phase': name, 'code': code, 'count': count}
+                           for (name, code), count in self.errors.items()],
+            }
@@ -0,0 +1,12 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import six
+
+from .partition import ParallelOptimizer, Partition, Partitioner
+
+# Compact state reads shared buffers with memoryview.cast, which Python 2 lacks.
+if six.PY3:
+    from .compact import CompactState
+    from .pool import EvaluationPool, Outcome
+    from .snapshot import Snapshot
@@ -0,0 +1,338 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+import json
+import struct
+from array import array
+from math import asin, cos, isnan, radians, sin, sqrt
+
+import six
+
+if six.PY2:
+    raise ImportError('routevo.parallel.compact requires Python 3: columns are read with memoryview.cast.')
+
+from routevo.constraints.mixed.availability import Availability
+from routevo.constraints.restrictions import Restrictions
+from routevo.constraints.soft.tw import TimeWindow
+from routevo.job import Job
+from routevo.request import Request
+from routevo.route import Route
+from routevo.state import State
+from routevo.utils.penalty import Penalty
+from routevo.utils.point import Point
+from routevo.vehicle import Vehicle
+
+NAN = float('nan')
+MISSING = -2 ** 63
+
+WINDOW = ('lower', 'expected', 'upper', 'penalty')
+
+
+def _window(columns, prefix, window, penalties):
+    if window is None:
+        for name in WINDOW[:3]:
+            columns[prefix + name].append(NAN)
+        columns[prefix + 'penalty'].append(-1)
+        return
+
+    columns[prefix + 'lower'].append(window.lower)
+    columns[prefix + 'expected'].append(NAN if window.expected is None else window.expected)
+    columns[prefix + 'upper'].append(NAN if window.upper is None else window.upper)
+    columns[prefix + 'penalty'].append(penalties(window.penalty.to_dict()))
+
+
+class _Table(object):
+    """
+    Deduplicating table of JSON serializable objects.
+    """
+
+    def __init__(self):
+        self.items = []
+        self._keys = {}
+
+    def __call__(self, item):
+        key = json.dumps(item, sort_keys=True)
+        if key not in self._keys:
+            self._keys[key] = len(self.items)
+            self.items.append(item)
+        return self._keys[key]
+
+
+class CompactState(object):
+    """
+    Column oriented form of State.
+
+    Numeric properties of vehicles, requests, jobs and routes are kept in flat typed arrays,
+    while restrictions and penalties, which are shared by many objects, are kept once
+    in a small table referenced by index. Job rows 2i and 2i + 1 are pickup and delivery
+    of request row i. Routes are stored as offsets into one array of job rows.
+
+    Compact form serializes to a single buffer, and columns can be read from a buffer
+    without copying, eg. from shared memory. Requires Python 3, as do Snapshot and EvaluationPool
+    built on it.
+    """
+
+    MAGIC = b'RVCS'
+    ALIGNMENT = 8
+
+    COLUMNS = (
+        ('vehicle.id', 'q'), ('vehicle.longitude', 'd'), ('vehicle.latitude', 'd'),
+        ('vehicle.speed', 'd'), ('vehicle.amortization', 'd'), ('vehicle.salary', 'd'),
+        ('vehicle.time', 'd'), ('vehicle.waiting', 'd'), ('vehicle.locked', 'q'),
+        ('vehicle.restrictions', 'q'),
+        ('vehicle.availability.lower', 'd'), ('vehicle.availability.expected', 'd'),
+        ('vehicle.availability.upper', 'd'), ('vehicle.availability.penalty', 'q'),
+
+        ('request.id', 'q'), ('request.created', 'd'), ('request.size', 'd'), ('request.restrictions', 'q'),
+        ('request.transport.lower', 'd'), ('request.transport.expected', 'd'),
+        ('request.transport.upper', 'd'), ('request.transport.penalty', 'q'),
+        ('request.carry.lower', 'd'), ('request.carry.expected', 'd'),
+        ('request.carry.upper', 'd'), ('request.carry.penalty', 'q'),
+
+        ('job.id', 'q'), ('job.aid', 'q'), ('job.longitude', 'd'), ('job.latitude', 'd'), ('job.waiting', 'd'),
+        ('job.begin', 'd'), ('job.at', 'd'), ('job.end', 'd'),
+        ('job.arrival.lower', 'd'), ('job.arrival.expected', 'd'),
+        ('job.arrival.upper', 'd'), ('job.arrival.penalty', 'q'),
+
+        ('route.vehicle', 'q'), ('route.offset', 'q'), ('route.jobs', 'q'),
+    )
+
+    def __init__(self, columns, table):
+        """
+        Initialization method.
+
+        :param columns: Arrays or memory views by column name.
+        :type columns: dict[basestring, array.array | memoryview]
+        :param table: Restrictions and penalties dictionaries referenced by index columns.
+        :type table: dict[basestring, list[dict]]
+        """
+        self.columns = columns
+        self.table = table
+
+        self._rows = {}
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __len__(self):
+        return len(self.columns['request.id'])
+
+    def rows(self, kind):
+        """
+        Index of rows by object ID, built on first use.
+
+        :param kind: Column prefix, one of 'vehicle', 'request' or 'job'.
+        :type kind: basestring
+        :return: Row numbers by ID.
+        :rtype: dict[int, int]
+        """
+        if kind not in self._rows:
+            self._rows[kind] = {oid: row for row, oid in enumerate(self.columns[kind + '.id'])}
+        return self._rows[kind]
+
+    @classmethod
+    def from_state(cls, state):
+        """
+        Converts state to compact form.
+
+        :param state: State.
+        :type state: routevo.state.State
+        :rtype: CompactState
+        """
+        columns = {name: array(code) for name, code in cls.COLUMNS}
+        restrictions, penalties = _Table(), _Table()
+
+        vehicles = {}
+        for route in state.routes.values():
+            v = route.vehicle
+            vehicles[v.id] = len(vehicles)
+            for name, value in (('id', v.id), ('longitude', v.location.longitude),
+                                ('latitude', v.location.latitude), ('speed', v.speed),
+                                ('amortization', v.amortization), ('salary', v.salary), ('time', v.time),
+                                ('waiting', v.waiting), ('locked', v.locked),
+                                ('restrictions', restrictions(v.restrictions.to_dict()))):
+                columns['vehicle.' + name].append(value)
+            _window(columns, 'vehicle.availability.', v.availability, penalties)
+
+        requests = list(state.unassigned)
+        for route in state.routes.values():
+            requests.extend(route.requests)
+
+        rows = {}
+        for idx, r in enumerate(requests):
+            rows[r.pickup.id], rows[r.delivery.id] = 2 * idx, 2 * idx + 1
+
+            for name, value in (('id', r.id), ('created', r.created), ('size', r.size),
+                                ('restrictions', restrictions(r.restrictions.to_dict()))):
+                columns['request.' + name].append(value)
+            _window(columns, 'request.transport.', r.transport, penalties)
+            _window(columns, 'request.carry.', r.carry, penalties)
+
+            for j in (r.pickup, r.delivery):
+                for name, value in (('id', j.id), ('aid', MISSING if j.aid is None else j.aid),
+                                    ('longitude', j.location.longitude), ('latitude', j.location.latitude),
+                                    ('waiting', j.waiting), ('begin', NAN if j.begin is None else j.begin),
+                                    ('at', NAN if j.at is None else j.at), ('end', NAN if j.end is None else j.end)):
+                    columns['job.' + name].append(value)
+                _window(columns, 'job.arrival.', j.arrival, penalties)
+
+        for route in state.routes.values():
+            columns['route.vehicle'].append(vehicles[route.vehicle.id])
+            columns['route.offset'].append(len(columns['route.jobs']))
+            columns['route.jobs'].extend(rows[j.id] for j in route.jobs)
+        columns['route.offset'].append(len(columns['route.jobs']))
+
+        return cls(columns, {'restrictions': restrictions.items, 'penalties': penalties.items})
+
+    def to_bytes(self):
+        """
+        Serializes compact state to single buffer.
+
+        Buffer starts with magic bytes and length of JSON header describing columns and the table,
+        followed by aligned column data.
+
+        :rtype: bytes
+        """
+        layout, offset = [], 0
+        for name, code in self.COLUMNS:
+            column = self.columns[name]
+            size = len(column) * column.itemsize
+            layout.append([name, code, offset, len(column)])
+            offset += size + (-size) % self.ALIGNMENT
+
+        header = json.dumps({'columns': layout, 'table': self.table}).encode('utf-8')
+        start = len(self.MAGIC) + 8 + len(header)
+        start += (-start) % self.ALIGNMENT
+
+        result = bytearray(start + offset)
+        result[:len(self.MAGIC) + 8] = self.MAGIC + struct.pack('<Q', len(header))
+        result[len(self.MAGIC) + 8:len(self.MAGIC) + 8 + len(header)] = header
+
+        for (name, code, position, count) in layout:
+            data = memoryview(self.columns[name]).cast('B') if count else b''
+            result[start + position:start + position + len(data)] = data
+
+        return bytes(result)
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        """
+        Reads compact state from buffer created by to_bytes. Columns are views of buffer, not copies.
+
+        :param buffer: Serialized compact state.
+        :type buffer: bytes | bytearray | memoryview
+        :rtype: CompactState
+        """
+        view = memoryview(buffer)
+        if view.format != 'B':
+            view = view.cast('B')
+
+        assert bytes(view[:len(cls.MAGIC)]) == cls.MAGIC
+        length = struct.unpack('<Q', bytes(view[len(cls.MAGIC):len(cls.MAGIC) + 8]))[0]
+        header = json.loads(bytes(view[len(cls.MAGIC) + 8:len(cls.MAGIC) + 8 + length]).decode('utf-8'))
+
+        start = len(cls.MAGIC) + 8 + length
+        start += (-start) % cls.ALIGNMENT
+
+        columns = {}
+        for name, code, position, count in header['columns']:
+            size = count * array(code).itemsize
+            columns[name] = view[start + position:start + position + size].cast(code)
+
+        return cls(columns, header['table'])
+
+    def _window(self, prefix, row, kind=TimeWindow):
+        penalty = self.columns[prefix + 'penalty'][row]
+        if penalty < 0:
+            return None
+
+        lower, expected, upper = (self.columns[prefix + name][row] for name in WINDOW[:3])
+        return kind(lower, None if isnan(expected) else expected, None if isnan(upper) else upper,
+                    Penalty.from_dict(self.table['penalties'][penalty]))
+
+    def to_state(self):
+        """
+        Rebuilds state objects.
+
+        :rtype: routevo.state.State
+        """
+        c = self.columns
+        restrictions = self.table['restrictions']
+
+        def optional(value):
+            return None if isnan(value) else value
+
+        jobs = []
+        for row in range(len(c['job.id'])):
+            aid = c['job.aid'][row]
+            times = {'begin': optional(c['job.begin'][row]), 'at': optional(c['job.at'][row]),
+                     'end': optional(c['job.end'][row])}
+            jobs.append(Job(
+                c['job.id'][row], Job.ALL[row % 2], Point(c['job.longitude'][row], c['job.latitude'][row]),
+                self._window('job.arrival.', row), c['job.waiting'][row], None if aid == MISSING else aid, times
+            ))
+
+        requests = []
+        for row in range(len(c['request.id'])):
+            requests.append(Request(
+                c['request.id'][row], c['request.created'][row], c['request.size'][row],
+                jobs[2 * row], jobs[2 * row + 1],
+                self._window('request.transport.', row), self._window('request.carry.', row),
+                Restrictions.from_dict(json.loads(json.dumps(restrictions[c['request.restrictions'][row]])))
+            ))
+
+        vehicles = []
+        for row in range(len(c['vehicle.id'])):
+            vehicles.append(Vehicle(
+                c['vehicle.id'][row], Point(c['vehicle.longitude'][row], c['vehicle.latitude'][row]),
+                c['vehicle.speed'][row], c['vehicle.amortization'][row], c['vehicle.salary'][row],
+                self._window('vehicle.availability.', row, Availability), c['vehicle.locked'][row],
+                Restrictions.from_dict(json.loads(json.dumps(restrictions[c['vehicle.restrictions'][row]]))),
+                c['vehicle.time'][row], c['vehicle.waiting'][row]
+            ))
+
+        routes, assigned = [], set()
+        offsets = c['route.offset']
+        for idx in range(len(c['route.vehicle'])):
+            rows = c['route.jobs'][offsets[idx]:offsets[idx + 1]]
+            assigned.update(row // 2 for row in rows)
+            routes.append(Route(vehicles[c['route.vehicle'][idx]], [jobs[row] for row in rows]))
+
+        return State(routes, [r for row, r in enumerate(requests) if row not in assigned])
+
+    def cost(self, vid, jobs):
+        """
+        Cost of vehicle driving through jobs, the same as routevo.solver.evaluation.RouteEvaluator.cost
+        with straight distances, computed from columns without building objects.
+
+        :param vid: Vehicle ID.
+        :type vid: int
+        :param jobs: Job IDs in route order.
+        :type jobs: list[int]
+        :rtype: float
+        """
+        c = self.columns
+        rows = self.rows('job')
+
+        row = self.rows('vehicle')[vid]
+        lons, lats = c['job.longitude'], c['job.latitude']
+
+        length = 0.0
+        lon1, lat1 = c['vehicle.longitude'][row], radians(c['vehicle.latitude'][row])
+        for jid in jobs:
+            k = rows[jid]
+            lon2, lat2 = lons[k], radians(lats[k])
+            h = sin((lat2 - lat1) / 2.0) ** 2 + cos(lat1) * cos(lat2) * sin(radians(lon2 - lon1) / 2.0) ** 2
+            length += 2.0 * Point.EARTH_RADIUS * asin(min(1.0, sqrt(h)))
+            lon1, lat1 = lon2, lat2
+
+        speed = c['vehicle.speed'][row]
+        return length * (c['vehicle.amortization'][row] + c['vehicle.salary'][row] / speed) / 1000.0
@@ -0,0 +1,300 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+import threading
+import time
+from math import cos, radians
+
+import six
+
+from routevo.route import Route
+from routevo.service import Routevo, ServiceError
+from routevo.state import State
+from routevo.utils.checker import check
+from routevo.utils.spatial import GridIndex, METERS_PER_DEGREE
+
+
+class Partition(object):
+    """
+    State split into spatially coherent sub-states.
+
+    Every vehicle belongs to exactly one part together with its route. Unassigned request
+    belongs to the part of vehicle nearest to its pickup. Requests whose delivery is nearer
+    to vehicles of another part cross the boundary and have that part as an alternative.
+    """
+
+    def __init__(self, parts, alternatives):
+        """
+        Initialization method.
+
+        :param parts: Sub-states.
+        :type parts: list[routevo.state.State]
+        :param alternatives: Alternative part index of requests crossing boundary, by request ID.
+        :type alternatives: dict[int, int]
+        """
+        self.parts = parts
+        self.alternatives = alternatives
+
+        self.requests = {}
+        for part in parts:
+            for route in part.routes.values():
+                self.requests.update((r.id, r) for r in route.requests)
+            self.requests.update((r.id, r) for r in part.unassigned)
+
+    def __len__(self):
+        return len(self.parts)
+
+    def __iter__(self):
+        return iter(self.parts)
+
+    @property
+    def boundary(self):
+        """
+        IDs of requests crossing boundary between parts.
+
+        :rtype: set[int]
+        """
+        return set(self.alternatives)
+
+    def transfer(self, results):
+        """
+        Moves boundary requests left unassigned in their part to unassigned of alternative part.
+
+        :param results: Sub-states returned for parts, None for parts without result.
+        :type results: list[routevo.state.State | None]
+        :return: Indexes of parts which received requests.
+        :rtype: set[int]
+        """
+        changed = set()
+        for idx, result in enumerate(results):
+            if result is None:
+                continue
+
+            kept = []
+            for r in result.unassigned:
+                target = self.alternatives.get(r.id)
+                if target is None or target == idx:
+                    kept.append(r)
+                    continue
+
+                other = results[target] if results[target] is not None else self.parts[target]
+                other.unassigned.append(r)
+                results[target] = other
+                changed.add(target)
+
+            result.unassigned = kept
+
+        return changed
+
+    def merge(self, results):
+        """
+        Merges sub-states into one state.
+
+        Parts without result are taken as they were submitted. Each request ends up exactly once:
+        requests repeated in results are dropped from later routes, and requests missing in results
+        are restored as unassigned.
+
+        :param results: Sub-states returned for parts, None for parts without result.
+        :type results: list[routevo.state.State | None]
+        :rtype: routevo.state.State
+        """
+        assert len(results) == len(self.parts)
+
+        routes, unassigned, seen = [], [], set()
+        for part, result in zip(self.parts, results):
+            state = part if result is None else result
+            for route in state.routes.values():
+                jobs = [j for j in route.jobs if j.request.id not in seen]
+                seen.update(j.request.id for j in jobs)
+                if len(jobs) == len(route.jobs):
+                    routes.append(route)
+                else:
+                    routes.append(Route(route.vehicle, jobs))
+
+        for part, result in zip(self.parts, results):
+            state = part if result is None else result
+            for r in state.unassigned:
+                if r.id not in seen:
+                    seen.add(r.id)
+                    unassigned.append(r)
+
+        unassigned.extend(r for rid, r in self.requests.items() if rid not in seen)
+        return State(routes, unassigned)
+
+
+class Partitioner(object):
+    """
+    Splits large state with recursive bisection of vehicle locations.
+
+    Vehicles are halved along the longer side of their bounding box at the median,
+    until every part has at most the requested number of vehicles.
+    """
+
+    def __init__(self, vehicles=50):
+        """
+        Initialization method.
+
+        :param vehicles: Maximum number of vehicles in part.
+        :type vehicles: int
+        """
+        assert check(vehicles, six.integer_types) and vehicles > 0
+        self.vehicles = vehicles
+
+    def _bisect(self, routes):
+        if len(routes) <= self.vehicles:
+            return [routes]
+
+        lons = [r.vehicle.location.longitude for r in routes]
+        lats = [r.vehicle.location.latitude for r in routes]
+        scale = METERS_PER_DEGREE * cos(radians(sum(lats) / len(lats)))
+
+        if (max(lons) - min(lons)) * scale >= (max(lats) - min(lats)) * METERS_PER_DEGREE:
+            routes = sorted(routes, key=lambda r: r.vehicle.location.longitude)
+        else:
+            routes = sorted(routes, key=lambda r: r.vehicle.location.latitude)
+
+        half = len(routes) // 2
+        return self._bisect(routes[:half]) + self._bisect(routes[half:])
+
+    def split(self, state):
+        """
+        Splits state into parts.
+
+        :param state: State to split.
+        :type state: routevo.state.State
+        :rtype: Partition
+        """
+        groups = self._bisect(list(state.routes.values())) if state.routes else [[]]
+
+        owner = {}
+        for idx, group in enumerate(groups):
+            owner.update((r.vehicle.id, idx) for r in group)
+
+        index = GridIndex.build([(r.vehicle.id, r.vehicle.location) for r in state.routes.values()])
+        unassigned = [[] for _ in groups]
+        alternatives = {}
+
+        for request in state.unassigned:
+            near = index.nearest(request.pickup.location)
+            idx = owner[near[0][1]] if near else 0
+            unassigned[idx].append(request)
+
+            near = index.nearest(request.delivery.location)
+            other = owner[near[0][1]] if near else idx
+            if other != idx:
+                alternatives[request.id] = other
+
+        parts = [State(list(group), requests) for group, requests in zip(groups, unassigned)]
+        return Partition(parts, alternatives)
+
+
+class ParallelOptimizer(object):
+    """
+    Optimizes large state as concurrent jobs of its parts.
+
+    Every part is submitted by its own Routevo client, as client allows one job in flight.
+    Boundary requests left unassigned in their part get a second round in the alternative part.
+    Parts which fail keep their submitted routes, so merged state is always complete. Failures, including
+    parts without result after all polls, are recorded in errors as (part index, exception) pairs.
+    """
+
+    def __init__(self, key, algorithm, distances, partitioner=None, interval=5.0, attempts=120, rounds=2,
+                 **options):
+        """
+        Initialization method.
+
+        :param key: API access key.
+        :type key: basestring
+        :param algorithm: Optimization algorithm configuration applied to every part.
+        :type algorithm: routevo.service.Algorithm
+        :param distances: Distance matrix configuration applied to every part.
+        :type distances: routevo.service.Distances
+        :param partitioner: Partitioner, 50 vehicles per part by default.
+        :type partitioner: Partitioner | None
+        :param interval: Seconds between result polls.
+        :type interval: float
+        :param attempts: Maximum number of result polls per part.
+        :type attempts: int
+        :param rounds: Number of rounds, second and next ones for requests crossing boundary.
+        :type rounds: int
+        :param options: Keyword arguments of Routevo clients of parts, eg. url, tracer or endpoints.
+            Journal is not shared by clients, it records one stream of submissions.
+        :type options: dict[basestring, T]
+        """
+        assert 'journal' not in options, 'Journal records one stream of submissions'
+        assert isinstance(key, six.string_types)
+        assert check(interval, (float, six.integer_types))
+        assert check(attempts, six.integer_types) and attempts > 0
+        assert check(rounds, six.integer_types) and rounds > 0
+
+        self.key = key
+        self.algorithm = algorithm
+        self.distances = distances
+        self.partitioner = Partitioner() if partitioner is None else partitioner
+        self.interval = float(interval)
+        self.attempts = attempts
+        self.rounds = rounds
+        self.options = options
+        self.errors = []
+
+    def _client(self):
+        return Routevo(self.key, **self.options)
+
+    def _solve(self, client, state, results, idx):
+        try:
+            job = client.optimize(state, self.algorithm, self.distances)
+            for _ in range(self.attempts):
+                status, result = client.result(job)
+                if result is not None:
+                    results[idx] = result
+                    return
+                time.sleep(self.interval)
+            self.errors.append((idx, ServiceError('No result after {} polls.'.format(self.attempts), 4)))
+        except Exception as ex:
+            self.errors.append((idx, ex))
+
+    def optimize(self, state):
+        """
+        Splits, optimizes and merges state.
+
+        :param state: State to optimize.
+        :type state: routevo.state.State
+        :return: Merged result.
+        :rtype: routevo.state.State
+        """
+        self.errors = []
+        partition = self.partitioner.split(state)
+        clients = [self._client() for _ in partition.parts]
+
+        results = [None] * len(partition)
+        pending = set(range(len(partition)))
+        for _ in range(self.rounds):
+            if not pending:
+                break
+
+            submitted = {idx: results[idx] if results[idx] is not None else partition.parts[idx] for idx in pending}
+            threads = [
+                threading.Thread(target=self._solve, args=(clients[idx], submitted[idx], results, idx))
+                for idx in pending
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+            # Client still waiting for its job would refuse the next submission.
+            for idx in submitted:
+                if clients[idx].job is not None:
+                    clients[idx] = self._client()
+
+            pending = partition.transfer(results)
+
+        return partition.merge(results)
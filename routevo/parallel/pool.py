@@ -0,0 +1,185 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+import multiprocessing
+
+from routevo.parallel.snapshot import Snapshot
+from routevo.route import Route
+from routevo.solver.insertion import GreedyInsertion
+from routevo.solver.search import LocalSearch
+from routevo.state import State
+
+# State of worker process, set once by _attach.
+_snapshot = None
+_compact = None
+_state = None
+
+
+def _attach(name, path):
+    global _snapshot, _compact, _state
+
+    _snapshot = Snapshot.attach(name, path)
+    _compact = _snapshot.compact
+    _state = None
+
+
+def _score(routes):
+    return sum(_compact.cost(vid, jobs) for vid, jobs in routes.items())
+
+
+def _start(args):
+    global _state
+
+    seed, timeout = args
+    if _state is None:
+        _state = _compact.to_state()
+
+    search = LocalSearch(timeout)
+    start = GreedyInsertion(seed=seed).solve(_state)
+    result = search.improve(start)
+
+    routes = {vid: [j.id for j in r.jobs] for vid, r in result.routes.items()}
+    return Outcome(seed, _score(routes), routes, [r.id for r in result.unassigned], search.statistics.evaluated)
+
+
+class Outcome(object):
+    """
+    Small result of a single start, sent back from worker.
+    """
+
+    def __init__(self, seed, cost, routes, unassigned, evaluated):
+        """
+        Initialization method.
+
+        :param seed: Seed of start.
+        :type seed: int
+        :param cost: Cost of routes.
+        :type cost: float
+        :param routes: Job IDs in route order by vehicle ID.
+        :type routes: dict[int, list[int]]
+        :param unassigned: IDs of requests left unassigned.
+        :type unassigned: list[int]
+        :param evaluated: Number of moves evaluated by local search.
+        :type evaluated: int
+        """
+        self.seed = seed
+        self.cost = cost
+        self.routes = routes
+        self.unassigned = unassigned
+        self.evaluated = evaluated
+
+    def __repr__(self):
+        return 'Outcome({0}: {1:.2f}, {2} unassigned)'.format(self.seed, self.cost, len(self.unassigned))
+
+    def apply(self, state):
+        """
+        Builds state with routes of outcome from objects of original state.
+
+        :param state: State evaluated by pool.
+        :type state: routevo.state.State
+        :rtype: routevo.state.State
+        """
+        jobs, requests = {}, {}
+        for route in state.routes.values():
+            jobs.update((j.id, j) for j in route.jobs)
+        for r in state.unassigned:
+            jobs[r.pickup.id], jobs[r.delivery.id] = r.pickup, r.delivery
+            requests[r.id] = r
+
+        routes = [Route(state.routes[vid].vehicle, [jobs[jid] for jid in seq]) for vid, seq in self.routes.items()]
+        return State(routes, [requests[rid] for rid in self.unassigned])
+
+
+class EvaluationPool(object):
+    """
+    Process pool evaluating candidate solutions of one state in parallel.
+
+    State is published as Snapshot once, when the pool starts. Workers attach to it without copying
+    and exchange only route orders and costs with the parent.
+    """
+
+    def __init__(self, state, processes=None):
+        """
+        Initialization method.
+
+        :param state: State shared with workers.
+        :type state: routevo.state.State
+        :param processes: Number of worker processes, number of CPUs by default.
+        :type processes: int | None
+        """
+        self.state = state
+        self.snapshot = Snapshot.publish(state)
+        self._pool = multiprocessing.Pool(
+            processes, initializer=_attach, initargs=(self.snapshot.name, self.snapshot.path)
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Stops workers and removes snapshot.
+        """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot.unlink()
+            self.snapshot = None
+
+    def costs(self, candidates, chunksize=16):
+        """
+        Scores candidate solutions.
+
+        :param candidates: Candidate solutions, each as job IDs in route order by vehicle ID.
+        :type candidates: list[dict[int, list[int]]]
+        :param chunksize: Number of candidates sent to worker at once.
+        :type chunksize: int
+        :return: Costs in order of candidates.
+        :rtype: list[float]
+        """
+        return self._pool.map(_score, candidates, chunksize)
+
+    def starts(self, seeds, timeout=1.0):
+        """
+        Runs independent starts of greedy insertion followed by local search.
+
+        Every start perturbs urgency of unassigned requests with its seed, see GreedyInsertion,
+        so starts insert requests in different orders.
+
+        :param seeds: Seeds of starts.
+        :type seeds: list[int]
+        :param timeout: Time budget of local search of each start in seconds.
+        :type timeout: float
+        :return: Outcomes in order of seeds.
+        :rtype: list[Outcome]
+        """
+        return self._pool.map(_start, [(seed, timeout) for seed in seeds], 1)
+
+    def best(self, seeds, timeout=1.0):
+        """
+        Runs starts and returns the best of them: with the fewest unassigned requests, then the cheapest.
+
+        :param seeds: Seeds of starts.
+        :type seeds: list[int]
+        :param timeout: Time budget of local search of each start in seconds.
+        :type timeout: float
+        :return: Best state built from objects of pool state.
+        :rtype: routevo.state.State
+        """
+        outcome = min(self.starts(seeds, timeout), key=lambda o: (len(o.unassigned), o.cost))
+        return outcome.apply(self.state)
@@ -0,0 +1,168 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+import mmap
+import os
+import tempfile
+
+from routevo.parallel.compact import CompactState
+
+try:
+    from multiprocessing.shared_memory import SharedMemory
+except ImportError:
+    SharedMemory = None
+
+
+def _shared(name):
+    try:
+        # Python 3.13+: attaching process does not register segment for removal at its exit.
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        return SharedMemory(name=name)
+
+
+class Snapshot(object):
+    """
+    State published for other processes in shared memory or memory mapped file.
+
+    Snapshot holds CompactState buffer: numeric columns of vehicles, requests, jobs and route orders,
+    and a small JSON table of restrictions and penalties. Processes attach to snapshot by its name
+    or path and read columns directly from shared pages, without deserializing or copying them.
+    Attached snapshots are read-only.
+
+    Usage::
+
+        with Snapshot.publish(state) as snapshot:
+            # In worker process:
+            worker = Snapshot.attach(name=snapshot.name)
+            sizes = worker.compact['request.size']
+            row = worker.compact.rows('request')[rid]
+            worker.close()
+
+    Columns stay valid until snapshot is closed and must not be used after it.
+    """
+
+    def __init__(self, buffer, handle, name=None, path=None, owner=False):
+        """
+        Initialization method. Use publish or attach instead.
+
+        :param buffer: Snapshot data.
+        :type buffer: memoryview
+        :param handle: SharedMemory or mmap object holding data.
+        :type handle: T
+        :param name: Shared memory segment name.
+        :type name: basestring | None
+        :param path: Memory mapped file path.
+        :type path: basestring | None
+        :param owner: Whether snapshot was published by this process, owner removes data on unlink.
+        :type owner: bool
+        """
+        self.name = name
+        self.path = path
+        self.owner = owner
+
+        self._buffer = buffer
+        self._handle = handle
+        # Closed SharedMemory can still remove its segment, so publisher keeps it for unlink.
+        self._memory = handle if name is not None else None
+        self.compact = CompactState.from_buffer(buffer)
+
+    @classmethod
+    def publish(cls, state, path=None):
+        """
+        Creates snapshot of state.
+
+        :param state: Published state.
+        :type state: routevo.state.State
+        :param path: File path of snapshot. Shared memory is used when not given and available,
+                     temporary file otherwise.
+        :type path: basestring | None
+        :rtype: Snapshot
+        """
+        payload = CompactState.from_state(state).to_bytes()
+
+        if path is None and SharedMemory is not None:
+            memory = SharedMemory(create=True, size=len(payload))
+            memory.buf[:len(payload)] = payload
+            return cls(memory.buf[:len(payload)].toreadonly(), memory, name=memory.name, owner=True)
+
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix='routevo-', suffix='.snapshot')
+            os.close(fd)
+
+        with open(path, 'wb') as f:
+            f.write(payload)
+
+        return cls.attach(path=path)._own()
+
+    @classmethod
+    def attach(cls, name=None, path=None):
+        """
+        Attaches to published snapshot.
+
+        :param name: Shared memory segment name, Snapshot.name of publisher.
+        :type name: basestring | None
+        :param path: Memory mapped file path, Snapshot.path of publisher.
+        :type path: basestring | None
+        :rtype: Snapshot
+        """
+        assert (name is None) != (path is None), 'Exactly one of name and path is required'
+
+        if name is not None:
+            memory = _shared(name)
+            return cls(memory.buf.toreadonly(), memory, name=name)
+
+        with open(path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(memoryview(data), data, path=path)
+
+    def _own(self):
+        self.owner = True
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        if self.owner:
+            self.unlink()
+
+    def __len__(self):
+        return len(self._buffer) if self._buffer is not None else 0
+
+    def close(self):
+        """
+        Detaches from snapshot. Columns of compact state are released.
+        """
+        if self._handle is None:
+            return
+
+        for column in self.compact.columns.values():
+            column.release()
+        self._buffer.release()
+        self._buffer = None
+
+        self._handle.close()
+        self._handle = None
+
+    def unlink(self):
+        """
+        Removes snapshot data, other attached processes keep their mappings until they close them.
+        """
+        if self._memory is not None:
+            self._memory.unlink()
+        elif self.name is not None:
+            memory = _shared(self.name)
+            memory.close()
+            memory.unlink()
+        elif self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
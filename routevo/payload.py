@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+import json
+
+from routevo.cache import StateFingerprint
+
+
+def _vehicle_version(vehicle):
+    """
+    Properties of vehicle commonly changed in place: location, its age, locked jobs and waiting time.
+    """
+    return vehicle.location.longitude, vehicle.location.latitude, vehicle.time, vehicle.locked, vehicle.waiting
+
+
+def _request_version(request):
+    """
+    Realization times of jobs of request, which change in place as the request is served.
+    """
+    return tuple((j.begin, j.at, j.end) for j in (request.pickup, request.delivery))
+
+
+class PayloadCache(object):
+    """
+    Serialized state kept in fragments, so that only changed parts are serialized again.
+
+    Every vehicle, request and route order is cached as JSON text together with a cheap version of the object:
+    location, location age, locked count and waiting time of vehicle, and realization times of jobs of request.
+    Replaced objects, changed versions and changed job orders are detected automatically. Other properties
+    modified in place, eg. restrictions, must be invalidated explicitly.
+
+    State fingerprint (see routevo.cache.StateFingerprint) is maintained along with fragments, so that only
+    changed items are hashed again. Output is equivalent to json.dumps(state.to_dict()).
+    """
+
+    def __init__(self, state):
+        """
+        Initialization method.
+
+        :param state: Serialized state. Later changes of state are reflected by dumps.
+        :type state: routevo.state.State
+        """
+        self.state = state
+        self._vehicles = {}
+        self._requests = {}
+        self._routes = {}
+        self._fingerprint = StateFingerprint()
+
+    def invalidate_vehicle(self, vid):
+        """
+        Drops cached vehicle, eg. after its restrictions changed.
+
+        :param vid: Vehicle ID.
+        :type vid: int
+        """
+        self._vehicles.pop(vid, None)
+
+    def invalidate_request(self, rid):
+        """
+        Drops cached request, eg. after its time windows changed.
+
+        :param rid: Request ID.
+        :type rid: int
+        """
+        self._requests.pop(rid, None)
+
+    def clear(self):
+        """
+        Drops all cached fragments.
+        """
+        self._vehicles.clear()
+        self._requests.clear()
+        self._routes.clear()
+        self._fingerprint = StateFingerprint()
+
+    @staticmethod
+    def _fragment(cache, key, obj, version):
+        """
+        Cached JSON of object, and whether it was serialized again.
+        """
+        entry = cache.get(key)
+        if entry is not None and entry[0] is obj and entry[1] == version:
+            return entry[2], False
+
+        cache[key] = obj, version, json.dumps(obj.to_dict())
+        return cache[key][2], True
+
+    def _route(self, route):
+        order = [j.id for j in route.jobs]
+        entry = self._routes.get(route.vehicle.id)
+        if entry is not None and entry[0] == order:
+            return entry[1], False
+
+        text = json.dumps({'jobs': order, 'distances': [], 'times': []})
+        self._routes[route.vehicle.id] = order, text
+        return text, True
+
+    def _refresh(self):
+        """
+        Brings fragments and fingerprint up to date with state.
+
+        :return: JSON fragments of vehicles, requests and routes.
+        :rtype: (list[basestring], list[basestring], list[basestring])
+        """
+        fingerprint = self._fingerprint
+        vehicles, requests, routes = [], [], []
+        rids = set()
+
+        def request(r):
+            text, changed = self._fragment(self._requests, r.id, r, _request_version(r))
+            if changed:
+                fingerprint.update_request(r)
+            requests.append(text)
+            rids.add(r.id)
+
+        for vid, route in self.state.routes.items():
+            text, changed = self._fragment(self._vehicles, vid, route.vehicle, _vehicle_version(route.vehicle))
+            vehicles.append(text)
+            order, reordered = self._route(route)
+            if changed or reordered:
+                fingerprint.update_route(route)
+            routes.append('{0}: {1}'.format(json.dumps(str(vid)), order))
+
+            for r in route.requests:
+                request(r)
+
+        for r in self.state.unassigned:
+            request(r)
+
+        # Removed vehicles and requests.
+        for vid in [vid for vid in self._vehicles if vid not in self.state.routes]:
+            del self._vehicles[vid]
+            self._routes.pop(vid, None)
+            fingerprint.remove_route(vid)
+        for rid in [rid for rid in self._requests if rid not in rids]:
+            del self._requests[rid]
+            fingerprint.remove_request(rid)
+
+        return vehicles, requests, routes
+
+    def fingerprint(self):
+        """
+        Fingerprint of current state, updated only for items changed since the previous call.
+
+        :rtype: routevo.cache.StateFingerprint
+        """
+        self._refresh()
+        return self._fingerprint
+
+    def dumps(self):
+        """
+        Serializes state.
+
+        :return: JSON text of state dictionary.
+        :rtype: basestring
+        """
+        vehicles, requests, routes = self._refresh()
+
+        return '{{"vehicles": [{0}], "requests": [{1}], "routes": {{{2}}}}}'.format(
+            ', '.join(vehicles), ', '.join(requests), ', '.join(routes))
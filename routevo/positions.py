@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+import time
+
+from routevo.utils.point import Point
+
+
+def update_positions(state, vehicles, longitudes, latitudes, timestamps, cache=None, now=None):
+    """
+    Applies batch of GPS positions to vehicles of state.
+
+    Positions are given as parallel sequences, eg. lists or array.array columns of a feed buffer.
+    Timestamps are converted to location ages, Vehicle.time, relative to now and the newest report
+    of a vehicle in batch wins. Report is applied only when its location is younger than the one
+    of vehicle, so out of order and repeated reports are ignored. Zero age, the default, stands for
+    vehicle without timed location, which takes any report. Unknown vehicles are skipped.
+
+    Returned routes start from new locations, so their timing, eg. Route.timeline, needs recomputation.
+    Cached payload fragments of moved vehicles are invalidated, everything else stays valid.
+
+    :param state: State with vehicles.
+    :type state: routevo.state.State
+    :param vehicles: Vehicle IDs.
+    :type vehicles: list[int]
+    :param longitudes: Longitudes.
+    :type longitudes: list[float]
+    :param latitudes: Latitudes.
+    :type latitudes: list[float]
+    :param timestamps: Unix times of positions in seconds.
+    :type timestamps: list[float]
+    :param cache: Payload cache of state.
+    :type cache: routevo.payload.PayloadCache | None
+    :param now: Unix time to which ages are computed, current time when None.
+    :type now: float | None
+    :return: IDs of vehicles which moved.
+    :rtype: set[int]
+    """
+    assert len(vehicles) == len(longitudes) == len(latitudes) == len(timestamps)
+
+    now = time.time() if now is None else now
+    youngest = {}
+    routes = state.routes
+    for idx, vid in enumerate(vehicles):
+        route = routes.get(vid)
+        if route is None:
+            continue
+
+        age = max(0.0, now - timestamps[idx])
+        best = youngest.get(vid)
+        if best is not None:
+            if age < best[0]:
+                youngest[vid] = age, idx
+        elif route.vehicle.time <= 0 or age < route.vehicle.time:
+            youngest[vid] = age, idx
+
+    for vid, (age, idx) in youngest.items():
+        vehicle = routes[vid].vehicle
+        vehicle.location = Point(longitudes[idx], latitudes[idx])
+        vehicle.time = age
+        if cache is not None:
+            cache.invalidate_vehicle(vid)
+
+    return set(youngest)
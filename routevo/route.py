@@ -96,3 +96,41 @@ class Route(object):
         """
 
         return tuple(j.request for j in self.jobs if Job.MULTIPLIER[j.type] < 0)
+
+    def timeline(self, distances):
+        """
+        Estimates arrival and departure times of route points.
+
+        Vehicle starts from its current location once its waiting time passes and the availability opens.
+        Finished phases of jobs are taken as they were realized.
+
+        :param distances: Local distance source, eg. routevo.utils.distance.StraightDistance.
+        :type distances: routevo.utils.distance.StraightDistance
+        :return: List of (arrival, departure) pairs in seconds from now, one per job.
+        :rtype: list[(float, float)]
+        """
+        vehicle = self.vehicle
+        availability = vehicle.availability
+
+        t = vehicle.waiting
+        if availability is not None:
+            t = max(t, availability.lower)
+
+        result = []
+        location = vehicle.location
+        for j in self.jobs:
+            if j.end is not None:
+                arrival = j.end if j.at is None else j.at
+                t = j.end
+            else:
+                t += distances.duration(location, j.location, vehicle.speed)
+                if j.arrival is not None:
+                    t = max(t, j.arrival.lower)
+
+                arrival = t if j.at is None else j.at
+                t = arrival + j.waiting
+
+            result.append((arrival, t))
+            location = j.location
+
+        return result
@@ -10,13 +10,22 @@
 # this file. If not, please visit <https://opensource.org/licenses/MIT>
 
 import json
+import time
+from collections import OrderedDict
+from timeit import default_timer
 
 import requests
 import six
 from requests import ConnectionError
 from requests import Timeout
 
-from routevo.state import State
+from routevo.cache import ResultCache, StateFingerprint
+from routevo.compaction import compact
+from routevo.locations import LocationTable
+from routevo.metrics import Tracer
+from routevo.payload import PayloadCache
+from routevo.state import LazyState, State
+from routevo.tuning import SolveRecord, SolveStats, estimate
 from routevo.utils.checker import check
 
 
@@ -91,6 +100,37 @@ class ServiceError(Exception):
         return 'Routevo Service Error: "{}", code: {}'.format(self.reason, self.code)
 
 
+class Incumbent(object):
+    """
+    Best solution found so far by optimization job.
+    """
+
+    def __init__(self, status, revision, cost=None, unassigned=None, state=None):
+        """
+        Initialization method.
+
+        :param status: Job status.
+        :type status: basestring
+        :param revision: Number of changes of job, increasing with every better solution or status change.
+        :type revision: int
+        :param cost: Cost of solution reported by service.
+        :type cost: float | None
+        :param unassigned: Number of unassigned requests of solution.
+        :type unassigned: int | None
+        :param state: Solution, None when there is none yet or it did not change since the requested revision.
+        :type state: T
+        """
+        self.status = status
+        self.revision = revision
+        self.cost = cost
+        self.unassigned = unassigned
+        self.state = state
+
+    def __str__(self):
+        return 'Status: {0}, revision: {1}, cost: {2}, unassigned: {3}'.format(
+            self.status, self.revision, self.cost, self.unassigned)
+
+
 class Routevo(object):
     """
     Routevo service communication wrapper.
@@ -98,18 +138,150 @@ class Routevo(object):
 
     URL = 'http://127.0.0.1:7777'
 
-    def __init__(self, key):
+    CACHED = 'cache:'
+
+    def __init__(self, key, tracer=None, cache=None, compaction=False, locations=None, limiter=None, fleet=None,
+                 url=None, endpoints=None, journal=None, stats=None):
         """
         Service initialization.
 
+        Every call is split into timed phases reported to tracer: 'optimize' with 'optimize.to_dict',
+        'optimize.encode', 'optimize.post' and 'optimize.parse', 'result' with 'result.get', 'result.parse'
+        and 'result.from_dict', 'best' with 'best.get', 'best.parse' and 'best.from_dict', and 'job'
+        covering the time from submission to received result with number of polls. Tracing is disabled
+        without tracer.
+
+        Usage::
+
+            recorder = HistogramRecorder()
+            service = Routevo(API_KEY, Tracer([recorder]))
+            ...
+            print(recorder)
+
+        With result cache, state identical to an earlier one (see routevo.cache.StateFingerprint) is not sent
+        to the service. Optimize returns job ID starting with CACHED and result returns copy of the earlier result.
+        Cached job IDs expire with time to live of cache and the oldest ones are dropped beyond size of cache.
+
+        With compaction, finished requests are removed from submitted state (see routevo.compaction.compact)
+        and put back into result, so that result is complete. Lazy results are decoded in full then.
+
+        With locations precision, submitted state carries table of distinct locations
+        (see routevo.locations.LocationTable), so distance matrix can be computed over locations instead of jobs.
+
+        With limiter, submissions wait for their turn in queue shared with other instances
+        (see routevo.throttle.SubmissionQueue), reported as 'optimize.queue' with queue depth. Service response
+        with HTTP status 429 pauses the limiter for the time given by Retry-After header.
+
+        With endpoints, every submission goes to an endpoint chosen by the pool (see routevo.endpoints.EndpointPool)
+        and fails over to another one when connection fails. Results are fetched from the endpoint owning the job
+        and previous task is sent only to its owner.
+
+        With journal (see routevo.journal.JobJournal), submissions and results are recorded on disk. New instance
+        with the same journal reattaches to the job left pending, available as job, and continues from
+        the previous task. Submission of the state of pending job returns that job instead of starting a new one.
+        Pending job which service lost is given up with abandon.
+
+        With stats, every completed job adds record of submitted state size, timeouts, wall time and result cost
+        (see routevo.tuning.SolveRecord), used by routevo.tuning.TimeoutTuner. Wall time is the job time reported
+        by service, or the middle between the last poll without result and the first one with it. Cost is
+        estimated locally when service does not report it, and the record is flagged as estimated.
+
         :param key: API access key.
         :type key: basestring
+        :param tracer: Tracer of client phases.
+        :type tracer: routevo.metrics.Tracer | None
+        :param cache: Cache of results.
+        :type cache: routevo.cache.ResultCache | None
+        :param compaction: Whether to remove finished requests from submitted states.
+        :type compaction: bool
+        :param locations: Number of decimal places of coordinates compared by location table, None disables table.
+        :type locations: int | None
+        :param limiter: Rate limiter of submissions shared by instances.
+        :type limiter: routevo.throttle.SubmissionQueue | None
+        :param fleet: Fleet name determining priority of submissions in limiter.
+        :type fleet: basestring | None
+        :param url: Base URL of service, overrides URL of class.
+        :type url: basestring | None
+        :param endpoints: Pool of service endpoints shared by instances, overrides URL.
+        :type endpoints: routevo.endpoints.EndpointPool | None
+        :param journal: Journal of jobs of this instance.
+        :type journal: routevo.journal.JobJournal | None
+        :param stats: Store of solve statistics.
+        :type stats: routevo.tuning.SolveStats | None
         """
         assert isinstance(key, six.string_types)
+        assert check(tracer, (Tracer, None))
+        assert check(cache, (ResultCache, None))
+        assert isinstance(compaction, bool)
+        assert check(locations, (six.integer_types, None))
+        assert check(fleet, (six.string_types, None))
+        assert check(url, (six.string_types, None))
+        assert check(stats, (SolveStats, None))
         self.key = key
+        self.tracer = Tracer() if tracer is None else tracer
+        self.cache = cache
+        self.compaction = compaction
+        self.locations = locations
+        self.limiter = limiter
+        self.fleet = fleet
+        self.endpoints = endpoints
+        self.journal = journal
+        self.stats = stats
+        if url is not None:
+            self.URL = url.rstrip('/')
 
         self.__previous_job = None
         self.__current_job = None
+        self.__resumed = None
+        self.__fingerprint = None
+        self.__hits = OrderedDict()
+        self.__folded = {}
+        self.__owners = {}
+        self.__records = {}
+        self.__job_span = None
+        self.__polls = 0
+
+        if journal is not None:
+            self._resume(journal)
+
+    def _endpoint(self, url):
+        for endpoint in self.endpoints.endpoints:
+            if endpoint.url == url:
+                return endpoint
+        return None
+
+    def _resume(self, journal):
+        self.__previous_job = journal.previous
+        previous = None if self.endpoints is None else self._endpoint(journal.endpoint)
+        if previous is not None:
+            self.__owners[journal.previous] = previous
+
+        pending = journal.pending
+        if not pending:
+            return
+
+        entry = pending[-1]
+        self.__current_job = self.__resumed = entry['job']
+        self.__fingerprint = entry.get('fingerprint')
+        if self.endpoints is not None:
+            endpoint = self._endpoint(entry.get('endpoint'))
+            if endpoint is not None:
+                self.endpoints.started(endpoint)
+                self.__owners[entry['job']] = endpoint
+        elif entry.get('endpoint'):
+            self.URL = entry['endpoint']
+
+        for older in pending[:-1]:
+            journal.abandon(older['job'])
+
+    @property
+    def job(self):
+        """
+        Optimization job in flight.
+
+        :rtype: basestring | None
+        """
+        return self.__current_job
 
     @staticmethod
     def _validate(response):
@@ -126,7 +298,65 @@ class Routevo(object):
 
         return result
 
-    def optimize(self, state, algorithm, distances):
+    def address(self, job=None):
+        """
+        Base URL of service endpoint owning job.
+
+        :param job: Optimization job ID, None for URL of instance.
+        :type job: basestring | None
+        :rtype: basestring
+        """
+        endpoint = self.__owners.get(job)
+        return self.URL if endpoint is None else endpoint.url
+
+    def _get(self, job, path, params=None):
+        endpoint = self.__owners.get(job)
+        try:
+            return requests.get('{}{}/{}'.format(self.address(job), path, job), params=params)
+        except (Timeout, ConnectionError):
+            if endpoint is not None:
+                self.endpoints.failed(endpoint)
+            raise ServiceError('Service unavailable: timeout.', 4)
+
+    def _post(self, data):
+        """
+        Posts submission, to endpoint chosen by pool if there is one.
+
+        :return: Response, endpoint and duration of request.
+        :rtype: (requests.Response, routevo.endpoints.Endpoint | None, float)
+        """
+        pool = self.endpoints
+        if pool is None:
+            started = default_timer()
+            try:
+                response = requests.post('{}/api/v1/solve'.format(self.URL), data=data, timeout=10)
+            except (Timeout, ConnectionError):
+                raise ServiceError('Service unavailable: timeout.', 4)
+            return response, None, default_timer() - started
+
+        previous = self.__owners.get(self.__previous_job)
+        tried = []
+        while True:
+            endpoint = pool.choose(previous, tried)
+            data['previous_task'] = self.__previous_job if endpoint is previous else None
+
+            started = default_timer()
+            try:
+                response = requests.post('{}/api/v1/solve'.format(endpoint.url), data=data, timeout=10)
+            except (Timeout, ConnectionError):
+                pool.failed(endpoint)
+                tried.append(endpoint)
+                continue
+            return response, endpoint, default_timer() - started
+
+    @staticmethod
+    def _retry_after(response, default=1.0):
+        try:
+            return float(response.headers.get('Retry-After', default))
+        except ValueError:
+            return default
+
+    def optimize(self, state, algorithm, distances, fingerprint=None, payload=None, priority=None):
         """
         Sends state to Routevo service for optimization.
 
@@ -136,57 +366,320 @@ class Routevo(object):
         :type algorithm: Algorithm
         :param distances: Distance matrix calculation parameters
         :type distances: Distances
+        :param fingerprint: Fingerprint of state maintained by caller, used by result cache and journal.
+            Taken from payload cache or computed from state when not given.
+        :type fingerprint: routevo.cache.StateFingerprint | None
+        :param payload: Payload cache of state, which serializes only parts changed since previous submission.
+            Not used with compaction or location table, which change submitted state.
+        :type payload: routevo.payload.PayloadCache | None
+        :param priority: Priority in limiter queue overriding the fleet one.
+        :type priority: int | None
         :return: Optimization job ID.
         :rtype: basestring
         """
 
-        if self.__current_job is not None:
+        if self.__current_job is not None and self.__current_job != self.__resumed:
             raise ServiceError('Optimization in progress. Wait till the end, before submitting next state.', 3)
 
         assert isinstance(state, State)
         assert isinstance(algorithm, Algorithm)
         assert isinstance(distances, Distances)
+        assert check(fingerprint, (StateFingerprint, None))
+        assert check(payload, (PayloadCache, None))
+        assert payload is None or payload.state is state
+
+        tracer = self.tracer
+        folded = None
+        if self.compaction:
+            with tracer.span('optimize.compact') as span:
+                state, folded = compact(state)
+                span.set('removed', len(folded))
+
+        key = hit = None
+        if self.cache is not None or self.journal is not None:
+            with tracer.span('optimize.fingerprint') as span:
+                if fingerprint is None and payload is not None and folded is None:
+                    fingerprint = payload.fingerprint()
+                fingerprint = StateFingerprint(state) if fingerprint is None else fingerprint
+                key = fingerprint.hexdigest(algorithm, distances)
+
+                if self.cache is not None and self.__current_job is None:
+                    hit = self.cache.serialized(key)
+                    span.set('hit', int(hit is not None))
 
-        data = {
-            'state': json.dumps(state.to_dict()),
-            'key': self.key,
-            'distances': json.dumps(distances.to_dict()),
-            'algorithm': json.dumps(algorithm.to_dict()),
-            'previous_task': self.__previous_job
-        }
-
-        try:
-            response = requests.post('{}/api/v1/solve'.format(self.URL), data=data, timeout=10)
-        except (Timeout, ConnectionError):
-            raise ServiceError('Service unavailable: timeout.', 4)
+        if self.__current_job is not None:
+            if self.journal is None or self.journal.fingerprint(self.__current_job) != key:
+                raise ServiceError('Optimization in progress. Wait till the end, before submitting next state.', 3)
+
+            # The same state as of job resumed from journal.
+            self.__folded[self.__current_job] = folded
+            return self.__current_job
+
+        self.__fingerprint = key
+        if self.cache is not None:
+            if hit is not None:
+                job = self.CACHED + self.__fingerprint
+                self.__hits.pop(job, None)
+                self.__hits[job] = (time.time() + self.cache.ttl,) + hit
+                self.__folded[job] = folded
+                self._expire()
+                return job
+
+        if folded is not None or self.locations is not None:
+            payload = None
+
+        if self.limiter is not None:
+            with tracer.span('optimize.queue') as span:
+                span.set('depth', self.limiter.depth)
+                span.set('wait', self.limiter.acquire(self.fleet, priority))
+
+        started = default_timer()
+        with tracer.span('optimize') as total:
+            with tracer.span('optimize.to_dict'):
+                data = None if payload is not None else state.to_dict()
+
+            if self.locations is not None:
+                with tracer.span('optimize.locations') as span:
+                    table = LocationTable.from_state(state, self.locations)
+                    table.annotate(data)
+                    span.set('ratio', table.ratio)
+
+            with tracer.span('optimize.encode') as span:
+                data = {
+                    # Encoded once here, so that span reports bytes actually sent.
+                    'state': (json.dumps(data) if payload is None else payload.dumps()).encode('utf-8'),
+                    'key': self.key,
+                    'distances': json.dumps(distances.to_dict()),
+                    'algorithm': json.dumps(algorithm.to_dict()),
+                    'previous_task': self.__previous_job
+                }
+                span.set('bytes', len(data['state']))
+
+            with tracer.span('optimize.post') as span:
+                response, endpoint, latency = self._post(data)
+                if endpoint is not None:
+                    span.set('endpoint', endpoint.url)
+
+            if response.status_code == 429 and self.limiter is not None:
+                self.limiter.pause(self._retry_after(response))
+
+            with tracer.span('optimize.parse'):
+                result = self._validate(response)
+
+            self.__current_job = result.get('jid')
+            self.__folded[self.__current_job] = folded
+            if endpoint is not None:
+                self.endpoints.started(endpoint, latency)
+                self.__owners[self.__current_job] = endpoint
+            if self.stats is not None:
+                self.__records[self.__current_job] = [SolveRecord.measure(state, algorithm, distances), started, None]
+            if self.journal is not None:
+                self.journal.submitted(self.__current_job, self.__fingerprint, data['previous_task'],
+                                       self.address(self.__current_job))
+            self.__job_span = tracer.span('job', self.__current_job)
+            self.__polls = 0
+            total.set('job', self.__current_job)
 
-        result = self._validate(response)
-        self.__current_job = result.get('jid')
         return self.__current_job
 
-    def result(self, job):
+    def result(self, job, lazy=False):
         """
         Gets results of the optimization.
 
+        Lazy result decodes vehicles, requests and routes only when accessed, which saves most of
+        decoding time when only a few routes are used, eg.::
+
+            status, result = service.result(job, lazy=True)
+            for vid in changed:
+                dispatch(result.routes[vid])
+
         :param job: Optimization job ID.
         :type job: basestring
+        :param lazy: Whether to return LazyState instead of State.
+        :type lazy: bool
         :return: status, result
         :rtype: (basestring, T)
         """
 
         assert isinstance(job, six.string_types)
 
-        try:
-            response = requests.get('{}/api/v1/result/{}'.format(self.URL, job))
-        except (Timeout, ConnectionError):
-            raise ServiceError('Service unavailable: timeout.', 4)
+        if job.startswith(self.CACHED):
+            status, data = self._hit(job)
+            return status, self._restore(job, LazyState(data) if lazy else State.from_dict(data))
+
+        tracer = self.tracer
+        with tracer.span('result', job):
+            self.__polls += 1
+
+            with tracer.span('result.get', job) as span:
+                response = self._get(job, '/api/v1/result')
+                span.set('bytes', len(response.content))
+
+            with tracer.span('result.parse', job):
+                result = self._validate(response)
+            if job in self.__records and not result.get('state'):
+                self.__records[job][2] = default_timer()
+
+            with tracer.span('result.from_dict', job):
+                data = result.get('state')
+                # Fingerprint belongs to the job in flight, results fetched again are not cached.
+                if data and self.cache is not None and job == self.__current_job and self.__fingerprint is not None:
+                    self.cache.put(self.__fingerprint, result.get('status'), data)
+
+                if not data:
+                    state = None
+                elif lazy:
+                    state = LazyState(data)
+                else:
+                    state = State.from_dict(data)
+
+        # Job is finished by the first result with state, results fetched again only restore state.
+        if state is not None and job == self.__current_job:
+            if self.__job_span is not None:
+                self.__job_span.set('polls', self.__polls)
+                self.__job_span.finish()
+                self.__job_span = None
+
+            owner = self.__owners.get(job)
+            if owner is not None:
+                self.endpoints.finished(owner)
+            if self.journal is not None:
+                self.journal.finished(job, result.get('status'))
+            if job in self.__records:
+                self._record(job, state, result)
+            if self.__previous_job != job:
+                self.__owners.pop(self.__previous_job, None)
+                self.__folded.pop(self.__previous_job, None)
 
-        result = self._validate(response)
-        data = result.get('state')
-        state = State.from_dict(data) if data else None
-
-        if state is not None:
             self.__previous_job = self.__current_job
             self.__current_job = None
+            self.__fingerprint = None
+
+        if state is not None:
+            state = self._restore(job, state, keep=job == self.__previous_job)
 
         return result.get('status'), state
+
+    def abandon(self, job):
+        """
+        Gives up job in flight whose result will not be fetched, eg. job resumed from journal which service lost,
+        so that next state can be submitted. Abandoned job does not become previous task.
+
+        :param job: Optimization job ID.
+        :type job: basestring
+        """
+        assert isinstance(job, six.string_types)
+
+        if job != self.__current_job:
+            return
+
+        owner = self.__owners.pop(job, None)
+        if owner is not None:
+            self.endpoints.finished(owner)
+        if self.journal is not None:
+            self.journal.abandon(job)
+        if self.__job_span is not None:
+            self.__job_span.finish()
+            self.__job_span = None
+
+        self.__records.pop(job, None)
+        self.__folded.pop(job, None)
+        self.__current_job = None
+        self.__fingerprint = None
+
+    def best(self, job, since=None, lazy=False):
+        """
+        Gets the best solution found so far by running optimization, without waiting for the end.
+
+        Caller may act on early solution and keep polling for better ones, passing revision of the last
+        received solution, so that unchanged solution is not transferred again, eg.::
+
+            incumbent = service.best(job)
+            while incumbent.status != 'done':
+                if incumbent.state is not None:
+                    dispatch(incumbent.state)
+                time.sleep(1)
+                incumbent = service.best(job, since=incumbent.revision)
+
+        Job is finished only by result, which still has to be called for the final solution.
+
+        :param job: Optimization job ID.
+        :type job: basestring
+        :param since: Revision already received.
+        :type since: int | None
+        :param lazy: Whether solution is LazyState instead of State.
+        :type lazy: bool
+        :rtype: Incumbent
+        """
+        assert isinstance(job, six.string_types)
+        assert check(since, (six.integer_types, None))
+
+        if job.startswith(self.CACHED):
+            status, data = self._hit(job, keep=True)
+            state = None if since else LazyState(data) if lazy else State.from_dict(data)
+            return Incumbent(status, 1, state=None if state is None else self._restore(job, state, keep=True))
+
+        tracer = self.tracer
+        with tracer.span('best', job):
+            with tracer.span('best.get', job) as span:
+                response = self._get(job, '/api/v1/best', {} if since is None else {'since': since})
+                span.set('bytes', len(response.content))
+
+            with tracer.span('best.parse', job):
+                result = self._validate(response)
+
+            with tracer.span('best.from_dict', job):
+                data = result.get('state')
+                if not data:
+                    state = None
+                elif lazy:
+                    state = LazyState(data)
+                else:
+                    state = State.from_dict(data)
+
+        if state is not None:
+            state = self._restore(job, state, keep=True)
+
+        return Incumbent(result.get('status'), result.get('revision', 0), result.get('cost'),
+                         result.get('unassigned'), state)
+
+    def _record(self, job, state, result):
+        record, started, polled = self.__records.pop(job)
+        if result.get('time') is not None:
+            record.wall = float(result['time'])
+        else:
+            # Job finished between the last poll without result and this one.
+            now = default_timer()
+            record.wall = (now if polled is None else (polled + now) / 2.0) - started
+
+        cost = result.get('cost')
+        record.cost = estimate(state) if cost is None else cost
+        record.estimated = cost is None
+        record.unassigned = len(state.unassigned)
+        self.stats.add(record)
+
+    def _expire(self):
+        """
+        Drops cached job IDs past time to live of cache, and the oldest ones beyond its size.
+        """
+        now = time.time()
+        while self.__hits:
+            job, entry = next(iter(self.__hits.items()))
+            if entry[0] >= now and len(self.__hits) <= self.cache.size:
+                break
+            del self.__hits[job]
+            self.__folded.pop(job, None)
+
+    def _hit(self, job, keep=False):
+        """
+        Status and decoded JSON of result of cached job ID.
+        """
+        self._expire()
+        entry = self.__hits.get(job) if keep else self.__hits.pop(job, None)
+        if entry is None:
+            raise ServiceError('Unknown or expired cached job.', 5)
+        return entry[1], json.loads(entry[2])
+
+    def _restore(self, job, state, keep=False):
+        folded = self.__folded.get(job) if keep else self.__folded.pop(job, None)
+        return state if folded is None else folded.restore(state)
@@ -0,0 +1,6 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from .evaluation import Plan, RouteEvaluator
+from .insertion import GreedyInsertion
+from .search import LocalSearch, SearchStatistics
@@ -0,0 +1,244 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+from routevo.constraints.hard.limit import MaximumDeliveriesConstraint
+from routevo.job import Job
+from routevo.route import Route
+from routevo.utils.distance import StraightDistance
+from routevo.validation.feasibility import FeasibilityChecker
+
+INF = float('inf')
+
+
+class RouteEvaluator(object):
+    """
+    Cost and feasibility of routes for local heuristics.
+
+    Cost of a route is its length priced with vehicle amortization per kilometer
+    and driver salary per hour of driving. Besides hard constraints checked by FeasibilityChecker,
+    upper limits of arrival, carry and transport time windows are treated as hard.
+    """
+
+    TIME_WINDOW = 'TimeWindow'
+
+    def __init__(self, distances=None, compatibility=None):
+        """
+        Initialization method.
+
+        :param distances: Local distance source.
+        :type distances: routevo.utils.distance.StraightDistance | None
+        :param compatibility: Compiled attribute compatibility of vehicles and requests.
+        :type compatibility: routevo.validation.compatibility.CompatibilityMatrix | None
+        """
+        self.distances = StraightDistance() if distances is None else distances
+        self.compatibility = compatibility
+        self.checker = FeasibilityChecker(self.distances, full=True)
+
+    @staticmethod
+    def rate(vehicle):
+        """
+        Cost of one meter driven by vehicle.
+
+        :param vehicle: Vehicle.
+        :type vehicle: routevo.vehicle.Vehicle
+        :rtype: float
+        """
+        return (vehicle.amortization + vehicle.salary / vehicle.speed) / 1000.0
+
+    def cost(self, vehicle, jobs):
+        """
+        Cost of driving through jobs.
+
+        :param vehicle: Vehicle executing jobs.
+        :type vehicle: routevo.vehicle.Vehicle
+        :param jobs: Route points.
+        :type jobs: list[routevo.job.Job]
+        :rtype: float
+        """
+        length, location = 0.0, vehicle.location
+        for j in jobs:
+            length += self.distances.distance(location, j.location)
+            location = j.location
+
+        return length * self.rate(vehicle)
+
+    @staticmethod
+    def limit(vehicle, job, pickup):
+        """
+        Latest possible start of job service.
+
+        :param vehicle: Vehicle executing job.
+        :type vehicle: routevo.vehicle.Vehicle
+        :param job: Job.
+        :type job: routevo.job.Job
+        :param pickup: Departure time from pickup of request, for deliveries.
+        :type pickup: float | None
+        :rtype: float
+        """
+        upper = INF
+        if job.arrival is not None:
+            upper = job.arrival.upper
+        if vehicle.availability is not None:
+            upper = min(upper, vehicle.availability.upper - job.waiting)
+
+        if job.type == Job.DELIVERY:
+            request = job.request
+            if request.transport is not None:
+                upper = min(upper, request.created + request.transport.upper)
+            if request.carry is not None and pickup is not None:
+                upper = min(upper, pickup + request.carry.upper)
+
+        return upper
+
+    def violations(self, vehicle, jobs):
+        """
+        Violated constraints of route.
+
+        :param vehicle: Vehicle executing jobs.
+        :type vehicle: routevo.vehicle.Vehicle
+        :param jobs: Route points.
+        :type jobs: list[routevo.job.Job]
+        :return: Set of (constraint name, job ID) pairs.
+        :rtype: set[(basestring, int)]
+        """
+        route = Route(vehicle, jobs)
+        result = set((v.constraint, v.job) for v in self.checker.check_route(route, self.compatibility))
+
+        pickups = {}
+        for j, (arrival, departure) in zip(jobs, route.timeline(self.distances)):
+            if j.end is not None:
+                continue
+
+            if j.type == Job.PICKUP:
+                pickups[j.request.id] = departure
+            elif j.request.pickup.end is not None:
+                pickups[j.request.id] = j.request.pickup.end
+
+            if arrival > self.limit(vehicle, j, pickups.get(j.request.id)):
+                result.add((self.TIME_WINDOW, j.id))
+
+        return result
+
+
+class Plan(object):
+    """
+    Route prepared for fast insertion and removal checks.
+
+    Node 0 is the vehicle start and node k is the k-th job. Plan keeps node of every job and,
+    for every node, arrival before and after waiting, load and number of deliveries on board after service,
+    and slack: the largest delay of arrival at node that keeps it and all following nodes
+    within their time limits. Nodes that are already late do not limit the slack.
+    """
+
+    def __init__(self, vehicle, jobs, evaluator):
+        """
+        Initialization method.
+
+        :param vehicle: Vehicle executing route.
+        :type vehicle: routevo.vehicle.Vehicle
+        :param jobs: Route points, owned and modified by plan.
+        :type jobs: list[routevo.job.Job]
+        :param evaluator: Route evaluator.
+        :type evaluator: RouteEvaluator
+        """
+        self.vehicle = vehicle
+        self.jobs = jobs
+        self.evaluator = evaluator
+
+        hard = vehicle.restrictions.hard
+        self.capacity = INF if vehicle.capacity is None else vehicle.capacity
+        self.deliveries = min([c.limit for c in hard if isinstance(c, MaximumDeliveriesConstraint)] or [INF])
+        self.rate = evaluator.rate(vehicle)
+
+        self.refresh()
+
+    def refresh(self):
+        """
+        Recomputes node data after jobs change.
+        """
+        vehicle, distances = self.vehicle, self.evaluator.distances
+        timeline = Route(vehicle, self.jobs).timeline(distances)
+
+        self.points = [vehicle.location] + [j.location for j in self.jobs]
+        self.positions = {j.id: k for k, j in enumerate(self.jobs, 1)}
+        self.edges = [distances.distance(a, b) for a, b in zip(self.points, self.points[1:])]
+
+        n = len(self.points)
+        self.raw = [0.0] * n
+        self.start = [0.0] * n
+        self.departure = [0.0] * n
+        self.wait = [0.0] * n
+        self.upper = [INF] * n
+        self.load = [0.0] * n
+        self.count = [0] * n
+
+        t = vehicle.waiting
+        if vehicle.availability is not None:
+            t = max(t, vehicle.availability.lower)
+        self.raw[0] = self.start[0] = self.departure[0] = t
+
+        picked = set(j.request.id for j in self.jobs if j.type == Job.PICKUP)
+        onboard = [j.request for j in self.jobs if j.type == Job.DELIVERY and j.request.id not in picked]
+        load, count = sum(r.size for r in onboard), len(onboard)
+        self.load[0], self.count[0] = load, count
+
+        pickups = {}
+        for k, (j, (arrival, departure)) in enumerate(zip(self.jobs, timeline), 1):
+            raw = self.departure[k - 1] + distances.duration(self.points[k - 1], j.location, vehicle.speed)
+            self.raw[k] = min(raw, arrival)
+            self.start[k] = arrival
+            self.departure[k] = departure
+            self.wait[k] = arrival - self.raw[k]
+
+            if j.type == Job.PICKUP:
+                pickups[j.request.id] = departure
+                load, count = load + j.request.size, count + 1
+            else:
+                load, count = load - j.request.size, count - 1
+            self.load[k], self.count[k] = load, count
+
+            if j.end is None:
+                upper = self.evaluator.limit(vehicle, j, pickups.get(j.request.id, j.request.pickup.end))
+                self.upper[k] = upper if arrival <= upper else INF
+
+        self.slack = [INF] * (n + 1)
+        for k in range(n - 1, 0, -1):
+            self.slack[k] = self.wait[k] + min(self.upper[k] - self.start[k], self.slack[k + 1])
+
+        self.violations = self.evaluator.violations(vehicle, self.jobs)
+
+    @property
+    def length(self):
+        """
+        Route length in meters.
+
+        :rtype: float
+        """
+        return sum(self.edges)
+
+    @property
+    def cost(self):
+        """
+        Route cost.
+
+        :rtype: float
+        """
+        return self.length * self.rate
+
+    def accepts(self, jobs):
+        """
+        Checks whether changed jobs sequence introduces no new violations.
+
+        :param jobs: Candidate route points.
+        :type jobs: list[routevo.job.Job]
+        :rtype: bool
+        """
+        return self.evaluator.violations(self.vehicle, jobs) <= self.violations
@@ -0,0 +1,263 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+import heapq
+from random import Random
+
+import six
+
+from routevo.route import Route
+from routevo.solver.evaluation import INF, Plan, RouteEvaluator
+from routevo.state import State
+from routevo.utils.checker import check
+from routevo.utils.spatial import GridIndex
+from routevo.validation.compatibility import CompatibilityMatrix
+from routevo.validation.windows import TimeWindowBounds
+
+
+def _urgency(request):
+    arrival = request.delivery.arrival
+    return INF if arrival is None else arrival.upper
+
+
+def insertions(plan, request):
+    """
+    Generates feasible insertions of request into plan, checked with node slacks in constant time each.
+
+    Pickup is inserted after node p - 1 and delivery after node q of the original route, q >= p - 1.
+    Insertions never precede locked jobs. Candidates still have to be confirmed with Plan.accepts,
+    as carry limits of requests already in route and structural constraints are not covered here.
+
+    :param plan: Route plan.
+    :type plan: routevo.solver.evaluation.Plan
+    :param request: Request to insert.
+    :type request: routevo.request.Request
+    :return: Generator of (cost delta, p, q) tuples.
+    :rtype: collections.Iterable[(float, int, int)]
+    """
+    vehicle, evaluator = plan.vehicle, plan.evaluator
+    distances, speed = evaluator.distances, vehicle.speed
+    pickup, delivery = request.pickup, request.delivery
+
+    points, edges = plan.points, plan.edges
+    n = len(points)
+    if plan.load[0] + request.size > plan.capacity:
+        return
+
+    to_pickup = [distances.distance(p, pickup.location) for p in points]
+    to_delivery = [distances.distance(p, delivery.location) for p in points]
+    direct = distances.distance(pickup.location, delivery.location)
+
+    p_lower = -INF if pickup.arrival is None else pickup.arrival.lower
+    d_lower = -INF if delivery.arrival is None else delivery.arrival.lower
+    p_upper = evaluator.limit(vehicle, pickup, None)
+
+    # Arrivals only grow along the route, which allows to stop scanning once a limit is exceeded.
+    # Accumulated waiting allows to propagate arrival delay in constant time.
+    waits = [0.0] * n
+    for k in range(1, n):
+        waits[k] = waits[k - 1] + plan.wait[k]
+
+    for p in range(vehicle.locked + 1, n + 1):
+        if plan.load[p - 1] + request.size > plan.capacity or plan.count[p - 1] + 1 > plan.deliveries:
+            continue
+
+        p_start = max(plan.departure[p - 1] + to_pickup[p - 1] * 3.6 / speed, p_lower)
+        if p_start > p_upper:
+            break
+
+        p_departure = p_start + pickup.waiting
+        d_upper = evaluator.limit(vehicle, delivery, p_departure)
+
+        if p < n:
+            after = p_departure + to_pickup[p] * 3.6 / speed
+            shift = after - plan.raw[p]
+            detour = to_pickup[p - 1] + to_pickup[p] - edges[p - 1]
+        else:
+            shift, detour = 0.0, to_pickup[p - 1]
+
+        # Delivery right after pickup.
+        d_start = max(p_departure + direct * 3.6 / speed, d_lower)
+        if d_start <= d_upper:
+            d_departure = d_start + delivery.waiting
+            if p < n:
+                delta = to_pickup[p - 1] + direct + to_delivery[p] - edges[p - 1]
+                if d_departure + to_delivery[p] * 3.6 / speed - plan.raw[p] <= plan.slack[p]:
+                    yield delta * plan.rate, p, p - 1
+            else:
+                yield (to_pickup[p - 1] + direct) * plan.rate, p, p - 1
+
+        if p == n or shift > plan.slack[p]:
+            continue
+
+        # Delivery after one of following nodes.
+        load, count = plan.load[p - 1], plan.count[p - 1]
+        for q in range(p, n):
+            load, count = max(load, plan.load[q]), max(count, plan.count[q])
+            if load + request.size > plan.capacity or count + 1 > plan.deliveries:
+                break
+
+            delay = max(0.0, shift - (waits[q] - waits[p - 1]))
+            d_start = max(plan.departure[q] + delay + to_delivery[q] * 3.6 / speed, d_lower)
+            if d_start > d_upper:
+                break
+
+            d_departure = d_start + delivery.waiting
+            if q + 1 < n:
+                if d_departure + to_delivery[q + 1] * 3.6 / speed - plan.raw[q + 1] > plan.slack[q + 1]:
+                    continue
+                delta = detour + to_delivery[q] + to_delivery[q + 1] - edges[q]
+            else:
+                delta = detour + to_delivery[q]
+
+            yield delta * plan.rate, p, q
+
+
+def nearest(request, index, compatibility, k, bounds=None):
+    """
+    IDs of vehicles nearest to request pickup which can serve request.
+
+    :param request: Request.
+    :type request: routevo.request.Request
+    :param index: Spatial index of vehicle locations by vehicle ID.
+    :type index: routevo.utils.spatial.GridIndex
+    :param compatibility: Compiled attribute compatibility.
+    :type compatibility: routevo.validation.compatibility.CompatibilityMatrix
+    :param k: Number of vehicles.
+    :type k: int
+    :param bounds: Time window bounds excluding vehicles which cannot meet request time limits.
+    :type bounds: routevo.validation.windows.TimeWindowBounds | None
+    :rtype: list[int]
+    """
+    def eligible(vid):
+        if bounds is not None and not bounds.feasible(vid, request.id):
+            return False
+        return compatibility.compatible(vid, request.id)
+
+    return [vid for _, vid in index.nearest(request.pickup.location, k, eligible)]
+
+
+def insert(jobs, request, p, q):
+    """
+    Builds jobs sequence with request inserted at positions produced by insertions.
+
+    :param jobs: Route points.
+    :type jobs: list[routevo.job.Job]
+    :param request: Inserted request.
+    :type request: routevo.request.Request
+    :param p: Pickup position.
+    :type p: int
+    :param q: Delivery position.
+    :type q: int
+    :rtype: list[routevo.job.Job]
+    """
+    return jobs[:p - 1] + [request.pickup] + jobs[p - 1:q] + [request.delivery] + jobs[q:]
+
+
+class GreedyInsertion(object):
+    """
+    Local construction heuristic.
+
+    Inserts unassigned requests, the most urgent first, at the cheapest feasible positions
+    of routes whose vehicles are nearest to the pickup. It is meant as an offline fallback
+    when the service is unavailable, eg.::
+
+        try:
+            job = service.optimize(state, algorithm, distances)
+        except ServiceError as ex:
+            if ex.code != 4:
+                raise
+            state = GreedyInsertion().solve(state)
+
+    Locked jobs, attribute filters, capacity, cumulation constraints, vehicle availability
+    and upper limits of time windows are respected. Vehicles which cannot meet time windows of request
+    even when driving straight to it are not considered. Requests that do not fit anywhere
+    remain unassigned.
+
+    With a seed, urgency of every request is scaled by a random factor up to 1 + noise and ties are
+    broken randomly, so solvers with different seeds insert requests in different orders.
+    """
+
+    def __init__(self, distances=None, candidates=8, attempts=3, seed=None, noise=0.1):
+        """
+        Initialization method.
+
+        :param distances: Local distance source.
+        :type distances: routevo.utils.distance.StraightDistance | None
+        :param candidates: Number of nearest vehicles considered for each request.
+        :type candidates: int
+        :param attempts: Number of cheapest insertions verified before request is skipped.
+        :type attempts: int
+        :param seed: Seed of random insertion order, strictly by urgency when None.
+        :type seed: int | None
+        :param noise: Maximum relative perturbation of urgency with seed.
+        :type noise: float
+        """
+        assert check(candidates, six.integer_types) and candidates > 0
+        assert check(attempts, six.integer_types) and attempts > 0
+        assert check(seed, (six.integer_types, None))
+        assert check(noise, (float, six.integer_types)) and noise >= 0
+
+        self.distances = distances
+        self.candidates = candidates
+        self.attempts = attempts
+        self.seed = seed
+        self.noise = float(noise)
+
+    def _order(self, requests):
+        """
+        Requests in insertion order, the most urgent first.
+        """
+        if self.seed is None:
+            return sorted(requests, key=_urgency)
+
+        rng = Random(self.seed)
+        keys = {r.id: (_urgency(r) * (1.0 + self.noise * rng.random()), rng.random()) for r in requests}
+        return sorted(requests, key=lambda r: keys[r.id])
+
+    def solve(self, state):
+        """
+        Assigns unassigned requests of state. Input state is left untouched.
+
+        :param state: State with unassigned requests.
+        :type state: routevo.state.State
+        :return: New state sharing vehicles and requests with input.
+        :rtype: routevo.state.State
+        """
+        compatibility = CompatibilityMatrix(state)
+        evaluator = RouteEvaluator(self.distances, compatibility)
+        plans = {vid: Plan(r.vehicle, list(r.jobs), evaluator) for vid, r in state.routes.items()}
+        index = GridIndex.build([(vid, p.vehicle.location) for vid, p in plans.items()])
+        bounds = TimeWindowBounds(state, evaluator.distances, compatibility, lazy=True)
+
+        unassigned = []
+        for request in self._order(state.unassigned):
+            eligible = [plans[vid] for vid in nearest(request, index, compatibility, self.candidates, bounds)]
+            if not self._insert(request, eligible):
+                unassigned.append(request)
+
+        return State([Route(p.vehicle, p.jobs) for p in plans.values()], unassigned)
+
+    def _insert(self, request, plans):
+        options = []
+        for idx, plan in enumerate(plans):
+            for delta, p, q in insertions(plan, request):
+                options.append((delta, idx, p, q))
+
+        for delta, idx, p, q in heapq.nsmallest(self.attempts, options):
+            plan = plans[idx]
+            jobs = insert(plan.jobs, request, p, q)
+            if plan.accepts(jobs):
+                plan.jobs[:] = jobs
+                plan.refresh()
+                return True
+
+        return False
@@ -0,0 +1,401 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+import time
+
+import six
+
+from routevo.job import Job
+from routevo.route import Route
+from routevo.solver.evaluation import Plan, RouteEvaluator
+from routevo.solver.insertion import insert, insertions, nearest
+from routevo.state import State
+from routevo.utils.checker import check
+from routevo.utils.spatial import GridIndex
+from routevo.validation.compatibility import CompatibilityMatrix
+from routevo.validation.windows import TimeWindowBounds
+
+EPSILON = 1e-6
+
+
+class SearchStatistics(object):
+    """
+    Counters of a local search run.
+    """
+
+    MOVES = ('two_opt', 'or_opt', 'relocate', 'exchange')
+
+    def __init__(self):
+        self.evaluated = 0
+        self.applied = {m: 0 for m in self.MOVES}
+        self.elapsed = 0.0
+        self.initial = 0.0
+        self.final = 0.0
+
+    @property
+    def rate(self):
+        """
+        Evaluated moves per second.
+
+        :rtype: float
+        """
+        return self.evaluated / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return 'Moves: {0} evaluated ({1:.0f}/s), {2} applied, cost {3:.2f} -> {4:.2f}'.format(
+            self.evaluated, self.rate, sum(self.applied.values()), self.initial, self.final)
+
+    def to_dict(self):
+        """
+        Convert SearchStatistics to dictionary.
+
+        :return: Dictionary with SearchStatistics properties.
+        :rtype: dict[basestring, T]
+        """
+        return {
+            'evaluated': self.evaluated,
+            'applied': dict(self.applied),
+            'elapsed': self.elapsed,
+            'rate': self.rate,
+            'initial': self.initial,
+            'final': self.final,
+        }
+
+
+def removal(plan, request):
+    """
+    Cost delta of removing request from plan, computed from plan edges in constant time.
+
+    :param plan: Route plan containing both jobs of request.
+    :type plan: routevo.solver.evaluation.Plan
+    :param request: Removed request.
+    :type request: routevo.request.Request
+    :return: Cost delta and jobs without request.
+    :rtype: (float, list[routevo.job.Job])
+    """
+    distance = plan.evaluator.distances.distance
+    points, edges = plan.points, plan.edges
+    n = len(points)
+
+    a, b = plan.positions[request.pickup.id], plan.positions[request.delivery.id]
+    if b == a + 1:
+        gain = edges[a - 1] + edges[a]
+        if b + 1 < n:
+            gain += edges[b] - distance(points[a - 1], points[b + 1])
+    else:
+        gain = edges[a - 1] + edges[a] - distance(points[a - 1], points[a + 1]) + edges[b - 1]
+        if b + 1 < n:
+            gain += edges[b] - distance(points[b - 1], points[b + 1])
+
+    jobs = [j for j in plan.jobs if j.request is not request]
+    return -gain * plan.rate, jobs
+
+
+def movable(plan):
+    """
+    Requests which can be moved to other route: both jobs are in route and not locked.
+
+    :param plan: Route plan.
+    :type plan: routevo.solver.evaluation.Plan
+    :rtype: list[routevo.request.Request]
+    """
+    locked = plan.vehicle.locked
+    return [
+        j.request for k, j in enumerate(plan.jobs, 1)
+        if k > locked and j.type == Job.PICKUP and j.request.delivery.id in plan.positions
+    ]
+
+
+def cheapest(plan, request):
+    """
+    Cheapest feasible insertion of request into plan.
+
+    :return: Number of evaluated insertions and (cost delta, p, q) or None.
+    :rtype: (int, (float, int, int) | None)
+    """
+    best, evaluated = None, 0
+    for option in insertions(plan, request):
+        evaluated += 1
+        if best is None or option < best:
+            best = option
+
+    return evaluated, best
+
+
+class LocalSearch(object):
+    """
+    Local improvement of routes under a time budget.
+
+    Applies pickup and delivery aware moves until no improving one is found or time runs out:
+    reversal of route segments (2-opt), shift of up to three consecutive jobs within route (or-opt),
+    relocation of request to another route and exchange of requests between two routes.
+    Cost deltas are computed from route plans in constant time and only improving moves
+    are confirmed with full route evaluation. Locked jobs are never moved.
+    """
+
+    def __init__(self, timeout=1.0, distances=None, candidates=5, segment=3):
+        """
+        Initialization method.
+
+        :param timeout: Time budget in seconds.
+        :type timeout: float
+        :param distances: Local distance source.
+        :type distances: routevo.utils.distance.StraightDistance | None
+        :param candidates: Number of nearest vehicles considered for relocation and exchange.
+        :type candidates: int
+        :param segment: Maximum number of jobs shifted by or-opt.
+        :type segment: int
+        """
+        assert check(timeout, (float, six.integer_types))
+        assert check(candidates, six.integer_types) and candidates > 0
+        assert check(segment, six.integer_types) and segment > 0
+
+        self.timeout = float(timeout)
+        self.distances = distances
+        self.candidates = candidates
+        self.segment = segment
+        self.statistics = SearchStatistics()
+
+    def improve(self, state):
+        """
+        Improves routes of state. Input state is left untouched, unassigned requests are kept as they are.
+
+        :param state: State to improve.
+        :type state: routevo.state.State
+        :return: New state sharing vehicles and requests with input.
+        :rtype: routevo.state.State
+        """
+        started = time.time()
+        deadline = started + self.timeout
+        self.statistics = stats = SearchStatistics()
+
+        compatibility = CompatibilityMatrix(state)
+        evaluator = RouteEvaluator(self.distances, compatibility)
+        plans = {vid: Plan(r.vehicle, list(r.jobs), evaluator) for vid, r in state.routes.items()}
+        index = GridIndex.build([(vid, p.vehicle.location) for vid, p in plans.items()])
+        bounds = TimeWindowBounds(state, evaluator.distances, compatibility, lazy=True)
+        stats.initial = sum(p.cost for p in plans.values())
+
+        improved = True
+        while improved and time.time() < deadline:
+            improved = False
+            for plan in plans.values():
+                improved |= self._two_opt(plan, deadline)
+                improved |= self._or_opt(plan, deadline)
+
+            improved |= self._relocate(plans, index, compatibility, bounds, deadline)
+            improved |= self._exchange(plans, index, compatibility, bounds, evaluator, deadline)
+
+        stats.final = sum(p.cost for p in plans.values())
+        stats.elapsed = time.time() - started
+        return State([Route(p.vehicle, p.jobs) for p in plans.values()], list(state.unassigned))
+
+    def _apply(self, move, *changes):
+        for plan, jobs in changes:
+            if not plan.accepts(jobs):
+                return False
+
+        for plan, jobs in changes:
+            plan.jobs[:] = jobs
+            plan.refresh()
+
+        self.statistics.applied[move] += 1
+        return True
+
+    def _two_opt(self, plan, deadline):
+        """
+        Reverses segment of nodes i..j. Segment cannot contain both jobs of one request.
+        """
+        distance = plan.evaluator.distances.distance
+        improved = False
+
+        i = plan.vehicle.locked + 1
+        while i < len(plan.points) - 1 and time.time() < deadline:
+            points, edges, n = plan.points, plan.edges, len(plan.points)
+            opened, applied = set(), False
+
+            for j in range(i, n):
+                job = plan.jobs[j - 1]
+                if job.type == Job.DELIVERY and job.request.id in opened:
+                    break
+                if job.type == Job.PICKUP:
+                    opened.add(job.request.id)
+                if j == i:
+                    continue
+
+                self.statistics.evaluated += 1
+                gain = edges[i - 1] - distance(points[i - 1], points[j])
+                if j + 1 < n:
+                    gain += edges[j] - distance(points[i], points[j + 1])
+
+                if gain * plan.rate > EPSILON:
+                    jobs = plan.jobs[:i - 1] + plan.jobs[i - 1:j][::-1] + plan.jobs[j:]
+                    if self._apply('two_opt', (plan, jobs)):
+                        improved = applied = True
+                        break
+
+            if not applied:
+                i += 1
+
+        return improved
+
+    def _or_opt(self, plan, deadline):
+        """
+        Moves segment of nodes i..i+length-1 after node k, keeping pickups before deliveries.
+        """
+        distance = plan.evaluator.distances.distance
+        improved = False
+        locked = plan.vehicle.locked
+
+        i = locked + 1
+        while i < len(plan.points) and time.time() < deadline:
+            applied = False
+            for length in range(1, self.segment + 1):
+                points, edges, n, positions = plan.points, plan.edges, len(plan.points), plan.positions
+                e = i + length - 1
+                if e >= n:
+                    break
+
+                segment = plan.jobs[i - 1:e]
+                earliest, latest = locked, n - 1
+                for job in segment:
+                    if job.type == Job.PICKUP:
+                        other = positions.get(job.request.delivery.id)
+                        if other is not None and other > e:
+                            latest = min(latest, other - 1)
+                    else:
+                        other = positions.get(job.request.pickup.id)
+                        if other is not None and other < i:
+                            earliest = max(earliest, other)
+
+                gain = edges[i - 1]
+                if e + 1 < n:
+                    gain += edges[e] - distance(points[i - 1], points[e + 1])
+
+                for k in range(earliest, latest + 1):
+                    if i - 1 <= k <= e:
+                        continue
+
+                    self.statistics.evaluated += 1
+                    cost = distance(points[k], points[i]) - gain
+                    if k + 1 < n:
+                        cost += distance(points[e], points[k + 1]) - edges[k]
+
+                    if cost * plan.rate < -EPSILON:
+                        rest = plan.jobs[:i - 1] + plan.jobs[e:]
+                        at = k if k < i else k - length
+                        jobs = rest[:at] + segment + rest[at:]
+                        if self._apply('or_opt', (plan, jobs)):
+                            improved = applied = True
+                            break
+
+                if applied:
+                    break
+
+            if not applied:
+                i += 1
+
+        return improved
+
+    def _relocate(self, plans, index, compatibility, bounds, deadline):
+        improved = False
+        for plan in list(plans.values()):
+            for request in movable(plan):
+                if time.time() >= deadline:
+                    return improved
+                if request.pickup.id not in plan.positions:
+                    continue
+
+                delta, jobs = removal(plan, request)
+                best = None
+                for vid in nearest(request, index, compatibility, self.candidates, bounds):
+                    other = plans[vid]
+                    if other is plan:
+                        continue
+
+                    evaluated, option = cheapest(other, request)
+                    self.statistics.evaluated += evaluated
+                    if option is not None and (best is None or option[0] < best[0][0]):
+                        best = option, other
+
+                if best is None or delta + best[0][0] > -EPSILON:
+                    continue
+
+                (_, p, q), other = best
+                improved |= self._apply('relocate', (plan, jobs), (other, insert(other.jobs, request, p, q)))
+
+        return improved
+
+    def _exchange(self, plans, index, compatibility, bounds, evaluator, deadline):
+        improved = False
+        for plan in list(plans.values()):
+            for request in movable(plan):
+                if time.time() >= deadline:
+                    return improved
+                if request.pickup.id not in plan.positions:
+                    continue
+
+                for vid in nearest(request, index, compatibility, self.candidates, bounds):
+                    other = plans[vid]
+                    if other is plan or not compatibility.compatible(plan.vehicle.id, request.id):
+                        continue
+                    if self._swap(plan, request, other, compatibility, evaluator):
+                        improved = True
+                        break
+
+        return improved
+
+    def _swap(self, plan, request, other, compatibility, evaluator):
+        """
+        Estimates exchange with every movable request of other plan using insertions into unchanged routes
+        and confirms the best promising one on routes with requests removed.
+        """
+        removed, jobs = removal(plan, request)
+        evaluated, into_other = cheapest(other, request)
+        self.statistics.evaluated += evaluated
+        if into_other is None:
+            return False
+
+        best = None
+        for candidate in movable(other):
+            if not compatibility.compatible(plan.vehicle.id, candidate.id):
+                continue
+
+            evaluated, into_plan = cheapest(plan, candidate)
+            self.statistics.evaluated += evaluated
+            if into_plan is None:
+                continue
+
+            estimate = removed + removal(other, candidate)[0] + into_other[0] + into_plan[0]
+            if estimate < -EPSILON and (best is None or estimate < best[0]):
+                best = estimate, candidate
+
+        if best is None:
+            return False
+
+        candidate = best[1]
+        reduced = Plan(plan.vehicle, jobs, evaluator)
+        other_reduced = Plan(other.vehicle, removal(other, candidate)[1], evaluator)
+
+        into_plan = cheapest(reduced, candidate)[1]
+        into_other = cheapest(other_reduced, request)[1]
+        if into_plan is None or into_other is None:
+            return False
+
+        delta = reduced.cost + other_reduced.cost + into_plan[0] + into_other[0] - plan.cost - other.cost
+        if delta > -EPSILON:
+            return False
+
+        return self._apply(
+            'exchange',
+            (plan, insert(reduced.jobs, candidate, *into_plan[1:])),
+            (other, insert(other_reduced.jobs, request, *into_other[1:]))
+        )
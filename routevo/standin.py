@@ -0,0 +1,393 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+import json
+import threading
+import time
+import uuid
+
+import six
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib.parse import parse_qs, urlparse
+
+from routevo.solver.evaluation import RouteEvaluator
+from routevo.solver.insertion import GreedyInsertion
+from routevo.solver.search import LocalSearch
+from routevo.state import State
+from routevo.utils.checker import check
+
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Error code of failed job, reported in place of its status.
+JOB_FAILED = 8
+
+
+def cost(state, evaluator):
+    """
+    Cost of routes of state, as priced by local heuristics.
+
+    :param state: State.
+    :type state: routevo.state.State
+    :param evaluator: Route evaluator.
+    :type evaluator: routevo.solver.evaluation.RouteEvaluator
+    :rtype: float
+    """
+    return sum(evaluator.cost(r.vehicle, r.jobs) for r in state.routes.values())
+
+
+class StandInJob(object):
+    """
+    Optimization job of stand-in service, running in its own thread.
+
+    Requests are assigned by greedy insertion first and routes are then improved by local search
+    in rounds of step seconds until the algorithm timeout. Every better solution, with fewer unassigned
+    requests or lower cost, is published with the next revision. Job whose heuristics raise an error ends
+    with failed status and the error is reported to clients instead of its solution.
+    """
+
+    def __init__(self, jid, state, timeout, step, distances=None, changed=None):
+        """
+        Initialization method.
+
+        :param jid: Job ID.
+        :type jid: basestring
+        :param state: Submitted state.
+        :type state: routevo.state.State
+        :param timeout: Optimization time in seconds.
+        :type timeout: float
+        :param step: Time of one round of local search in seconds.
+        :type step: float
+        :param distances: Local distance source.
+        :type distances: routevo.utils.distance.StraightDistance | None
+        :param changed: Condition notified on every change, shared by jobs of one stand-in.
+        :type changed: threading.Condition | None
+        """
+        self.jid = jid
+        self.state = state
+        self.timeout = timeout
+        self.step = step
+        self.distances = distances
+
+        self.status = RUNNING
+        self.started = time.time()
+        self.elapsed = None
+        self.revision = 0
+        self.cost = None
+        self.unassigned = None
+        self.data = None
+        self.error = None
+        self.changed = threading.Condition() if changed is None else changed
+
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    def _publish(self, state, value, status=RUNNING):
+        with self.changed:
+            if self.data is None or (len(state.unassigned), value) < (self.unassigned, self.cost):
+                self.data, self.cost, self.unassigned = state.to_dict(), value, len(state.unassigned)
+                self.revision += 1
+            if status != self.status:
+                self.status = status
+                self.revision += 1
+                if status == DONE:
+                    self.elapsed = time.time() - self.started
+            self.changed.notify_all()
+
+    def _run(self):
+        try:
+            self._solve()
+        except Exception as ex:
+            with self.changed:
+                self.error = 'Optimization failed: {}'.format(ex)
+                self.status = FAILED
+                self.revision += 1
+                self.changed.notify_all()
+
+    def _solve(self):
+        deadline = time.time() + self.timeout
+        evaluator = RouteEvaluator(self.distances)
+
+        state = GreedyInsertion(self.distances).solve(self.state)
+        self._publish(state, cost(state, evaluator))
+
+        while time.time() < deadline:
+            search = LocalSearch(min(self.step, max(0.0, deadline - time.time())), self.distances)
+            state = search.improve(state)
+            if state.unassigned:
+                state = GreedyInsertion(self.distances).solve(state)
+            self._publish(state, cost(state, evaluator))
+
+        self._publish(state, cost(state, evaluator), DONE)
+
+    def event(self):
+        """
+        Status of job without solution, sent as event.
+
+        :rtype: dict[basestring, T]
+        """
+        with self.changed:
+            if self.status == FAILED:
+                return {'jid': self.jid, 'status': FAILED, 'revision': self.revision,
+                        'explanation': self.error, 'code': JOB_FAILED}
+            return {
+                'jid': self.jid,
+                'status': self.status,
+                'revision': self.revision,
+                'cost': self.cost,
+                'unassigned': self.unassigned,
+            }
+
+    def to_dict(self, since=None):
+        """
+        Convert best solution to response dictionary.
+
+        :param since: Revision already known to client, state is omitted unless a newer one exists.
+        :type since: int | None
+        :rtype: dict[basestring, T]
+        """
+        with self.changed:
+            if self.status == FAILED:
+                return {'response': 'error', 'explanation': self.error, 'code': JOB_FAILED}
+            fresh = since is None or self.revision > since
+            return {
+                'response': 'ok',
+                'status': self.status,
+                'revision': self.revision,
+                'cost': self.cost,
+                'unassigned': self.unassigned,
+                'time': self.elapsed,
+                'state': self.data if fresh else None,
+            }
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, payload, code=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, explanation, code):
+        self._reply({'response': 'error', 'explanation': explanation, 'code': code})
+
+    def _job(self, path):
+        job = self.server.standin.jobs.get(path.rsplit('/', 1)[-1])
+        if job is None:
+            self._error('Unknown job.', 5)
+        return job
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/api/v1/solve':
+            return self._reply({'response': 'error', 'explanation': 'Not found.', 'code': 404}, 404)
+
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        try:
+            state = State.from_dict(json.loads(form['state'][0]))
+            algorithm = json.loads(form['algorithm'][0]) if 'algorithm' in form else {}
+        except (KeyError, ValueError) as ex:
+            return self._error('Wrong state format: {}'.format(ex), 2)
+
+        timeout = (algorithm.get('params') or {}).get('timeout')
+        job = self.server.standin.submit(state, timeout)
+        self._reply({'response': 'ok', 'jid': job.jid})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        if url.path.startswith('/api/v1/result/'):
+            job = self._job(url.path)
+            if job is not None:
+                payload = job.to_dict()
+                if payload.get('status') == RUNNING:
+                    payload['state'] = None
+                self._reply(payload)
+        elif url.path.startswith('/api/v1/best/'):
+            job = self._job(url.path)
+            if job is not None:
+                since = query.get('since')
+                self._reply(job.to_dict(None if not since else int(since[0])))
+        elif url.path == '/api/v1/events':
+            jids = [jid for jid in query.get('jobs', [''])[0].split(',') if jid]
+            self._events(jids, float(query.get('ping', [15.0])[0]))
+        else:
+            self._reply({'response': 'error', 'explanation': 'Not found.', 'code': 404}, 404)
+
+    def _chunk(self, data):
+        self.wfile.write('{:x}\r\n'.format(len(data)).encode('ascii') + data + b'\r\n')
+
+    def _send(self, event, data=None, eid=None):
+        lines = []
+        if eid is not None:
+            lines.append('id: {}'.format(eid))
+        lines.append('event: {}'.format(event))
+        lines.append('data: {}'.format(json.dumps(data)))
+        self._chunk(('\n'.join(lines) + '\n\n').encode('utf-8'))
+
+    def _events(self, jids, ping):
+        """
+        Streams status events of jobs as server-sent events until all of them are done.
+        Events are sent in separate chunks, so that client receives every one of them immediately.
+        """
+        standin = self.server.standin
+        self.protocol_version = 'HTTP/1.1'
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        known = {}
+        try:
+            for jid in jids:
+                if jid not in standin.jobs:
+                    self._send('error', {'jid': jid, 'explanation': 'Unknown job.', 'code': 5})
+
+            jobs = [standin.jobs[jid] for jid in jids if jid in standin.jobs]
+            while jobs:
+                with standin.changed:
+                    events = [job.event() for job in jobs if job.revision != known.get(job.jid)]
+                    if not events:
+                        standin.changed.wait(ping)
+                        events = [job.event() for job in jobs if job.revision != known.get(job.jid)]
+
+                if not events:
+                    self._chunk(b': ping\n\n')
+                for event in events:
+                    known[event['jid']] = event['revision']
+                    name = 'error' if event['status'] == FAILED else event['status']
+                    self._send(name, event, '{}:{}'.format(event['jid'], event['revision']))
+                self.wfile.flush()
+
+                jobs = [job for job in jobs if not (job.status in (DONE, FAILED) and known[job.jid] == job.revision)]
+
+            self._chunk(b'')
+        except (IOError, OSError):
+            pass
+
+
+class _Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class StandIn(object):
+    """
+    Local stand-in of Routevo service for development and testing without network access.
+
+    Serves the service API over HTTP on localhost and solves submitted states with local heuristics
+    (see routevo.solver), publishing improving solutions while the job runs. Status changes of jobs
+    are streamed as server-sent events from /api/v1/events?jobs=<jid>,<jid>, eg.::
+
+        with StandIn(step=0.5) as standin:
+            service = Routevo('key', url=standin.url)
+            job = service.optimize(state, Algorithm(timeout=5), Distances(Distances.STRAIGHT, 1))
+
+    Solutions are priced with straight line distances, so they differ from those of the service.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, step=0.5, timeout=5.0, distances=None):
+        """
+        Initialization method.
+
+        :param host: Interface to listen on.
+        :type host: basestring
+        :param port: Port to listen on, 0 picks a free one.
+        :type port: int
+        :param step: Time of one round of local search in seconds, ie. how often solution may improve.
+        :type step: float
+        :param timeout: Optimization time in seconds when algorithm does not set one.
+        :type timeout: float
+        :param distances: Local distance source.
+        :type distances: routevo.utils.distance.StraightDistance | None
+        """
+        assert isinstance(host, six.string_types)
+        assert check(port, six.integer_types)
+        assert check(step, (float, six.integer_types)) and step > 0
+        assert check(timeout, (float, six.integer_types))
+
+        self.step = float(step)
+        self.timeout = float(timeout)
+        self.distances = distances
+        self.jobs = {}
+        self.changed = threading.Condition()
+
+        self._server = _Server((host, port), _Handler)
+        self._server.standin = self
+        self._thread = None
+
+    @property
+    def url(self):
+        """
+        Base URL of stand-in, to be passed as url of Routevo.
+
+        :rtype: basestring
+        """
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def submit(self, state, timeout=None):
+        """
+        Starts optimization job.
+
+        :param state: State to optimize.
+        :type state: routevo.state.State
+        :param timeout: Optimization time in seconds, default timeout when None.
+        :type timeout: float | None
+        :rtype: StandInJob
+        """
+        jid = uuid.uuid4().hex
+        job = self.jobs[jid] = StandInJob(
+            jid, state, self.timeout if timeout is None else float(timeout), self.step, self.distances, self.changed)
+        job.start()
+        return job
+
+    def start(self):
+        """
+        Starts serving in background thread.
+
+        :return: self
+        :rtype: StandIn
+        """
+        assert self._thread is None, 'Stand-in already started'
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops serving. Running jobs finish in background.
+        """
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
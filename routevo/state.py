@@ -110,3 +110,150 @@ class State(object):
 
         new = set(requests.values()) - old
         return cls(list(routes.values()), list(new))
+
+
+class LazyRoutes(object):
+    """
+    Read-only mapping of vehicle ID to Route, building routes on first access.
+    """
+
+    def __init__(self, state):
+        """
+        Initialization method.
+
+        :param state: Lazy state owning routes.
+        :type state: LazyState
+        """
+        self._state = state
+        self._routes = {}
+
+    def __getitem__(self, vid):
+        route = self._routes.get(vid)
+        if route is None:
+            route = self._routes[vid] = self._state._route(vid)
+        return route
+
+    def __contains__(self, vid):
+        return vid in self._state._routes
+
+    def __iter__(self):
+        return iter(self._state._routes)
+
+    def __len__(self):
+        return len(self._state._routes)
+
+    def get(self, vid, default=None):
+        return self[vid] if vid in self else default
+
+    def keys(self):
+        return list(self._state._routes)
+
+    def values(self):
+        return [self[vid] for vid in self._state._routes]
+
+    def items(self):
+        return [(vid, self[vid]) for vid in self._state._routes]
+
+
+class LazyState(State):
+    """
+    State decoded from dictionary on demand.
+
+    Only small indexes of IDs are built up front. Vehicle, Request and Route objects are created
+    on first access of route or request and reused afterwards, so routes share objects with requests
+    exactly as in State.from_dict. Job orders can be read without creating any objects.
+
+    Decoded parts of payload dictionary are modified, as by State.from_dict.
+    """
+
+    def __init__(self, data):
+        """
+        Initialization method.
+
+        :param data: State dictionary, eg. part of service response.
+        :type data: dict
+        """
+        self._data = data
+        self._routes = {int(vid): seq for vid, seq in data['routes'].items()}
+        self._vehicles = {v['vid']: idx for idx, v in enumerate(data['vehicles'])}
+
+        self._requests = {}
+        self._owners = {}
+        self._deliveries = []
+        for idx, r in enumerate(data['requests']):
+            self._requests[r['rid']] = idx
+            self._owners[r['pickup']['jid']] = self._owners[r['delivery']['jid']] = idx
+            self._deliveries.append(r['delivery']['jid'])
+
+        self._objects = {}
+        self._unassigned = None
+        self.routes = LazyRoutes(self)
+
+    def _request(self, idx):
+        request = self._objects.get(idx)
+        if request is None:
+            request = self._objects[idx] = Request.from_dict(self._data['requests'][idx])
+        return request
+
+    def _route(self, vid):
+        seq = self._routes[vid]
+        vehicle = Vehicle.from_dict(self._data['vehicles'][self._vehicles[vid]])
+
+        jobs = []
+        for jid in seq['jobs']:
+            request = self._request(self._owners[jid])
+            jobs.append(request.pickup if request.pickup.id == jid else request.delivery)
+
+        return Route(vehicle, jobs, seq['distances'], seq['times'])
+
+    @property
+    def unassigned(self):
+        """
+        Requests which delivery is not in any route, decoded on first access.
+
+        :rtype: list[routevo.request.Request]
+        """
+        if self._unassigned is None:
+            routed = set()
+            for seq in self._routes.values():
+                routed.update(seq['jobs'])
+
+            self._unassigned = [
+                self._request(idx) for idx, jid in enumerate(self._deliveries) if jid not in routed
+            ]
+
+        return self._unassigned
+
+    @unassigned.setter
+    def unassigned(self, value):
+        self._unassigned = value
+
+    def request(self, rid):
+        """
+        Request by ID, decoded on first access.
+
+        :param rid: Request ID.
+        :type rid: int
+        :rtype: routevo.request.Request
+        """
+        return self._request(self._requests[rid])
+
+    def orders(self, vehicles=None):
+        """
+        Job IDs in route order, read from payload without decoding objects.
+
+        :param vehicles: IDs of vehicles, all by default.
+        :type vehicles: list[int] | None
+        :return: Job IDs by vehicle ID.
+        :rtype: dict[int, list[int]]
+        """
+        vehicles = self._routes if vehicles is None else vehicles
+        return {vid: list(self._routes[vid]['jobs']) for vid in vehicles}
+
+    def to_state(self):
+        """
+        Decodes everything into regular State.
+
+        :rtype: State
+        """
+        return State(self.routes.values(), list(self.unassigned))
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+import heapq
+import itertools
+import threading
+from timeit import default_timer
+
+import six
+
+from routevo.metrics import Histogram
+from routevo.service import ServiceError
+from routevo.utils.checker import check
+
+
+class TokenBucket(object):
+    """
+    Token bucket limiting rate of submissions.
+
+    Tokens are added at constant rate up to burst size and every submission takes one. Not thread safe,
+    SubmissionQueue guards it with its lock.
+    """
+
+    def __init__(self, rate, burst=1):
+        """
+        Initialization method.
+
+        :param rate: Tokens added per second.
+        :type rate: float
+        :param burst: Maximum number of tokens, ie. submissions allowed at once.
+        :type burst: int
+        """
+        assert check(rate, (float, six.integer_types)) and rate > 0
+        assert check(burst, six.integer_types) and burst > 0
+
+        self.rate = float(rate)
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = default_timer()
+        self.paused = self.updated
+
+    def _refill(self, now):
+        start = max(self.updated, self.paused)
+        if now > start:
+            self.tokens = min(float(self.burst), self.tokens + (now - start) * self.rate)
+        self.updated = max(self.updated, now)
+
+    def delay(self, now=None):
+        """
+        Seconds until a token is available.
+
+        :param now: Current value of timeit.default_timer.
+        :type now: float | None
+        :rtype: float
+        """
+        now = default_timer() if now is None else now
+        self._refill(now)
+        if now < self.paused:
+            return self.paused - now + max(0.0, 1.0 - self.tokens) / self.rate
+        return max(0.0, 1.0 - self.tokens) / self.rate
+
+    def take(self):
+        """
+        Takes a token, which must be available.
+        """
+        self.tokens -= 1.0
+
+    def pause(self, seconds):
+        """
+        Stops issuing tokens for a while and drops accumulated ones, eg. when service reports exceeded limit.
+
+        :param seconds: Pause length.
+        :type seconds: float
+        """
+        now = default_timer()
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0)
+        self.paused = max(self.paused, now + seconds)
+
+
+class SubmissionQueue(object):
+    """
+    Bounded priority queue of submissions, rate limited by token bucket.
+
+    Shared by Routevo instances of many threads, which then submit states no faster than the bucket allows.
+    Waiting submissions are admitted by priority of their fleet, higher first, and in arrival order within
+    priority. When the queue is full, submission fails at once with ServiceError, so that callers back off
+    instead of piling up, eg.::
+
+        limiter = SubmissionQueue(rate=2.0, burst=5, priorities={'express': 10})
+        service = Routevo(API_KEY, limiter=limiter, fleet='express')
+
+    Queue depth and wait times are kept for monitoring, see to_dict.
+    """
+
+    FULL = 6
+    TIMEOUT = 7
+
+    def __init__(self, rate, burst=1, size=64, priorities=None, timeout=None):
+        """
+        Initialization method.
+
+        :param rate: Submissions allowed per second.
+        :type rate: float
+        :param burst: Submissions allowed at once after idle period.
+        :type burst: int
+        :param size: Maximum number of waiting submissions.
+        :type size: int
+        :param priorities: Priorities by fleet name, 0 for fleets not listed.
+        :type priorities: dict[basestring, int] | None
+        :param timeout: Maximum seconds of waiting in queue, None waits as long as necessary.
+        :type timeout: float | None
+        """
+        assert check(size, six.integer_types) and size > 0
+        assert check(priorities, (dict, None))
+        assert check(timeout, (float, six.integer_types, None))
+
+        self.bucket = TokenBucket(rate, burst)
+        self.size = size
+        self.priorities = {} if priorities is None else dict(priorities)
+        self.timeout = timeout
+
+        self.waits = Histogram()
+        self.admitted = 0
+        self.rejected = 0
+        self.expired = 0
+        self.peak = 0
+
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Condition()
+
+    @property
+    def depth(self):
+        """
+        Number of waiting submissions.
+
+        :rtype: int
+        """
+        return len(self._heap)
+
+    def priority(self, fleet):
+        """
+        Priority of fleet.
+
+        :param fleet: Fleet name.
+        :type fleet: basestring | None
+        :rtype: int
+        """
+        return self.priorities.get(fleet, 0)
+
+    def acquire(self, fleet=None, priority=None, timeout=None):
+        """
+        Waits for turn of submission.
+
+        :param fleet: Fleet name, determines priority.
+        :type fleet: basestring | None
+        :param priority: Priority overriding the fleet one.
+        :type priority: int | None
+        :param timeout: Maximum seconds of waiting, queue timeout when None.
+        :type timeout: float | None
+        :return: Seconds waited.
+        :rtype: float
+        """
+        priority = self.priority(fleet) if priority is None else priority
+        timeout = self.timeout if timeout is None else timeout
+        start = default_timer()
+        deadline = None if timeout is None else start + timeout
+
+        with self._lock:
+            if len(self._heap) >= self.size:
+                self.rejected += 1
+                raise ServiceError('Submission queue is full.', self.FULL)
+
+            entry = [-priority, next(self._counter)]
+            heapq.heappush(self._heap, entry)
+            self.peak = max(self.peak, len(self._heap))
+
+            try:
+                while True:
+                    now = default_timer()
+                    delay = None
+                    if self._heap[0] is entry:
+                        delay = self.bucket.delay(now)
+                        if delay <= 0:
+                            self.bucket.take()
+                            heapq.heappop(self._heap)
+                            break
+
+                    if deadline is not None:
+                        if now >= deadline:
+                            self.expired += 1
+                            raise ServiceError('Submission queue timeout.', self.TIMEOUT)
+                        delay = deadline - now if delay is None else min(delay, deadline - now)
+                    self._lock.wait(delay)
+            except BaseException:
+                if entry in self._heap:
+                    self._heap.remove(entry)
+                    heapq.heapify(self._heap)
+                raise
+            finally:
+                self._lock.notify_all()
+
+            waited = default_timer() - start
+            self.admitted += 1
+            self.waits.add(waited)
+
+        return waited
+
+    def pause(self, seconds):
+        """
+        Stops admitting submissions for a while, eg. after service rejected submission for exceeded limit.
+
+        :param seconds: Pause length.
+        :type seconds: float
+        """
+        with self._lock:
+            self.bucket.pause(seconds)
+            self._lock.notify_all()
+
+    def to_dict(self):
+        """
+        Convert queue metrics to dictionary.
+
+        :return: Dictionary with depth, counters and histogram of wait times in seconds.
+        :rtype: dict[basestring, T]
+        """
+        with self._lock:
+            return {
+                'depth': len(self._heap),
+                'peak': self.peak,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'expired': self.expired,
+                'waits': self.waits.to_dict(),
+            }
@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+import json
+import math
+import os
+import threading
+from collections import deque
+
+import six
+
+from routevo.locations import LocationTable
+from routevo.solver.evaluation import RouteEvaluator
+from routevo.utils.checker import check
+
+
+def _median(values):
+    values = sorted(values)
+    n = len(values)
+    return (values[n // 2] + values[(n - 1) // 2]) / 2.0
+
+
+def _bucket(requests):
+    """
+    Size class of state, states within factor of two of each other share it.
+    """
+    return int(math.log(max(requests, 1), 2))
+
+
+def estimate(state, distances=None):
+    """
+    Local estimate of solution cost, for results without cost reported by service.
+
+    :param state: Result state.
+    :type state: routevo.state.State
+    :param distances: Local distance source.
+    :type distances: routevo.utils.distance.StraightDistance | None
+    :rtype: float
+    """
+    evaluator = RouteEvaluator(distances)
+    return sum(evaluator.cost(r.vehicle, r.jobs) for r in state.routes.values())
+
+
+class SolveRecord(object):
+    """
+    Size, configuration and outcome of one completed optimization job.
+    """
+
+    def __init__(self, vehicles, requests, locations, algorithm, distances, wall, cost=None, unassigned=0,
+                 estimated=False):
+        """
+        Initialization method.
+
+        :param vehicles: Number of vehicles.
+        :type vehicles: int
+        :param requests: Number of requests.
+        :type requests: int
+        :param locations: Number of distinct locations.
+        :type locations: int
+        :param algorithm: Configured optimization timeout in seconds.
+        :type algorithm: float
+        :param distances: Configured distance matrix timeout in seconds.
+        :type distances: float
+        :param wall: Seconds from submission to finished job, as reported by service when it is.
+        :type wall: float
+        :param cost: Cost of result.
+        :type cost: float | None
+        :param unassigned: Number of unassigned requests of result.
+        :type unassigned: int
+        :param estimated: Whether cost is estimated locally (see estimate) instead of reported by service.
+        :type estimated: bool
+        """
+        self.vehicles = vehicles
+        self.requests = requests
+        self.locations = locations
+        self.algorithm = algorithm
+        self.distances = distances
+        self.wall = wall
+        self.cost = cost
+        self.unassigned = unassigned
+        self.estimated = estimated
+
+    @classmethod
+    def measure(cls, state, algorithm, distances, wall=0.0):
+        """
+        Creates record with size of submitted state, outcome is filled in later.
+
+        :param state: Submitted state.
+        :type state: routevo.state.State
+        :param algorithm: Optimization algorithm configuration.
+        :type algorithm: routevo.service.Algorithm
+        :param distances: Distance matrix configuration.
+        :type distances: routevo.service.Distances
+        :param wall: Seconds from submission to received result.
+        :type wall: float
+        :rtype: SolveRecord
+        """
+        requests = len(state.unassigned) + sum(len(r.requests) for r in state.routes.values())
+        return cls(len(state.routes), requests, len(LocationTable.from_state(state)),
+                   algorithm.timeout, distances.timeout, wall)
+
+    @property
+    def overhead(self):
+        """
+        Time not spent by optimization, mostly distance matrix computation and transfer.
+
+        :rtype: float
+        """
+        return max(0.0, self.wall - self.algorithm)
+
+    @property
+    def score(self):
+        """
+        Cost per request, with unassigned request priced as ten average assigned ones.
+
+        :rtype: float | None
+        """
+        if self.cost is None or not self.requests:
+            return None
+        assigned = self.requests - self.unassigned
+        average = self.cost / assigned if assigned else 0.0
+        return (self.cost + 10.0 * average * self.unassigned) / self.requests
+
+    def to_dict(self):
+        """
+        Convert SolveRecord to dictionary.
+
+        :return: Dictionary with SolveRecord properties.
+        :rtype: dict[basestring, T]
+        """
+        return {
+            'vehicles': self.vehicles,
+            'requests': self.requests,
+            'locations': self.locations,
+            'algorithm': self.algorithm,
+            'distances': self.distances,
+            'wall': self.wall,
+            'cost': self.cost,
+            'unassigned': self.unassigned,
+            'estimated': self.estimated,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Construct SolveRecord from dictionary.
+
+        :param data: Properties of record.
+        :type data: dict
+        :rtype: SolveRecord
+        """
+        return cls(**data)
+
+
+class SolveStats(object):
+    """
+    Local store of the most recent solve records, optionally appended to a JSON lines file.
+    The file is trimmed to the most recent records when loaded.
+    """
+
+    def __init__(self, path=None, size=2000):
+        """
+        Initialization method.
+
+        :param path: File keeping records between runs, None keeps them in memory only.
+        :type path: basestring | None
+        :param size: Maximum number of records kept.
+        :type size: int
+        """
+        assert check(path, (six.string_types, None))
+        assert check(size, six.integer_types) and size > 0
+
+        self.path = path
+        self.size = size
+        self.records = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+        if path is not None and os.path.exists(path):
+            lines = 0
+            with open(path) as f:
+                for lines, line in enumerate(f, 1):
+                    try:
+                        self.records.append(SolveRecord.from_dict(json.loads(line)))
+                    except (ValueError, TypeError):
+                        continue
+            if lines > size:
+                self._rewrite()
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, record):
+        """
+        Adds record.
+
+        :param record: Record of completed job.
+        :type record: SolveRecord
+        """
+        with self._lock:
+            self.records.append(record)
+            if self.path is not None:
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps(record.to_dict(), sort_keys=True) + '\n')
+
+    def _rewrite(self):
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as f:
+            for record in self.records:
+                f.write(json.dumps(record.to_dict(), sort_keys=True) + '\n')
+        if os.name == 'nt':
+            os.remove(self.path)
+        os.rename(temporary, self.path)
+
+
+class TimeoutTuner(object):
+    """
+    Recommends optimization and distance matrix timeouts from solve statistics.
+
+    Distance matrix time is modelled as linear in the squared number of distinct locations, fitted by least
+    squares to time of jobs not spent by optimization. Distances timeout is the prediction times margin.
+
+    Optimization timeout is chosen among timeouts used for states of similar size, ie. within factor of two
+    in the number of requests: the shortest one whose median cost per request is within tolerance of
+    the best one. Timeouts of other size classes are scaled linearly by the number of requests when
+    the size class has no statistics. With latency target, optimization timeout is cut so that predicted
+    matrix time and optimization fit into it, eg.::
+
+        tuner = TimeoutTuner(SolveStats('solves.jsonl'), latency=30)
+        service = Routevo(API_KEY, stats=tuner.stats)
+
+        algorithm, distances = tuner.recommend(state)
+        job = service.optimize(state, Algorithm(algorithm), Distances(Distances.ROUTING, distances))
+    """
+
+    def __init__(self, stats, tolerance=0.02, latency=None, margin=2.0, algorithm=60.0, distances=15.0,
+                 minimum=1.0):
+        """
+        Initialization method.
+
+        :param stats: Solve statistics.
+        :type stats: SolveStats
+        :param tolerance: Relative cost increase accepted for shorter optimization.
+        :type tolerance: float
+        :param latency: Target time from submission to result in seconds.
+        :type latency: float | None
+        :param margin: Multiplier of predicted distance matrix time.
+        :type margin: float
+        :param algorithm: Optimization timeout without statistics.
+        :type algorithm: float
+        :param distances: Distance matrix timeout without statistics.
+        :type distances: float
+        :param minimum: Minimal recommended timeout.
+        :type minimum: float
+        """
+        assert isinstance(stats, SolveStats)
+        assert check(tolerance, (float, six.integer_types)) and tolerance >= 0
+        assert check(latency, (float, six.integer_types, None))
+        assert check(margin, (float, six.integer_types)) and margin >= 1
+
+        self.stats = stats
+        self.tolerance = float(tolerance)
+        self.latency = latency
+        self.margin = float(margin)
+        self.algorithm = float(algorithm)
+        self.distances = float(distances)
+        self.minimum = float(minimum)
+
+    def matrix(self, locations):
+        """
+        Predicted distance matrix time.
+
+        :param locations: Number of distinct locations.
+        :type locations: int
+        :return: Seconds, None without statistics.
+        :rtype: float | None
+        """
+        points = [(float(r.locations) ** 2, r.overhead) for r in self.stats.records]
+        if not points:
+            return None
+
+        n = float(len(points))
+        mx = sum(x for x, _ in points) / n
+        my = sum(y for _, y in points) / n
+        sxx = sum((x - mx) ** 2 for x, _ in points)
+        slope = sum((x - mx) * (y - my) for x, y in points) / sxx if sxx > 0 else 0.0
+        slope = max(0.0, slope)
+        intercept = max(0.0, my - slope * mx)
+        return intercept + slope * float(locations) ** 2
+
+    def _timeouts(self, records):
+        """
+        The shortest timeout of records with median score within tolerance of the best one. Estimated costs
+        are priced differently than reported ones, they are used only when no cost is reported.
+        """
+        scored = [r for r in records if r.score is not None]
+        reported = [r for r in scored if not r.estimated]
+
+        scores = {}
+        for r in reported or scored:
+            scores.setdefault(r.algorithm, []).append(r.score)
+        if not scores:
+            return None
+
+        medians = {timeout: _median(values) for timeout, values in scores.items()}
+        best = min(medians.values())
+        return min(timeout for timeout, score in medians.items() if score <= best * (1.0 + self.tolerance))
+
+    def optimization(self, requests):
+        """
+        Optimization timeout giving cost within tolerance of the best observed for states of the size.
+
+        :param requests: Number of requests.
+        :type requests: int
+        :return: Seconds, None without statistics.
+        :rtype: float | None
+        """
+        buckets = {}
+        for r in self.stats.records:
+            buckets.setdefault(_bucket(r.requests), []).append(r)
+
+        bucket = _bucket(requests)
+        timeout = self._timeouts(buckets.get(bucket, ()))
+        if timeout is not None:
+            return timeout
+
+        nearest = sorted(buckets, key=lambda b: abs(b - bucket))
+        for other in nearest:
+            timeout = self._timeouts(buckets[other])
+            if timeout is not None:
+                size = _median([r.requests for r in buckets[other]])
+                return timeout * max(requests, 1) / max(size, 1.0)
+
+        return None
+
+    def recommend(self, state):
+        """
+        Recommended timeouts for state.
+
+        :param state: State to submit.
+        :type state: routevo.state.State
+        :return: Optimization and distance matrix timeouts in seconds.
+        :rtype: (float, float)
+        """
+        requests = len(state.unassigned) + sum(len(r.requests) for r in state.routes.values())
+        matrix = self.matrix(len(LocationTable.from_state(state)))
+        distances = self.distances if matrix is None else max(self.minimum, matrix * self.margin)
+
+        algorithm = self.optimization(requests)
+        algorithm = self.algorithm if algorithm is None else algorithm
+        if self.latency is not None:
+            algorithm = min(algorithm, self.latency - (matrix or 0.0))
+
+        return max(self.minimum, algorithm), distances
@@ -1,2 +1,4 @@
 from .penalty import Penalty, CF
 from .point import Point
+from .distance import StraightDistance
+from .spatial import GridIndex, StateIndex
@@ -0,0 +1,61 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+import six
+
+from routevo.utils.checker import check
+
+
+class StraightDistance(object):
+    """
+    Local distance source based on great-circle distances between points.
+
+    The service computes real routing matrices, which are not available on the client side.
+    This source is a cheap estimate used by local checks and heuristics.
+    """
+
+    def __init__(self, factor=1.0):
+        """
+        Initialization method.
+
+        :param factor: Multiplier applied to straight line distance, eg. 1.3 to approximate street network detours.
+        :type factor: float
+        """
+        assert check(factor, (float, six.integer_types))
+        self.factor = float(factor)
+
+    def distance(self, a, b):
+        """
+        Distance between two points.
+
+        :param a: Start point.
+        :type a: routevo.utils.point.Point
+        :param b: End point.
+        :type b: routevo.utils.point.Point
+        :return: Distance in meters.
+        :rtype: float
+        """
+        return a.distance(b) * self.factor
+
+    def duration(self, a, b, speed):
+        """
+        Travel time between two points.
+
+        :param a: Start point.
+        :type a: routevo.utils.point.Point
+        :param b: End point.
+        :type b: routevo.utils.point.Point
+        :param speed: Average speed in km/h.
+        :type speed: float
+        :return: Travel time in seconds.
+        :rtype: float
+        """
+        return self.distance(a, b) * 3.6 / speed
@@ -9,6 +9,7 @@
 # You should have received a copy of the MIT license with
 # this file. If not, please visit <https://opensource.org/licenses/MIT>
 
+from math import asin, cos, radians, sin, sqrt
 from random import uniform
 
 import six
@@ -21,6 +22,8 @@ class Point(object):
     Represents a geographic location.
     """
 
+    EARTH_RADIUS = 6371008.8
+
     def __init__(self, longitude, latitude):
         """
         Initialization method.
@@ -42,6 +45,21 @@ class Point(object):
     def __str__(self):
         return '[{0:.6f}, {1:.6f}]'.format(self.latitude, self.longitude)
 
+    def distance(self, other):
+        """
+        Great-circle distance to another point.
+
+        :param other: Second point.
+        :type other: Point
+        :return: Distance in meters.
+        :rtype: float
+        """
+        lat1, lat2 = radians(self.latitude), radians(other.latitude)
+        lon = radians(other.longitude - self.longitude)
+
+        h = sin((lat2 - lat1) / 2.0) ** 2 + cos(lat1) * cos(lat2) * sin(lon / 2.0) ** 2
+        return 2.0 * self.EARTH_RADIUS * asin(min(1.0, sqrt(h)))
+
     def to_dict(self):
         """
         Convert Point to dictionary.
@@ -64,5 +82,18 @@ class Point(object):
         return cls(data['coordinates'][0], data['coordinates'][1])
 
     @classmethod
-    def random(cls, longitude=(17.88, 17.98), latitude=(50.6, 50.7)):
-        return cls(uniform(*longitude), uniform(*latitude))
+    def random(cls, longitude=(17.88, 17.98), latitude=(50.6, 50.7), rng=None):
+        """
+        Construct Point with uniformly distributed coordinates.
+
+        :param longitude: Range of longitude.
+        :type longitude: (float, float)
+        :param latitude: Range of latitude.
+        :type latitude: (float, float)
+        :param rng: Random generator for reproducible points, module generator by default.
+        :type rng: random.Random | None
+        :return: Point object.
+        :rtype: Point
+        """
+        draw = uniform if rng is None else rng.uniform
+        return cls(draw(*longitude), draw(*latitude))
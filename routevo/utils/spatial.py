@@ -0,0 +1,339 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+import heapq
+from math import ceil, cos, floor, hypot, radians, sqrt
+
+import six
+
+from routevo.utils.checker import check
+from routevo.utils.point import Point
+
+METERS_PER_DEGREE = radians(1.0) * Point.EARTH_RADIUS
+
+
+class GridIndex(object):
+    """
+    Uniform grid over points for nearest neighbours and radius queries.
+
+    Points are projected to a plane with equirectangular projection around reference latitude,
+    which is accurate to a fraction of percent within a metropolitan area. Distances returned
+    by queries are planar distances in meters. Items are identified by arbitrary hashable keys
+    and can be moved at constant cost.
+    """
+
+    def __init__(self, cell=1000.0, latitude=None):
+        """
+        Initialization method.
+
+        :param cell: Side of grid cell in meters.
+        :type cell: float
+        :param latitude: Reference latitude of projection. Latitude of the first inserted point when not given.
+        :type latitude: float | None
+        """
+        assert check(cell, (float, six.integer_types)) and cell > 0
+        assert check(latitude, (float, six.integer_types, None))
+
+        self.cell = float(cell)
+        self.latitude = latitude
+        self._scale = None if latitude is None else cos(radians(latitude)) * METERS_PER_DEGREE
+
+        self._cells = {}
+        self._items = {}
+        self._bounds = None
+        self._stale = False
+
+    @classmethod
+    def build(cls, items, per_cell=2.0, latitude=None):
+        """
+        Creates index with cell size fitted to spread of points.
+
+        :param items: Pairs of key and point.
+        :type items: list[(T, routevo.utils.point.Point)]
+        :param per_cell: Expected number of points in occupied area cell.
+        :type per_cell: float
+        :param latitude: Reference latitude of projection. Mean latitude of points when not given.
+        :type latitude: float | None
+        :rtype: GridIndex
+        """
+        items = list(items)
+        if not items:
+            return cls(latitude=latitude)
+
+        if latitude is None:
+            latitude = sum(p.latitude for _, p in items) / len(items)
+
+        scale = cos(radians(latitude)) * METERS_PER_DEGREE
+        width = (max(p.longitude for _, p in items) - min(p.longitude for _, p in items)) * scale
+        height = (max(p.latitude for _, p in items) - min(p.latitude for _, p in items)) * METERS_PER_DEGREE
+        cell = max(50.0, sqrt(max(width, 1.0) * max(height, 1.0) * per_cell / len(items)))
+
+        index = cls(cell, latitude)
+        for key, point in items:
+            index.insert(key, point)
+
+        return index
+
+    def _project(self, point):
+        if self._scale is None:
+            self.latitude = point.latitude
+            self._scale = cos(radians(point.latitude)) * METERS_PER_DEGREE
+
+        return point.longitude * self._scale, point.latitude * METERS_PER_DEGREE
+
+    def _cell(self, x, y):
+        return int(floor(x / self.cell)), int(floor(y / self.cell))
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def insert(self, key, point):
+        """
+        Adds item or moves it to new location.
+
+        :param key: Item key.
+        :type key: T
+        :param point: Item location.
+        :type point: routevo.utils.point.Point
+        """
+        x, y = self._project(point)
+        c = self._cell(x, y)
+
+        old = self._items.get(key)
+        if old is not None and old[0] != c:
+            self._discard(key, old[0])
+
+        self._items[key] = c, x, y
+        self._cells.setdefault(c, {})[key] = x, y
+
+        if self._bounds is None:
+            self._bounds = [c[0], c[1], c[0], c[1]]
+        else:
+            b = self._bounds
+            b[0], b[1], b[2], b[3] = min(b[0], c[0]), min(b[1], c[1]), max(b[2], c[0]), max(b[3], c[1])
+
+    move = insert
+
+    def remove(self, key):
+        """
+        Removes item. Unknown keys are ignored.
+
+        :param key: Item key.
+        :type key: T
+        """
+        old = self._items.pop(key, None)
+        if old is not None:
+            self._discard(key, old[0])
+
+    def _discard(self, key, c):
+        bucket = self._cells[c]
+        del bucket[key]
+        if not bucket:
+            del self._cells[c]
+            b = self._bounds
+            self._stale = self._stale or c[0] in (b[0], b[2]) or c[1] in (b[1], b[3])
+
+    def _shrink(self):
+        """
+        Recomputes bounds of occupied cells after cells on their edge were emptied.
+        """
+        xs = [c[0] for c in self._cells]
+        ys = [c[1] for c in self._cells]
+        self._bounds = [min(xs), min(ys), max(xs), max(ys)] if xs else None
+        self._stale = False
+
+    def _ring(self, cx, cy, r):
+        if r == 0:
+            yield cx, cy
+            return
+
+        for dx in range(-r, r + 1):
+            yield cx + dx, cy - r
+            yield cx + dx, cy + r
+        for dy in range(-r + 1, r):
+            yield cx - r, cy + dy
+            yield cx + r, cy + dy
+
+    def nearest(self, point, k=1, predicate=None):
+        """
+        Finds k items nearest to point.
+
+        Grid is scanned in rings of cells around point, starting at the first ring reaching bounds of occupied
+        cells, until no unscanned cell can contain a closer item or every occupied cell was visited. When
+        a ring has more cells than there are unvisited occupied cells, the remaining occupied cells are visited
+        directly, so far query points and predicates rejecting most items do not scan empty cells.
+
+        :param point: Query location.
+        :type point: routevo.utils.point.Point
+        :param k: Number of items.
+        :type k: int
+        :param predicate: Function of key, items for which it returns False are skipped.
+        :type predicate: (T) -> bool | None
+        :return: List of (distance, key) pairs sorted by distance.
+        :rtype: list[(float, T)]
+        """
+        if not self._items or k <= 0:
+            return []
+
+        if self._stale:
+            self._shrink()
+
+        x, y = self._project(point)
+        cx, cy = self._cell(x, y)
+        b = self._bounds
+        first = max(0, b[0] - cx, b[1] - cy, cx - b[2], cy - b[3])
+        last = max(cx - b[0], cy - b[1], b[2] - cx, b[3] - cy)
+
+        found = []
+
+        def scan(bucket):
+            for key, (ix, iy) in bucket.items():
+                # Predicate may be costly, it is called only for items closer than the k-th found one.
+                item = -hypot(ix - x, iy - y), key
+                if len(found) == k and item[0] <= found[0][0]:
+                    continue
+                if predicate is not None and not predicate(key):
+                    continue
+
+                if len(found) < k:
+                    heapq.heappush(found, item)
+                else:
+                    heapq.heapreplace(found, item)
+
+        visited = 0
+        for r in range(first, last + 1):
+            if 8 * r > len(self._cells) - visited:
+                for c, bucket in self._cells.items():
+                    if max(abs(c[0] - cx), abs(c[1] - cy)) >= r:
+                        scan(bucket)
+                break
+
+            for c in self._ring(cx, cy, r):
+                bucket = self._cells.get(c)
+                if bucket:
+                    visited += 1
+                    scan(bucket)
+
+            if visited == len(self._cells) or len(found) == k and -found[0][0] <= r * self.cell:
+                break
+
+        return sorted((-d, key) for d, key in found)
+
+    def within(self, point, radius, predicate=None):
+        """
+        Finds items within radius from point.
+
+        :param point: Query location.
+        :type point: routevo.utils.point.Point
+        :param radius: Radius in meters.
+        :type radius: float
+        :param predicate: Function of key, items for which it returns False are skipped.
+        :type predicate: (T) -> bool | None
+        :return: List of (distance, key) pairs sorted by distance.
+        :rtype: list[(float, T)]
+        """
+        if not self._items:
+            return []
+
+        x, y = self._project(point)
+        cx, cy = self._cell(x, y)
+        r = int(ceil(radius / self.cell))
+
+        if (2 * r + 1) ** 2 > len(self._cells):
+            buckets = self._cells.values()
+        else:
+            buckets = [self._cells.get((cx + dx, cy + dy)) for dx in range(-r, r + 1) for dy in range(-r, r + 1)]
+
+        result = []
+        for bucket in buckets:
+            if not bucket:
+                continue
+
+            for key, (ix, iy) in bucket.items():
+                d = hypot(ix - x, iy - y)
+                if d <= radius and (predicate is None or predicate(key)):
+                    result.append((d, key))
+
+        result.sort()
+        return result
+
+
+class StateIndex(object):
+    """
+    Spatial indexes of vehicles and jobs of a state.
+
+    Vehicles are indexed by vehicle ID, jobs by job ID. Both indexes share projection,
+    so distances between them are comparable.
+    """
+
+    def __init__(self, state, per_cell=2.0):
+        """
+        Initialization method.
+
+        :param state: Indexed state.
+        :type state: routevo.state.State
+        :param per_cell: Expected number of points in occupied area cell.
+        :type per_cell: float
+        """
+        vehicles = [(r.vehicle.id, r.vehicle.location) for r in state.routes.values()]
+
+        jobs = []
+        for route in state.routes.values():
+            jobs.extend((j.id, j.location) for j in route.jobs)
+        for r in state.unassigned:
+            jobs.extend([(r.pickup.id, r.pickup.location), (r.delivery.id, r.delivery.location)])
+
+        points = vehicles + jobs
+        latitude = sum(p.latitude for _, p in points) / len(points) if points else None
+
+        self.vehicles = GridIndex.build(vehicles, per_cell, latitude)
+        self.jobs = GridIndex.build(jobs, per_cell, latitude)
+
+    def update_vehicle(self, vehicle):
+        """
+        Adds vehicle or moves it to its current location.
+
+        :param vehicle: Vehicle.
+        :type vehicle: routevo.vehicle.Vehicle
+        """
+        self.vehicles.insert(vehicle.id, vehicle.location)
+
+    def remove_vehicle(self, vid):
+        """
+        Removes vehicle.
+
+        :param vid: Vehicle ID.
+        :type vid: int
+        """
+        self.vehicles.remove(vid)
+
+    def add_request(self, request):
+        """
+        Adds pickup and delivery of request.
+
+        :param request: Request.
+        :type request: routevo.request.Request
+        """
+        self.jobs.insert(request.pickup.id, request.pickup.location)
+        self.jobs.insert(request.delivery.id, request.delivery.location)
+
+    def remove_request(self, request):
+        """
+        Removes pickup and delivery of request.
+
+        :param request: Request.
+        :type request: routevo.request.Request
+        """
+        self.jobs.remove(request.pickup.id)
+        self.jobs.remove(request.delivery.id)
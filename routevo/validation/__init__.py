@@ -0,0 +1,7 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from .compatibility import CompatibilityMatrix
+from .cumulation import CumulationGraph
+from .feasibility import FeasibilityChecker, FeasibilityReport, Violation
+from .windows import TimeWindowBounds
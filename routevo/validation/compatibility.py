@@ -0,0 +1,348 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+import heapq
+
+from routevo.constraints.hard.attribute import AttributesMatchConstraint, AttributesOperators
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def _signature(restrictions):
+    """
+    Hashable form of attribute filters. Objects with equal signatures accept the same partners.
+    """
+    result = []
+    for f in restrictions.filters:
+        if not isinstance(f, AttributesMatchConstraint):
+            continue
+
+        terms = tuple(sorted(
+            (op, tuple(sorted((k, _freeze(v)) for k, v in req.items())))
+            for op, req in f.requirements.items() if req
+        ))
+        if terms:
+            result.append(terms)
+
+    return tuple(sorted(result))
+
+
+def _accepts(signature, attributes):
+    """
+    Evaluates filter signature against attributes of a single object.
+    """
+    for terms in signature:
+        for op, pairs in terms:
+            hits = (_freeze(attributes.get(k, _accepts)) == v for k, v in pairs)
+            if op == AttributesOperators.AND and not all(hits):
+                return False
+            if op == AttributesOperators.OR and not any(hits):
+                return False
+            if op == AttributesOperators.NOR and any(hits):
+                return False
+
+    return True
+
+
+class _Side(object):
+    """
+    Objects of one kind held in bitset slots, with inverted index of their attributes.
+    Slots of removed objects are reused, the lowest first, so bitsets do not grow under churn.
+    """
+
+    def __init__(self):
+        self.slots = {}
+        self.ids = []
+        self.attributes = []
+        self.signatures = []
+        self.index = {}
+        self.live = 0
+        self.free = []
+
+    def add(self, oid, restrictions):
+        if self.free:
+            slot = heapq.heappop(self.free)
+        else:
+            slot = len(self.ids)
+            self.ids.append(None)
+            self.attributes.append(None)
+            self.signatures.append(None)
+        bit = 1 << slot
+
+        self.slots[oid] = slot
+        self.ids[slot] = oid
+        self.attributes[slot] = dict(restrictions.attributes)
+        self.signatures[slot] = _signature(restrictions)
+        self.live |= bit
+
+        for k, v in restrictions.attributes.items():
+            key = k, _freeze(v)
+            self.index[key] = self.index.get(key, 0) | bit
+
+        return slot
+
+    def remove(self, oid):
+        slot = self.slots.pop(oid)
+        bit = 1 << slot
+
+        for k, v in self.attributes[slot].items():
+            key = k, _freeze(v)
+            self.index[key] &= ~bit
+            if not self.index[key]:
+                del self.index[key]
+
+        self.ids[slot] = None
+        self.attributes[slot] = {}
+        self.signatures[slot] = ()
+        self.live &= ~bit
+        heapq.heappush(self.free, slot)
+        return slot
+
+    def select(self, signature):
+        """
+        Bitset of live objects whose attributes satisfy filter signature.
+        """
+        bits = self.live
+        for terms in signature:
+            for op, pairs in terms:
+                if op == AttributesOperators.AND:
+                    for key in pairs:
+                        bits &= self.index.get(key, 0)
+                elif op == AttributesOperators.OR:
+                    any_of = 0
+                    for key in pairs:
+                        any_of |= self.index.get(key, 0)
+                    bits &= any_of
+                elif op == AttributesOperators.NOR:
+                    for key in pairs:
+                        bits &= ~self.index.get(key, 0)
+
+        return bits
+
+    def unpack(self, bits):
+        result = []
+        while bits:
+            low = bits & -bits
+            result.append(self.ids[low.bit_length() - 1])
+            bits ^= low
+
+        return result
+
+
+class CompatibilityMatrix(object):
+    """
+    Vehicles x requests compatibility resulting from attribute filters.
+
+    A request can be served by a vehicle when the vehicle filters accept request attributes
+    and the request filters accept vehicle attributes. Each vehicle row is packed into
+    an integer bitset over request slots. Vehicles and requests with identical filters
+    are evaluated once, so compilation cost depends on the number of distinct filters.
+    """
+
+    def __init__(self, state=None):
+        """
+        Initialization method.
+
+        :param state: State to compile.
+        :type state: routevo.state.State | None
+        """
+        self._vehicles = _Side()
+        self._requests = _Side()
+        self._rows = {}
+        self._groups = {}
+
+        if state is not None:
+            self.compile(state)
+
+    def compile(self, state):
+        """
+        Builds matrix for all vehicles and requests of state.
+
+        :param state: State to compile.
+        :type state: routevo.state.State
+        :return: self
+        :rtype: CompatibilityMatrix
+        """
+        self._vehicles, self._requests = _Side(), _Side()
+        self._rows, self._groups = {}, {}
+
+        for route in state.routes.values():
+            self._vehicles.add(route.vehicle.id, route.vehicle.restrictions)
+            for r in route.requests:
+                self._add_request(r)
+
+        for r in state.unassigned:
+            self._add_request(r)
+
+        cache = {}
+        for slot in self._vehicles.slots.values():
+            signature = self._vehicles.signatures[slot]
+            if signature not in cache:
+                cache[signature] = self._requests.select(signature)
+
+            self._rows[slot] = cache[signature] & self._accepted(slot)
+
+        return self
+
+    def _add_request(self, request):
+        slot = self._requests.add(request.id, request.restrictions)
+        signature = self._requests.signatures[slot]
+        self._groups[signature] = self._groups.get(signature, 0) | (1 << slot)
+
+    def _accepted(self, vslot):
+        """
+        Bitset of requests whose filters accept vehicle in slot.
+        """
+        attributes = self._vehicles.attributes[vslot]
+
+        bits = 0
+        for signature, mask in self._groups.items():
+            if not signature or _accepts(signature, attributes):
+                bits |= mask
+
+        return bits
+
+    def update_vehicle(self, vehicle):
+        """
+        Adds vehicle or refreshes its row after restrictions change.
+
+        :param vehicle: New or changed vehicle.
+        :type vehicle: routevo.vehicle.Vehicle
+        """
+        self.remove_vehicle(vehicle.id)
+
+        slot = self._vehicles.add(vehicle.id, vehicle.restrictions)
+        signature = self._vehicles.signatures[slot]
+        self._rows[slot] = self._requests.select(signature) & self._accepted(slot)
+
+    def update_request(self, request):
+        """
+        Adds request or refreshes its column after restrictions change.
+
+        :param request: New or changed request.
+        :type request: routevo.request.Request
+        """
+        self.remove_request(request.id)
+        self._add_request(request)
+
+        slot = self._requests.slots[request.id]
+        bit = 1 << slot
+        signature = self._requests.signatures[slot]
+        attributes = request.restrictions.attributes
+
+        cache = {}
+        for vslot in self._vehicles.slots.values():
+            vsig = self._vehicles.signatures[vslot]
+            if vsig not in cache:
+                cache[vsig] = _accepts(vsig, attributes)
+
+            if cache[vsig] and _accepts(signature, self._vehicles.attributes[vslot]):
+                self._rows[vslot] |= bit
+
+    def remove_vehicle(self, vid):
+        """
+        Removes vehicle from matrix. Unknown IDs are ignored.
+
+        :param vid: Vehicle ID.
+        :type vid: int
+        """
+        if vid in self._vehicles.slots:
+            del self._rows[self._vehicles.remove(vid)]
+
+    def remove_request(self, rid):
+        """
+        Removes request from matrix. Unknown IDs are ignored.
+
+        :param rid: Request ID.
+        :type rid: int
+        """
+        if rid not in self._requests.slots:
+            return
+
+        slot = self._requests.slots[rid]
+        signature = self._requests.signatures[slot]
+        self._requests.remove(rid)
+
+        mask = ~(1 << slot)
+        self._groups[signature] &= mask
+        if not self._groups[signature]:
+            del self._groups[signature]
+
+        for vslot in self._rows:
+            self._rows[vslot] &= mask
+
+    def compatible(self, vid, rid):
+        """
+        Checks whether vehicle can serve request.
+
+        :param vid: Vehicle ID.
+        :type vid: int
+        :param rid: Request ID.
+        :type rid: int
+        :rtype: bool
+        """
+        return bool(self._rows[self._vehicles.slots[vid]] >> self._requests.slots[rid] & 1)
+
+    def requests(self, vid):
+        """
+        Requests which can be served by vehicle.
+
+        :param vid: Vehicle ID.
+        :type vid: int
+        :return: List of request IDs.
+        :rtype: list[int]
+        """
+        return self._requests.unpack(self._rows[self._vehicles.slots[vid]])
+
+    def vehicles(self, rid):
+        """
+        Vehicles which can serve request.
+
+        :param rid: Request ID.
+        :type rid: int
+        :return: List of vehicle IDs.
+        :rtype: list[int]
+        """
+        bit = 1 << self._requests.slots[rid]
+        return [self._vehicles.ids[slot] for slot, row in self._rows.items() if row & bit]
+
+    def orphans(self):
+        """
+        Requests without any eligible vehicle.
+
+        :return: List of request IDs.
+        :rtype: list[int]
+        """
+        covered = 0
+        for row in self._rows.values():
+            covered |= row
+
+        return self._requests.unpack(self._requests.live & ~covered)
+
+    def density(self):
+        """
+        Fraction of compatible vehicle-request pairs.
+
+        :rtype: float
+        """
+        pairs = len(self._vehicles.slots) * len(self._requests.slots)
+        if not pairs:
+            return 0.0
+
+        return sum(bin(row).count('1') for row in self._rows.values()) / float(pairs)
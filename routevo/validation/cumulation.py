@@ -0,0 +1,230 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+from routevo.constraints.hard.cumulate import CumulationConstraint, CumulationOperators
+
+EMPTY = frozenset()
+
+
+def cumulation(restrictions):
+    """
+    Merges CumulationConstraint requirements of restrictions.
+
+    :param restrictions: Vehicle or request restrictions.
+    :type restrictions: routevo.constraints.restrictions.Restrictions
+    :return: Allowed request IDs (None when not limited) and banned request IDs.
+    :rtype: (set[int] | None, set[int])
+    """
+    allowed, banned = None, set()
+    for c in restrictions.hard:
+        if not isinstance(c, CumulationConstraint):
+            continue
+
+        if CumulationOperators.OR in c.requirements:
+            ids = set(c.requirements[CumulationOperators.OR])
+            allowed = ids if allowed is None else allowed & ids
+
+        banned.update(c.requirements.get(CumulationOperators.NOR, ()))
+
+    return allowed, banned
+
+
+class CumulationGraph(object):
+    """
+    Compiled CumulationConstraint requirements of vehicles and requests.
+
+    Requirements are merged into hash sets once. 'nor' lists form a symmetric conflict graph
+    between requests, 'or' lists restrict request to its listed partners. Two requests may ride together
+    when neither bans the other and each one, if restricted, lists the other. Vehicle requirements
+    limit which requests may be cumulated in that vehicle.
+
+    Objects are compiled one by one, so changed requirements are recompiled in time proportional
+    to their size.
+    """
+
+    def __init__(self, state=None):
+        """
+        Initialization method.
+
+        :param state: State to compile.
+        :type state: routevo.state.State | None
+        """
+        self._allowed = {}
+        self._banned = {}
+        self._banned_by = {}
+        self._vehicles = {}
+
+        if state is not None:
+            self.compile(state)
+
+    def compile(self, state):
+        """
+        Compiles requirements of all vehicles and requests of state, replacing previous content.
+
+        :param state: State to compile.
+        :type state: routevo.state.State
+        """
+        self._allowed, self._banned, self._banned_by, self._vehicles = {}, {}, {}, {}
+
+        for route in state.routes.values():
+            self.update_vehicle(route.vehicle)
+            for request in route.requests:
+                self.update_request(request)
+
+        for request in state.unassigned:
+            self.update_request(request)
+
+    def update_vehicle(self, vehicle):
+        """
+        Compiles requirements of new or changed vehicle.
+
+        :param vehicle: Vehicle.
+        :type vehicle: routevo.vehicle.Vehicle
+        """
+        allowed, banned = cumulation(vehicle.restrictions)
+        if allowed is None and not banned:
+            self._vehicles.pop(vehicle.id, None)
+        else:
+            self._vehicles[vehicle.id] = allowed, banned
+
+    def remove_vehicle(self, vid):
+        """
+        Removes vehicle.
+
+        :param vid: Vehicle ID.
+        :type vid: int
+        """
+        self._vehicles.pop(vid, None)
+
+    def update_request(self, request):
+        """
+        Compiles requirements of new or changed request.
+
+        :param request: Request.
+        :type request: routevo.request.Request
+        """
+        allowed, banned = cumulation(request.restrictions)
+        self._set(request.id, allowed, banned)
+
+    def remove_request(self, rid):
+        """
+        Removes requirements of request. Requirements of other requests referring to it are kept.
+
+        :param rid: Request ID.
+        :type rid: int
+        """
+        self._set(rid, None, EMPTY)
+
+    def _set(self, rid, allowed, banned):
+        for other in self._banned.pop(rid, EMPTY):
+            edges = self._banned_by[other]
+            edges.discard(rid)
+            if not edges:
+                del self._banned_by[other]
+
+        for other in banned:
+            self._banned_by.setdefault(other, set()).add(rid)
+        if banned:
+            self._banned[rid] = set(banned)
+
+        if allowed is None:
+            self._allowed.pop(rid, None)
+        else:
+            self._allowed[rid] = allowed
+
+    def conflicts(self, rid):
+        """
+        Requests explicitly banned from riding with request, in either direction.
+
+        :param rid: Request ID.
+        :type rid: int
+        :rtype: set[int]
+        """
+        return self._banned.get(rid, EMPTY) | self._banned_by.get(rid, EMPTY)
+
+    def restricted(self, rid):
+        """
+        Whether request may ride only with listed partners.
+
+        :param rid: Request ID.
+        :type rid: int
+        :rtype: bool
+        """
+        return rid in self._allowed
+
+    def together(self, a, b):
+        """
+        Whether two requests may ride together.
+
+        :param a: Request ID.
+        :type a: int
+        :param b: Request ID.
+        :type b: int
+        :rtype: bool
+        """
+        if b in self._banned.get(a, EMPTY) or a in self._banned.get(b, EMPTY):
+            return False
+
+        allowed = self._allowed.get(a)
+        if allowed is not None and b not in allowed:
+            return False
+
+        allowed = self._allowed.get(b)
+        return allowed is None or a in allowed
+
+    def accepts(self, vid, rid):
+        """
+        Whether request may be cumulated with others in vehicle.
+
+        :param vid: Vehicle ID.
+        :type vid: int
+        :param rid: Request ID.
+        :type rid: int
+        :rtype: bool
+        """
+        rules = self._vehicles.get(vid)
+        if rules is None:
+            return True
+
+        allowed, banned = rules
+        return rid not in banned and (allowed is None or rid in allowed)
+
+    def cumulable(self, vid, a, b):
+        """
+        Whether two requests may ride together in vehicle.
+
+        :param vid: Vehicle ID.
+        :type vid: int
+        :param a: Request ID.
+        :type a: int
+        :param b: Request ID.
+        :type b: int
+        :rtype: bool
+        """
+        return self.accepts(vid, a) and self.accepts(vid, b) and self.together(a, b)
+
+    def partners(self, rid, candidates):
+        """
+        Filters requests which may ride together with request.
+
+        :param rid: Request ID.
+        :type rid: int
+        :param candidates: Candidate request IDs.
+        :type candidates: collections.Iterable[int]
+        :rtype: list[int]
+        """
+        allowed = self._allowed.get(rid)
+        if allowed is not None:
+            if not isinstance(candidates, (set, frozenset, dict)):
+                candidates = set(candidates)
+            candidates = allowed & set(candidates) if len(allowed) < len(candidates) else candidates
+
+        return [other for other in candidates if other != rid and self.together(rid, other)]
@@ -0,0 +1,355 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+from routevo.constraints.hard.attribute import AttributesMatchConstraint
+from routevo.constraints.hard.comeback import BanPickupComebackConstraint
+from routevo.constraints.hard.cumulate import BanExternalPickupsConstraint, CumulationConstraint
+from routevo.constraints.hard.limit import CapacityConstraint, MaximumDeliveriesConstraint
+from routevo.job import Job
+from routevo.utils.distance import StraightDistance
+from routevo.validation.compatibility import CompatibilityMatrix
+from routevo.validation.cumulation import CumulationGraph
+
+
+class Violation(object):
+    """
+    Single breach of a hard constraint.
+    """
+
+    def __init__(self, constraint, message, vehicle=None, request=None, job=None):
+        """
+        Initialization method.
+
+        :param constraint: Name of violated constraint.
+        :type constraint: basestring
+        :param message: Human readable description.
+        :type message: basestring
+        :param vehicle: ID of vehicle whose route is infeasible.
+        :type vehicle: int | None
+        :param request: ID of infeasible request.
+        :type request: int | None
+        :param job: ID of job at which violation occurs.
+        :type job: int | None
+        """
+        self.constraint = constraint
+        self.message = message
+        self.vehicle = vehicle
+        self.request = request
+        self.job = job
+
+    def __repr__(self):
+        return 'Violation({0}: {1})'.format(self.constraint, self.message)
+
+    def to_dict(self):
+        """
+        Convert Violation to dictionary.
+
+        :return: Dictionary with Violation properties.
+        :rtype: dict[basestring, T]
+        """
+        return {
+            'constraint': self.constraint,
+            'message': self.message,
+            'vehicle': self.vehicle,
+            'request': self.request,
+            'job': self.job,
+        }
+
+
+class FeasibilityReport(object):
+    """
+    Violations found in a state, indexed by route and by request.
+    """
+
+    def __init__(self):
+        self.violations = []
+        self.routes = {}
+        self.requests = {}
+
+    def add(self, violation):
+        """
+        Registers violation.
+
+        :param violation: Found violation.
+        :type violation: Violation
+        """
+        self.violations.append(violation)
+        if violation.vehicle is not None:
+            self.routes.setdefault(violation.vehicle, []).append(violation)
+        if violation.request is not None:
+            self.requests.setdefault(violation.request, []).append(violation)
+
+    @property
+    def feasible(self):
+        """
+        Whether no violation was found.
+
+        :rtype: bool
+        """
+        return not self.violations
+
+    def __len__(self):
+        return len(self.violations)
+
+    def __iter__(self):
+        return iter(self.violations)
+
+    def __str__(self):
+        if self.feasible:
+            return 'Feasible'
+
+        return '\n'.join(
+            '{:<30}{:<10}{:<10}{}'.format(
+                v.constraint,
+                '' if v.vehicle is None else 'V{}'.format(v.vehicle),
+                '' if v.request is None else 'R{}'.format(v.request),
+                v.message
+            ) for v in self.violations
+        )
+
+    def to_dict(self):
+        """
+        Convert FeasibilityReport to dictionary.
+
+        :return: Dictionary with list of violations.
+        :rtype: dict[basestring, T]
+        """
+        return {'violations': [v.to_dict() for v in self.violations]}
+
+
+def location_key(job):
+    """
+    Identifies the place of job. Jobs sharing location ID are at the same place.
+
+    :param job: Job.
+    :type job: routevo.job.Job
+    :return: Hashable location key.
+    :rtype: tuple
+    """
+    if job.aid is not None:
+        return 'aid', job.aid
+
+    return job.location.longitude, job.location.latitude
+
+
+class _VehicleRules(object):
+    """
+    Hard constraints of vehicle resolved once per check.
+    """
+
+    def __init__(self, vehicle):
+        hard = vehicle.restrictions.hard
+
+        self.vid = vehicle.id
+        self.capacity = vehicle.capacity
+        self.deliveries = min([c.limit for c in hard if isinstance(c, MaximumDeliveriesConstraint)] or [None])
+        self.comeback = any(isinstance(c, BanPickupComebackConstraint) for c in hard)
+        self.external = any(isinstance(c, BanExternalPickupsConstraint) for c in hard)
+
+
+class FeasibilityChecker(object):
+    """
+    Local validator of hard constraints.
+
+    Finds the most common infeasible inputs before the state is sent to the service:
+    requests that no vehicle can take, and routes that break attribute filters, capacity,
+    cumulation, comeback or availability limits. By default only the locked part of routes is checked,
+    because the rest will be rearranged by optimization anyway.
+
+    ForceCommonDirectionConstraint is not checked, as its thresholds are known only to the service.
+    """
+
+    def __init__(self, distances=None, full=False):
+        """
+        Initialization method.
+
+        :param distances: Local distance source used to estimate arrival times.
+        :type distances: routevo.utils.distance.StraightDistance | None
+        :param full: Check whole routes instead of locked jobs only, eg. to validate results.
+        :type full: bool
+        """
+        self.distances = StraightDistance() if distances is None else distances
+        self.full = full
+
+    def check(self, state, compatibility=None):
+        """
+        Checks state against hard constraints.
+
+        :param state: State to validate.
+        :type state: routevo.state.State
+        :param compatibility: Already compiled compatibility of state, compiled from scratch when not given.
+        :type compatibility: routevo.validation.compatibility.CompatibilityMatrix | None
+        :return: Found violations.
+        :rtype: FeasibilityReport
+        """
+        report = FeasibilityReport()
+        routes = list(state.routes.values())
+        compatibility = CompatibilityMatrix(state) if compatibility is None else compatibility
+
+        requests = list(state.unassigned)
+        for route in routes:
+            requests.extend(route.requests)
+
+        self._check_requests([r.vehicle for r in routes], requests, report)
+        for rid in compatibility.orphans():
+            report.add(Violation(AttributesMatchConstraint.__name__, 'no vehicle matches attributes', request=rid))
+
+        graph = CumulationGraph(state)
+        for route in routes:
+            self._check_route(route, compatibility, graph, report)
+
+        return report
+
+    def check_route(self, route, compatibility=None):
+        """
+        Checks single route against hard constraints of its vehicle and requests.
+
+        :param route: Route to validate.
+        :type route: routevo.route.Route
+        :param compatibility: Compiled compatibility. Attribute filters are not checked when not given.
+        :type compatibility: routevo.validation.compatibility.CompatibilityMatrix | None
+        :return: Found violations.
+        :rtype: FeasibilityReport
+        """
+        graph = CumulationGraph()
+        graph.update_vehicle(route.vehicle)
+        for j in route.jobs:
+            graph.update_request(j.request)
+
+        report = FeasibilityReport()
+        self._check_route(route, compatibility, graph, report)
+        return report
+
+    @staticmethod
+    def _check_requests(vehicles, requests, report):
+        capacities = [v.capacity for v in vehicles]
+        capacity = None if not capacities or None in capacities else max(capacities)
+
+        lower, upper = float('-inf'), float('inf')
+        if vehicles and all(v.availability is not None for v in vehicles):
+            lower = min(v.availability.lower for v in vehicles)
+            upper = max(v.availability.upper for v in vehicles)
+
+        for r in requests:
+            if capacity is not None and r.size > capacity:
+                report.add(Violation(
+                    CapacityConstraint.__name__,
+                    'size {0} exceeds capacity of every vehicle ({1})'.format(r.size, capacity),
+                    request=r.id
+                ))
+
+            for j in (r.pickup, r.delivery):
+                if j.arrival is None or j.end is not None:
+                    continue
+
+                if j.arrival.upper < lower or j.arrival.lower > upper:
+                    report.add(Violation(
+                        'Availability',
+                        '{0} window {1:.0f}-{2:.0f} is outside availability of every vehicle'.format(
+                            j.type, j.arrival.lower, j.arrival.upper),
+                        request=r.id, job=j.id
+                    ))
+
+    def _check_route(self, route, compatibility, graph, report):
+        vehicle = route.vehicle
+        rules = _VehicleRules(vehicle)
+
+        jobs = route.jobs
+        checked = jobs if self.full else jobs[:vehicle.locked]
+        if not checked:
+            return
+
+        def fail(constraint, message, job):
+            report.add(Violation(constraint, message, vehicle=vehicle.id, request=job.request.id, job=job.id))
+
+        pickups = set(j.request.id for j in jobs if j.type == Job.PICKUP)
+        onboard = {}
+        for j in jobs:
+            if j.type == Job.DELIVERY and j.request.id not in pickups:
+                onboard[j.request.id] = j.request
+
+        load = sum(r.size for r in onboard.values())
+        pending = {}
+        for r in onboard.values():
+            key = location_key(r.pickup)
+            pending[key] = pending.get(key, 0) + 1
+
+        seen, previous = set(), None
+        for j in checked:
+            request = j.request
+            if j.id in seen:
+                fail('Precedence', 'job {0} occurs more than once'.format(j.id), j)
+            seen.add(j.id)
+
+            if j.type == Job.PICKUP:
+                if compatibility is not None and not compatibility.compatible(vehicle.id, request.id):
+                    fail(AttributesMatchConstraint.__name__, 'vehicle does not match attributes', j)
+
+                if request.delivery.id in seen:
+                    fail('Precedence', 'pickup after delivery', j)
+
+                key = location_key(j)
+                if rules.comeback and pending.get(key) and key != previous:
+                    fail(BanPickupComebackConstraint.__name__, 'comeback to pickup location', j)
+
+                self._check_cumulation(request, onboard, rules, graph, fail, j)
+
+                onboard[request.id] = request
+                pending[key] = pending.get(key, 0) + 1
+                load += request.size
+
+                if rules.capacity is not None and load > rules.capacity:
+                    fail(CapacityConstraint.__name__, 'load {0} exceeds capacity {1}'.format(
+                        load, rules.capacity), j)
+
+                if rules.deliveries is not None and len(onboard) > rules.deliveries:
+                    fail(MaximumDeliveriesConstraint.__name__, '{0} deliveries exceed limit {1}'.format(
+                        len(onboard), rules.deliveries), j)
+            elif request.id in onboard:
+                del onboard[request.id]
+                pending[location_key(request.pickup)] -= 1
+                load -= request.size
+
+            previous = location_key(j)
+
+        self._check_availability(route, len(checked), fail)
+
+    @staticmethod
+    def _check_cumulation(request, onboard, rules, graph, fail, job):
+        if not onboard:
+            return
+
+        if rules.external:
+            key = location_key(request.pickup)
+            if any(location_key(o.pickup) != key for o in onboard.values()):
+                fail(BanExternalPickupsConstraint.__name__, 'cumulation from different pickup locations', job)
+
+        for other in onboard.values():
+            if not graph.together(request.id, other.id):
+                fail(CumulationConstraint.__name__, 'cannot be cumulated with request {0}'.format(other.id), job)
+
+            for rid in (request.id, other.id):
+                if not graph.accepts(rules.vid, rid):
+                    fail(CumulationConstraint.__name__, 'request {0} cannot be cumulated in vehicle'.format(rid), job)
+
+    def _check_availability(self, route, n, fail):
+        availability = route.vehicle.availability
+        if availability is None:
+            return
+
+        timeline = route.timeline(self.distances)
+        for j, (arrival, departure) in zip(route.jobs[:n], timeline):
+            if j.end is not None:
+                continue
+
+            if arrival < availability.lower or departure > availability.upper:
+                fail('Availability', 'served at {0:.0f}-{1:.0f} outside availability {2:.0f}-{3:.0f}'.format(
+                    arrival, departure, availability.lower, availability.upper), j)
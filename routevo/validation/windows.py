@@ -0,0 +1,355 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2017 Routevo
+#
+# You may use, distribute and modify this code under the
+# terms of the MIT license.
+#
+# You should have received a copy of the MIT license with
+# this file. If not, please visit <https://opensource.org/licenses/MIT>
+
+from routevo.route import Route
+from routevo.state import State
+from routevo.utils.distance import StraightDistance
+
+INF = float('inf')
+
+
+def _start(route, distances):
+    """
+    Location and time from which vehicle can head to a new pickup: after its locked jobs,
+    otherwise once its waiting time passes and availability opens.
+    """
+    vehicle = route.vehicle
+    count = min(vehicle.locked, len(route.jobs))
+    if count:
+        _, departure = Route(vehicle, route.jobs[:count]).timeline(distances)[-1]
+        return route.jobs[count - 1].location, departure
+
+    t = vehicle.waiting
+    if vehicle.availability is not None:
+        t = max(t, vehicle.availability.lower)
+    return vehicle.location, t
+
+
+def _deadlines(request):
+    """
+    Latest pickup arrival and latest delivery arrival of request, independent of vehicle.
+    """
+    pickup, delivery = request.pickup, request.delivery
+
+    latest_pickup = INF if pickup.arrival is None else pickup.arrival.upper
+    latest_delivery = INF if delivery.arrival is None else delivery.arrival.upper
+    if request.transport is not None:
+        latest_delivery = min(latest_delivery, request.created + request.transport.upper)
+
+    return latest_pickup, latest_delivery
+
+
+def _bounded(request):
+    latest_pickup, latest_delivery = _deadlines(request)
+    return latest_pickup < INF or latest_delivery < INF or request.carry is not None
+
+
+class TimeWindowBounds(object):
+    """
+    Earliest and latest feasible times of requests and vehicles which can meet them.
+
+    For every pair of vehicle and unassigned request, the vehicle drives from the end of its locked jobs
+    straight to the pickup and then straight to the delivery, waiting for lower limits of arrival windows.
+    This is the earliest the request can be served by that vehicle, any other jobs on the way only delay it.
+    The pair is impossible when these arrivals exceed upper limits of arrival, transport or carry time windows,
+    or the vehicle availability. Remaining pairs form the candidate list of request, ordered by earliest pickup.
+
+    Bounds are valid only when the distance source does not overestimate travel times of the service,
+    which holds for straight line distances. Requests without upper limits are not evaluated against
+    individual vehicles unless some vehicle availability closes. Assigned requests keep their vehicle among
+    candidates and requests already picked up have only their vehicle.
+
+    Lazy bounds compile only start points of vehicles and evaluate pairs when feasible, earliest or slack
+    asks for them, so solvers pay only for pairs they consider, eg. nearest vehicles of spatial index.
+    Queries over all vehicles of request, candidates and window, evaluate the request in full.
+    """
+
+    def __init__(self, state=None, distances=None, compatibility=None, lazy=False):
+        """
+        Initialization method.
+
+        :param state: State to compile.
+        :type state: routevo.state.State | None
+        :param distances: Local distance source.
+        :type distances: routevo.utils.distance.StraightDistance | None
+        :param compatibility: Compiled attribute compatibility; incompatible pairs are dropped as well.
+        :type compatibility: routevo.validation.compatibility.CompatibilityMatrix | None
+        :param lazy: Whether pairs are evaluated on demand instead of during compilation.
+        :type lazy: bool
+        """
+        self.distances = StraightDistance() if distances is None else distances
+        self.compatibility = compatibility
+        self.lazy = lazy
+
+        self._starts = {}
+        self._closing = False
+        self._requests = {}
+        self._current = {}
+        self._limits = {}
+        self._pairs = {}
+        self._candidates = {}
+        self._members = {}
+        self._earliest = {}
+        self._slack = {}
+        self._windows = {}
+        self.pairs = 0
+        self.pruned = 0
+
+        if state is not None:
+            self.compile(state)
+
+    def compile(self, state):
+        """
+        Computes bounds and candidate lists for all requests of state, or only vehicle start points when lazy.
+
+        :param state: State to compile.
+        :type state: routevo.state.State
+        :return: self
+        :rtype: TimeWindowBounds
+        """
+        self._starts, self._requests, self._current, self._limits, self._pairs = {}, {}, {}, {}, {}
+        self._candidates, self._members, self._earliest, self._slack, self._windows = {}, {}, {}, {}, {}
+        self.pairs = self.pruned = 0
+
+        for vid, route in state.routes.items():
+            location, t = _start(route, self.distances)
+            vehicle = route.vehicle
+            closes = INF if vehicle.availability is None else vehicle.availability.upper
+            self._starts[vid] = location, t, vehicle.speed, closes
+        self._closing = any(s[3] < INF for s in self._starts.values())
+
+        for vid, route in state.routes.items():
+            for request in route.requests:
+                if request.pickup.end is not None or request.pickup.at is not None:
+                    self._fix(request, vid)
+                else:
+                    self._requests[request.id] = request
+                    self._current[request.id] = vid
+
+        for request in state.unassigned:
+            self._requests[request.id] = request
+
+        if not self.lazy:
+            for rid in self._requests:
+                self._evaluate(rid)
+
+        return self
+
+    def _fix(self, request, vid):
+        self._candidates[request.id] = [vid]
+        self._members[request.id] = {vid}
+        self._earliest[request.id] = {}
+        self._slack[request.id] = {}
+        self._windows[request.id] = -INF, INF
+
+    def _compatible(self, vid, rid):
+        return self.compatibility is None or self.compatibility.compatible(vid, rid)
+
+    def _limits_of(self, rid):
+        """
+        Time limits of request: latest and lowest pickup and delivery arrivals, and direct trips by speed.
+        """
+        limits = self._limits.get(rid)
+        if limits is None:
+            request = self._requests[rid]
+            pickup, delivery = request.pickup, request.delivery
+            latest_pickup, latest_delivery = _deadlines(request)
+            limits = self._limits[rid] = (
+                latest_pickup, latest_delivery,
+                -INF if pickup.arrival is None else pickup.arrival.lower,
+                -INF if delivery.arrival is None else delivery.arrival.lower,
+                _bounded(request), {}
+            )
+        return limits
+
+    def _pair(self, vid, rid):
+        """
+        Evaluates vehicle for request, results are kept. Returns latest feasible pickup arrival of the pair,
+        or None when vehicle cannot serve request.
+        """
+        results = self._pairs.setdefault(rid, {})
+        if vid in results:
+            return results[vid]
+
+        self.pairs += 1
+        results[vid] = latest = self._arrivals(vid, rid)
+        if latest is None:
+            self.pruned += 1
+        return latest
+
+    def _arrivals(self, vid, rid):
+        current = self._current.get(rid)
+        if vid != current and not self._compatible(vid, rid):
+            return None
+
+        latest_pickup, latest_delivery, lower_pickup, lower_delivery, bounded, direct = self._limits_of(rid)
+        if not (self._closing or bounded):
+            return latest_pickup
+
+        request = self._requests[rid]
+        pickup, delivery = request.pickup, request.delivery
+        location, t, speed, closes = self._starts[vid]
+
+        trip = direct.get(speed)
+        if trip is None:
+            trip = direct[speed] = self.distances.duration(pickup.location, delivery.location, speed)
+
+        at_pickup = max(t + self.distances.duration(location, pickup.location, speed), lower_pickup)
+        at_delivery = max(at_pickup + pickup.waiting + trip, lower_delivery)
+
+        margin = min(
+            latest_pickup - at_pickup,
+            latest_delivery - at_delivery,
+            closes - delivery.waiting - at_delivery,
+            INF if request.carry is None else request.carry.upper - trip,
+        )
+        if margin < 0 and vid != current:
+            return None
+
+        self._earliest.setdefault(rid, {})[vid] = at_pickup
+        self._slack.setdefault(rid, {})[vid] = margin
+        return min(
+            latest_pickup,
+            latest_delivery - trip - pickup.waiting,
+            closes - delivery.waiting - trip - pickup.waiting,
+        )
+
+    def _evaluate(self, rid):
+        """
+        Evaluates all vehicles for request and builds its candidate list and window.
+        """
+        results = dict((vid, self._pair(vid, rid)) for vid in self._starts)
+        vids = [vid for vid, latest in results.items() if latest is not None]
+        earliest = self._earliest.setdefault(rid, {})
+        self._slack.setdefault(rid, {})
+
+        if not (self._closing or self._limits_of(rid)[4]):
+            self._candidates[rid] = vids
+            self._windows[rid] = -INF, self._limits_of(rid)[0]
+        else:
+            self._candidates[rid] = sorted(earliest, key=earliest.get)
+            self._windows[rid] = (min(earliest.values()) if earliest else INF,
+                                  max([results[vid] for vid in vids] or [-INF]))
+        self._members[rid] = set(vids)
+
+    def _complete(self, rid):
+        """
+        Evaluates request in full when lazy bounds evaluated it only for some vehicles.
+        """
+        if rid not in self._candidates and rid in self._requests:
+            self._evaluate(rid)
+
+    def _complete_all(self):
+        for rid in self._requests:
+            self._complete(rid)
+
+    def candidates(self, rid):
+        """
+        Vehicles which can serve request, the earliest at pickup first.
+
+        :param rid: Request ID.
+        :type rid: int
+        :rtype: list[int]
+        """
+        self._complete(rid)
+        return self._candidates[rid]
+
+    def feasible(self, vid, rid):
+        """
+        Whether vehicle is not excluded from serving request.
+
+        :param vid: Vehicle ID.
+        :type vid: int
+        :param rid: Request ID.
+        :type rid: int
+        :rtype: bool
+        """
+        members = self._members.get(rid)
+        if members is not None:
+            return vid in members
+        return rid in self._requests and vid in self._starts and self._pair(vid, rid) is not None
+
+    def earliest(self, vid, rid):
+        """
+        Earliest arrival of vehicle at pickup of request.
+
+        :param vid: Vehicle ID.
+        :type vid: int
+        :param rid: Request ID.
+        :type rid: int
+        :return: Seconds from now, None if not evaluated for the pair.
+        :rtype: float | None
+        """
+        self.feasible(vid, rid)
+        return self._earliest.get(rid, {}).get(vid)
+
+    def slack(self, vid, rid):
+        """
+        How much later than earliest the vehicle may serve request, ie. the tightest remaining margin
+        of pickup, delivery, transport, carry and availability limits.
+
+        :param vid: Vehicle ID.
+        :type vid: int
+        :param rid: Request ID.
+        :type rid: int
+        :return: Seconds, None if not evaluated for the pair. Negative for infeasible current assignment.
+        :rtype: float | None
+        """
+        self.feasible(vid, rid)
+        return self._slack.get(rid, {}).get(vid)
+
+    def window(self, rid):
+        """
+        Feasible pickup arrivals of request over all candidates.
+
+        :param rid: Request ID.
+        :type rid: int
+        :return: Earliest and latest arrival at pickup in seconds from now.
+        :rtype: (float, float)
+        """
+        self._complete(rid)
+        return self._windows[rid]
+
+    @property
+    def impossible(self):
+        """
+        Requests which no vehicle can serve.
+
+        :rtype: list[int]
+        """
+        self._complete_all()
+        return [rid for rid, vids in self._candidates.items() if not vids]
+
+    def prune(self, state):
+        """
+        Removes unassigned requests which no vehicle can serve. Input state is not modified.
+
+        :param state: Compiled state.
+        :type state: routevo.state.State
+        :return: State without impossible requests and the removed requests.
+        :rtype: (routevo.state.State, list[routevo.request.Request])
+        """
+        self._complete_all()
+        unassigned, removed = [], []
+        for request in state.unassigned:
+            (unassigned if self._candidates.get(request.id, True) else removed).append(request)
+
+        return State(list(state.routes.values()), unassigned), removed
+
+    def to_dict(self):
+        """
+        Convert candidate lists to dictionary.
+
+        :return: Vehicle IDs by request ID.
+        :rtype: dict[int, list[int]]
+        """
+        self._complete_all()
+        return {rid: list(vids) for rid, vids in self._candidates.items()}
@@ -126,4 +126,5 @@ class Vehicle(object):
             if data[key] is not None:
                 data[key] = func(data[key])
 
+        data.pop('lid', None)
         return cls(**data)